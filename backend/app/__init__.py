@@ -1,7 +1,9 @@
 """Flask application factory."""
+import os
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
 from app.config import config
 from app.models import db
 
@@ -15,6 +17,7 @@ def create_app(config_name='development'):
     
     # Initialize extensions
     db.init_app(app)
+    Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations'))
     CORS(app, origins=app.config['CORS_ORIGINS'])
     jwt = JWTManager(app)
     
@@ -25,6 +28,7 @@ def create_app(config_name='development'):
     from app.routes.campaigns import campaigns_bp
     from app.routes.ai_agents import ai_bp
     from app.routes.init_db import init_bp
+    from app.routes.search import search_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(users_bp)
@@ -32,10 +36,40 @@ def create_app(config_name='development'):
     app.register_blueprint(campaigns_bp)
     app.register_blueprint(ai_bp)
     app.register_blueprint(init_bp)
+    app.register_blueprint(search_bp)
     
-    # Create database tables
+    # Commit each request's staged changes (audit entries included) once, after the view returns
+    from app.utils import unit_of_work
+    unit_of_work.init_app(app)
+    
+    # Create database tables; existing databases get new columns and indexes from `flask db upgrade`
+    from app.utils.schema import create_schema
     with app.app_context():
-        db.create_all()
+        schema_current = create_schema()
+    if not schema_current:
+        app.logger.warning('Database schema is out of date; run `flask db upgrade`')
+    
+    # Full-text index for search, kept current by mapper events; its backfill
+    # reads columns an out-of-date schema lacks, so it waits for the upgrade
+    from app.services import search
+    if schema_current:
+        search.init_app(app)
+    
+    # Trigram indexes for name typeahead
+    from app.services import lookup
+    lookup.init_app(app)
+    
+    # Start background workers for queued AI agent jobs
+    from app.services import job_queue
+    job_queue.init_app(app)
+    
+    # Evict expired and excess entries from the shared agent response cache
+    from app.services import agent_cache
+    agent_cache.init_app(app)
+    
+    # Flush AI agent call statistics periodically
+    from app.services import accounting
+    accounting.init_app(app)
     
     # Health check endpoint
     @app.route('/health')
@@ -53,7 +87,9 @@ def create_app(config_name='development'):
                 'users': '/api/users',
                 'organizations': '/api/organizations',
                 'campaigns': '/api/campaigns',
-                'ai_agents': '/api/ai'
+                'ai_agents': '/api/ai',
+                'search': '/api/search',
+                'lookup': '/api/lookup'
             }
         }, 200
     
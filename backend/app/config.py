@@ -1,4 +1,5 @@
 """Application configuration."""
+import json
 import os
 from datetime import timedelta
 
@@ -15,6 +16,107 @@ class Config:
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+    AI_BACKEND = os.environ.get('AI_BACKEND', 'demo')  # demo, fake, openai
+    AI_MODEL = os.environ.get('AI_MODEL', 'gpt-4o-mini')
+    AI_BACKEND_URL = os.environ.get('AI_BACKEND_URL', 'https://api.openai.com/v1')  # any OpenAI-compatible endpoint
+    AI_BACKEND_TIMEOUT = 60.0  # seconds
+    AI_BACKEND_CONNECT_TIMEOUT = 5.0
+    AI_BACKEND_MAX_CONCURRENCY = int(os.environ.get('AI_BACKEND_MAX_CONCURRENCY', 8))  # in-flight calls per endpoint per process
+    AI_BACKEND_QUEUE_TIMEOUT = 30.0  # seconds to wait for a free slot
+    AI_BACKEND_MAX_RETRIES = 3
+    AI_BACKEND_RETRY_BASE_DELAY = 0.5
+    AI_BACKEND_RETRY_MAX_DELAY = 8.0
+    AI_HTTP_MAX_CONNECTIONS = 20
+    AI_HTTP_MAX_KEEPALIVE = 10
+    AI_HTTP_KEEPALIVE_EXPIRY = 30.0
+    FAKE_BACKEND_TOKEN_DELAY = 0.05  # seconds per token for the fake streaming backend
+    
+    # Hedging to a secondary endpoint and per-endpoint circuit breaking
+    AI_BACKEND_SECONDARY_URL = os.environ.get('AI_BACKEND_SECONDARY_URL', '')  # empty disables hedging
+    AI_BACKEND_SECONDARY_API_KEY = os.environ.get('AI_BACKEND_SECONDARY_API_KEY', '')
+    AI_HEDGE_DELAY = float(os.environ['AI_HEDGE_DELAY']) if os.environ.get('AI_HEDGE_DELAY') else None  # None uses observed p95
+    AI_HEDGE_DEFAULT_DELAY = 2.0  # until enough latency samples exist
+    AI_CIRCUIT_WINDOW_SECONDS = 30
+    AI_CIRCUIT_MIN_REQUESTS = 10
+    AI_CIRCUIT_ERROR_RATE = 0.5
+    AI_CIRCUIT_COOLDOWN_SECONDS = 15
+    
+    # AI agent response cache
+    AGENT_CACHE_ENABLED = True
+    AGENT_CACHE_TTL_SECONDS = int(os.environ.get('AGENT_CACHE_TTL_SECONDS', 24 * 3600))
+    AGENT_CACHE_MAX_ENTRIES = 1024
+    AGENT_CACHE_MAX_BYTES = 32 * 1024 * 1024  # per process
+    AGENT_CACHE_PERSISTENT = True  # share entries across workers through the database
+    AGENT_CACHE_MAX_ROWS = int(os.environ.get('AGENT_CACHE_MAX_ROWS', 50000))  # database tier, oldest evicted first
+    AGENT_CACHE_SWEEP_SECONDS = 300  # between database tier sweeps
+    AGENT_CACHE_SWEEP_BATCH = 500  # entries removed per sweep query
+    AGENT_SINGLE_FLIGHT_TIMEOUT_SECONDS = 120  # how long to wait on another worker's identical call
+    
+    # AI agent job queue
+    AGENT_JOB_WORKERS = int(os.environ.get('AGENT_JOB_WORKERS', 2))  # worker threads per process, 0 disables
+    AGENT_JOB_POLL_INTERVAL = 1.0  # seconds between queue polls when idle
+    AGENT_JOB_LEASE_SECONDS = 300  # running jobs not renewed for this long are reclaimed
+    AGENT_JOB_HEARTBEAT_SECONDS = 60  # how often a worker renews the lease of the job it runs
+    AGENT_JOB_MAX_ATTEMPTS = 3
+    
+    # AI batch requests
+    AI_BATCH_MAX_ITEMS = 100
+    AI_BATCH_MAX_WORKERS = 8  # concurrent agent calls per process
+    AI_REVIEW_MAX_IDS = 500  # recommendations per bulk review request
+    
+    # Reviewer work queue
+    REVIEW_QUEUE_BATCH = 10  # recommendations claimed per request by default
+    REVIEW_QUEUE_MAX_BATCH = 50
+    REVIEW_CLAIM_LEASE_SECONDS = 900  # unreviewed claims return to the queue after this
+    
+    # Bulk user import
+    USER_IMPORT_BATCH_SIZE = 200  # rows validated, hashed and inserted together
+    USER_IMPORT_HASH_WORKERS = int(os.environ.get('USER_IMPORT_HASH_WORKERS', os.cpu_count() or 2))  # bcrypt threads per process
+    
+    # Per-organization AI quotas and fair scheduling
+    AI_SCHEDULER_ENABLED = True
+    AI_SCHEDULER_GLOBAL_SLOTS = int(os.environ.get('AI_SCHEDULER_GLOBAL_SLOTS', 16))  # concurrent model calls, all workers
+    AI_SCHEDULER_MAX_WAIT_SECONDS = 10  # wait for a slot before answering 429
+    AI_SCHEDULER_RETRY_AFTER_SECONDS = 5
+    AI_SCHEDULER_SLOT_TTL_SECONDS = 300  # slots left by crashed workers expire
+    AI_ORG_MAX_CONCURRENCY = int(os.environ.get('AI_ORG_MAX_CONCURRENCY', 4))
+    AI_ORG_WEIGHTS = json.loads(os.environ.get('AI_ORG_WEIGHTS', '{}'))  # {"<org id>": weight}, default 1
+    AI_QUOTA_WINDOW_SECONDS = 3600
+    AI_QUOTA_REQUESTS_PER_WINDOW = int(os.environ.get('AI_QUOTA_REQUESTS_PER_WINDOW', 500))
+    AI_QUOTA_TOKENS_PER_WINDOW = int(os.environ.get('AI_QUOTA_TOKENS_PER_WINDOW', 1000000))
+    AI_QUOTA_OUTPUT_TOKEN_ESTIMATE = 1000  # expected completion tokens per call
+    
+    # Misinformation flagging rules (saved rule sets override the default file)
+    MISINFO_RULES_PATH = os.environ.get('MISINFO_RULES_PATH', '')  # empty uses the bundled rules
+    MISINFO_RULES_CHECK_SECONDS = 10  # how often workers look for a newer rule set
+    
+    # AI agent call accounting
+    AI_ACCOUNTING_FLUSH_SECONDS = 60
+    AI_MODEL_PRICES = {  # USD per million (input, output) tokens
+        'gpt-4o-mini': (0.15, 0.60),
+        'gpt-4o': (2.50, 10.00)
+    }
+    
+    # Near-duplicate detection for content and approved recommendations
+    NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', '0.8'))  # estimated Jaccard
+    NEAR_DUPLICATE_LIMIT = 10  # matches reported per check
+    
+    # Similarity search over approved recommendations
+    EMBEDDING_INDEX_DIR = os.environ.get('EMBEDDING_INDEX_DIR', 'embeddings')
+    EMBEDDING_DIM = 512  # hashed TF-IDF buckets per vector
+    EMBEDDING_MAX_DELTA = 500  # approvals since the last snapshot before it is rebuilt
+    EMBEDDING_REBUILD_TIMEOUT_SECONDS = 1800  # a rebuild claim left by a crashed worker expires
+    EMBEDDING_IVF_MIN_ROWS = 20000  # partition snapshots at least this large
+    EMBEDDING_IVF_PROBES = 8  # partitions scanned per query
+    
+    # Typeahead lookup of campaign, organization and user names
+    LOOKUP_LIMIT = 10
+    LOOKUP_MAX_LIMIT = 25
+    LOOKUP_REFRESH_SECONDS = 30  # how often workers check for changes made elsewhere
+    LOOKUP_SIMILARITY_THRESHOLD = 0.6  # in-process index; PostgreSQL uses pg_trgm.word_similarity_threshold
+    
+    # Bulk campaign operations
+    CAMPAIGN_BULK_MAX_IDS = 1000  # campaign ids per bulk request
     
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
@@ -25,6 +127,7 @@ class Config:
     
     # Pagination
     ITEMS_PER_PAGE = 20
+    MAX_ITEMS_PER_PAGE = 100
     
     # Compliance
     AUDIT_LOG_RETENTION_DAYS = 365
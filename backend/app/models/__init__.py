@@ -1,15 +1,35 @@
 """Database models."""
 from datetime import datetime
+from functools import lru_cache
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import declared_attr
 import bcrypt
+import hashlib
 import json
+import zlib
 
 db = SQLAlchemy()
 
+# Payload fields that differ between otherwise identical agent runs; they stay
+# in the row so the rest of the payload can be shared through payload_blobs
+RUN_FIELDS = ('generated_at', 'usage', 'cache')
+
+
+def hash_password(password):
+    """bcrypt hash of a password."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
 
 class User(db.Model):
     """User model."""
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset pagination order, optionally scoped to an organization
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_org_created_at_id', 'organization_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
@@ -19,7 +39,7 @@ class User(db.Model):
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     
@@ -32,7 +52,7 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password."""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if password matches hash."""
@@ -56,6 +76,9 @@ class User(db.Model):
 class Organization(db.Model):
     """Organization model."""
     __tablename__ = 'organizations'
+    __table_args__ = (
+        db.Index('ix_organizations_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -66,7 +89,7 @@ class Organization(db.Model):
     address = db.Column(db.Text, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     compliance_status = db.Column(db.String(50), default='pending')  # pending, approved, suspended
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -95,6 +118,10 @@ class Organization(db.Model):
 class Campaign(db.Model):
     """Campaign model."""
     __tablename__ = 'campaigns'
+    __table_args__ = (
+        db.Index('ix_campaigns_created_at_id', 'created_at', 'id'),
+        db.Index('ix_campaigns_org_created_at_id', 'organization_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -107,7 +134,7 @@ class Campaign(db.Model):
     target_audience = db.Column(db.Text, nullable=True)
     objectives = db.Column(db.Text, nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -136,36 +163,173 @@ class Campaign(db.Model):
         }
 
 
-class AIRecommendation(db.Model):
+class PayloadBlob(db.Model):
+    """Compressed JSON payload stored once and shared by every row with the same content."""
+    __tablename__ = 'payload_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the canonical JSON
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed canonical JSON
+    size = db.Column(db.Integer, nullable=False)  # uncompressed bytes
+    refcount = db.Column(db.Integer, nullable=False, default=0)  # rows pointing at this blob
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+@lru_cache(maxsize=512)
+def _blob_bytes(digest):
+    """Uncompressed bytes of a blob; safe to cache since a hash's content never changes."""
+    data = db.session.query(PayloadBlob.data).filter(PayloadBlob.hash == digest).scalar()
+    if data is None:
+        raise LookupError(f'Payload blob {digest} not found')
+    return zlib.decompress(data)
+
+
+class SharedPayload:
+    """
+    Mixin for rows whose JSON payload is mostly stored in payload_blobs.
+    
+    The RUN_FIELDS of a payload stay in the row's own JSON column (named by
+    payload_column); everything else is stored once in payload_blobs under
+    its hash and reference counted. Rows written before payloads were shared
+    have no payload_hash and keep the whole payload in their own column.
+    """
+    payload_column = None
+    
+    @declared_attr
+    def payload_hash(cls):
+        # active_history loads the replaced hash even if it was never read, so its blob is released
+        return db.column_property(
+            db.Column(db.String(64), db.ForeignKey('payload_blobs.hash'), nullable=True, index=True),
+            active_history=True
+        )
+    
+    def get_payload(self):
+        """Parse the full payload back into one dict."""
+        data = json.loads(getattr(self, self.payload_column))
+        if self.payload_hash:
+            staged = self.__dict__.get('_staged_blob')
+            raw = staged[1] if staged and staged[0] == self.payload_hash else _blob_bytes(self.payload_hash)
+            data = {**json.loads(raw), **data}
+        return data
+    
+    def set_payload(self, data):
+        """Store a payload, sharing everything but its RUN_FIELDS."""
+        if not isinstance(data, dict):
+            self.payload_hash = None
+            setattr(self, self.payload_column, json.dumps(data))
+            return
+        shared = {key: value for key, value in data.items() if key not in RUN_FIELDS}
+        raw = json.dumps(shared, sort_keys=True, separators=(',', ':')).encode()
+        digest = hashlib.sha256(raw).hexdigest()
+        # Picked up by the before_insert/before_update events below
+        self._staged_blob = (digest, raw)
+        self.payload_hash = digest
+        setattr(self, self.payload_column, json.dumps({key: data[key] for key in RUN_FIELDS if key in data}))
+
+
+class AIRecommendation(SharedPayload, db.Model):
     """AI Recommendation model."""
     __tablename__ = 'ai_recommendations'
+    __table_args__ = (
+        # Tenant-scoped listing filters by campaign, then status/agent, newest first
+        db.Index('ix_ai_recommendations_campaign_status_agent_created',
+                 'campaign_id', 'status', 'agent_type', 'created_at'),
+        # Approvals since the last similarity index snapshot
+        db.Index('ix_ai_recommendations_status_reviewed_at', 'status', 'reviewed_at'),
+        # Reviewers claim the oldest pending recommendations first
+        db.Index('ix_ai_recommendations_status_created_at', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
     agent_type = db.Column(db.String(50), nullable=False)  # narrative, content, distribution, feedback
-    recommendation_data = db.Column(db.Text, nullable=False)  # JSON string
+    recommendation_data = db.Column(db.Text, nullable=False)  # JSON string: RUN_FIELDS only when payload_hash is set
     status = db.Column(db.String(50), default='pending')  # pending, approved, rejected, implemented
     requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     reviewed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     review_notes = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     reviewed_at = db.Column(db.DateTime, nullable=True)
+    claimed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # reviewer working on it
+    claimed_at = db.Column(db.DateTime, nullable=True)  # claim lapses after REVIEW_CLAIM_LEASE_SECONDS
     
     # Relationships
     campaign = db.relationship('Campaign', back_populates='recommendations')
     requester = db.relationship('User', back_populates='recommendations_requested', foreign_keys=[requested_by])
     reviewer = db.relationship('User', foreign_keys=[reviewed_by])
     
+    payload_column = 'recommendation_data'
+    
     def get_recommendation_data(self):
         """Parse JSON recommendation data."""
         try:
-            return json.loads(self.recommendation_data)
+            return self.get_payload()
         except:
             return {}
     
     def set_recommendation_data(self, data):
         """Set recommendation data as JSON."""
-        self.recommendation_data = json.dumps(data)
+        self.set_payload(data)
+    
+    def to_dict(self, include_data=True):
+        """Convert to dictionary, optionally without the recommendation body."""
+        result = {
+            'id': self.id,
+            'campaign_id': self.campaign_id,
+            'agent_type': self.agent_type,
+            'status': self.status,
+            'requested_by': self.requested_by,
+            'reviewed_by': self.reviewed_by,
+            'review_notes': self.review_notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'reviewed_at': self.reviewed_at.isoformat() if self.reviewed_at else None,
+            'claimed_by': self.claimed_by,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None
+        }
+        if include_data:
+            result['recommendation_data'] = self.get_recommendation_data()
+        return result
+
+
+class AgentJob(db.Model):
+    """Queued AI agent invocation processed by the background worker pool."""
+    __tablename__ = 'agent_jobs'
+    __table_args__ = (
+        # Workers claim the oldest queued job first
+        db.Index('ix_agent_jobs_status_created_at', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
+    agent_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON string
+    status = db.Column(db.String(50), default='queued')  # queued, running, completed, failed
+    recommendation_status = db.Column(db.String(50), default='pending')  # status given to the resulting recommendation
+    recommendation_id = db.Column(db.Integer, db.ForeignKey('ai_recommendations.id'), nullable=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bypass_cache = db.Column(db.Boolean, default=False)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    locked_by = db.Column(db.String(255), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relationships
+    campaign = db.relationship('Campaign')
+    recommendation = db.relationship('AIRecommendation')
+    requester = db.relationship('User')
+    
+    def get_payload(self):
+        """Parse JSON payload."""
+        try:
+            return json.loads(self.payload)
+        except:
+            return {}
+    
+    def set_payload(self, data):
+        """Set payload as JSON."""
+        self.payload = json.dumps(data)
     
     def to_dict(self):
         """Convert to dictionary."""
@@ -173,16 +337,154 @@ class AIRecommendation(db.Model):
             'id': self.id,
             'campaign_id': self.campaign_id,
             'agent_type': self.agent_type,
-            'recommendation_data': self.get_recommendation_data(),
             'status': self.status,
+            'recommendation_id': self.recommendation_id,
             'requested_by': self.requested_by,
-            'reviewed_by': self.reviewed_by,
-            'review_notes': self.review_notes,
+            'attempts': self.attempts,
+            'error': self.error,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'reviewed_at': self.reviewed_at.isoformat() if self.reviewed_at else None
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class AgentCacheEntry(SharedPayload, db.Model):
+    """Persistent tier of the AI agent response cache."""
+    __tablename__ = 'agent_cache_entries'
+    
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of (agent_type, model, payload)
+    agent_type = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON string: RUN_FIELDS only when payload_hash is set
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    payload_column = 'result'
+
+
+class AgentInflightClaim(db.Model):
+    """Cross-process claim electing one leader per in-flight agent cache key."""
+    __tablename__ = 'agent_inflight_claims'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class OrgUsageWindow(db.Model):
+    """Per-organization AI request and token usage within one quota window."""
+    __tablename__ = 'org_usage_windows'
+    
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), primary_key=True)
+    window_start = db.Column(db.DateTime, primary_key=True)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AgentSlot(db.Model):
+    """Concurrency slot held by a running agent call, per organization or global scope."""
+    __tablename__ = 'agent_slots'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'slot_no', name='uq_agent_slots_scope_slot_no'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(50), nullable=False)
+    slot_no = db.Column(db.Integer, nullable=False)
+    owner = db.Column(db.String(255), nullable=False)
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class AgentCallStats(db.Model):
+    """AI agent call statistics flushed by one worker for one period."""
+    __tablename__ = 'agent_call_stats'
+    __table_args__ = (
+        db.Index('ix_agent_call_stats_org_agent_period', 'organization_id', 'agent_type', 'period_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.DateTime, nullable=False, index=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))
+    agent_type = db.Column(db.String(50), nullable=False)
+    backend = db.Column(db.String(100), nullable=False)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    input_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cost_usd = db.Column(db.Float, nullable=False, default=0.0)
+    wall_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    wall_histogram = db.Column(db.Text, nullable=False)  # JSON bucket counts
+    queue_histogram = db.Column(db.Text, nullable=False)  # JSON bucket counts
+
+
+class MisinformationRuleSet(db.Model):
+    """A saved version of the misinformation flagging rules; the latest one is active."""
+    __tablename__ = 'misinformation_rule_sets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rules = db.Column(db.Text, nullable=False)  # JSON list of rules
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert to dictionary."""
+        return {
+            'version': self.id,
+            'rules': json.loads(self.rules),
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class ContentSignature(db.Model):
+    """MinHash signature of a content body or approved recommendation, for near-duplicate lookup."""
+    __tablename__ = 'content_signatures'
+    __table_args__ = (
+        db.UniqueConstraint('source_type', 'source_id', name='uq_content_signatures_source'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source_type = db.Column(db.String(20), nullable=False)  # content, recommendation
+    source_id = db.Column(db.Integer, nullable=False)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # little-endian uint32 per hash function
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ContentSignatureBand(db.Model):
+    """Locality-sensitive hash of one band of a ContentSignature."""
+    __tablename__ = 'content_signature_bands'
+    __table_args__ = (
+        # Candidate lookup: all signatures in an organization sharing a band hash
+        db.Index('ix_content_signature_bands_org_key', 'organization_id', 'band_key'),
+    )
+    
+    signature_id = db.Column(db.Integer, db.ForeignKey('content_signatures.id'), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True)
+    band_key = db.Column(db.BigInteger, nullable=False)
+    organization_id = db.Column(db.Integer, nullable=True)
+
+
+class SearchDocument(db.Model):
+    """Searchable text of a campaign, content item or recommendation."""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('doc_type', 'doc_id', name='uq_search_documents_doc'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doc_type = db.Column(db.String(20), nullable=False)  # campaign, content, recommendation
+    doc_id = db.Column(db.Integer, nullable=False)
+    organization_id = db.Column(db.Integer, nullable=True, index=True)
+    campaign_id = db.Column(db.Integer, nullable=True)
+    title = db.Column(db.Text, nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class Content(db.Model):
     """Content model."""
     __tablename__ = 'content'
@@ -240,6 +542,9 @@ class Content(db.Model):
 class Analytics(db.Model):
     """Analytics model."""
     __tablename__ = 'analytics'
+    __table_args__ = (
+        db.Index('ix_analytics_campaign_metric', 'campaign_id', 'metric_type'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
@@ -360,3 +665,64 @@ class ComplianceReport(db.Model):
             'generated_at': self.generated_at.isoformat() if self.generated_at else None
         }
 
+
+
+_blobs = PayloadBlob.__table__
+
+
+def _retain_blob(connection, digest, raw):
+    """Add a reference to a blob, inserting it if this is the first."""
+    if connection.execute(_blobs.update().where(_blobs.c.hash == digest).values(
+        refcount=_blobs.c.refcount + 1
+    )).rowcount:
+        return
+    if raw is None:
+        raise LookupError(f'Payload blob {digest} not found')
+    values = {'hash': digest, 'data': zlib.compress(raw), 'size': len(raw), 'refcount': 1,
+              'created_at': datetime.utcnow()}
+    insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(connection.dialect.name)
+    if insert is None:
+        connection.execute(_blobs.insert().values(**values))
+        return
+    # Another transaction may have inserted the same blob since the update
+    connection.execute(insert(_blobs).values(**values).on_conflict_do_update(
+        index_elements=[_blobs.c.hash], set_={'refcount': _blobs.c.refcount + 1}
+    ))
+
+
+def _release_blob(connection, digest):
+    """Drop a reference to a blob, deleting it with its last reference."""
+    connection.execute(_blobs.update().where(_blobs.c.hash == digest).values(refcount=_blobs.c.refcount - 1))
+    connection.execute(_blobs.delete().where(_blobs.c.hash == digest, _blobs.c.refcount <= 0))
+
+
+def _staged_bytes(target, digest):
+    staged = target.__dict__.get('_staged_blob')
+    return staged[1] if staged and staged[0] == digest else None
+
+
+@event.listens_for(SharedPayload, 'before_insert', propagate=True)
+def _retain_payload(mapper, connection, target):
+    if target.payload_hash:
+        _retain_blob(connection, target.payload_hash, _staged_bytes(target, target.payload_hash))
+
+
+@event.listens_for(SharedPayload, 'before_update', propagate=True)
+def _swap_payload(mapper, connection, target):
+    history = inspect(target).attrs.payload_hash.history
+    if not history.has_changes():
+        return
+    for digest in history.added:
+        if digest:
+            _retain_blob(connection, digest, _staged_bytes(target, digest))
+    for digest in history.deleted:
+        if digest:
+            _release_blob(connection, digest)
+
+
+@event.listens_for(SharedPayload, 'after_delete', propagate=True)
+def _release_payload(mapper, connection, target):
+    history = inspect(target).attrs.payload_hash.history
+    for digest in history.deleted or history.unchanged:
+        if digest:
+            _release_blob(connection, digest)
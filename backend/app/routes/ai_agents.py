@@ -1,45 +1,219 @@
 """AI Agent API routes."""
-from flask import Blueprint, request, jsonify
+import json
+import time
+from flask import Blueprint, Response, request, jsonify, url_for, current_app, stream_with_context
 from flask_jwt_extended import jwt_required
-from datetime import datetime
-from app.models import Campaign, AIRecommendation, db
-from app.utils.auth import get_current_user, can_access_campaign
-from app.utils.audit import log_recommendation_requested, log_recommendation_reviewed
-from app.services.ai_agents import get_ai_agent
+from datetime import datetime, timedelta
+from sqlalchemy.orm import defer
+from app.models import Campaign, AIRecommendation, AgentJob, db
+from app.utils.auth import role_required, get_current_user, can_access_campaign
+from app.utils.audit import log_action, log_recommendation_requested, log_recommendation_reviewed, \
+    log_recommendations_reviewed
+from app.utils.pagination import paginate_request, empty_page, InvalidCursor
+from app.utils.unit_of_work import commit_now
+from app.services.ai_agents import get_ai_agent, ContentSynthesizer
+from app.services.model_backends import get_backend, get_backend_stats
+from app.services.agent_cache import cached_run_agent
+from app.services.agent_batch import run_agents_concurrently
+from app.services.pipeline import run_pipeline
+from app.services.job_queue import enqueue_job, wait_for_job
+from app.services.accounting import record_call, report as accounting_report, flush as flush_accounting
+from app.services.misinformation import get_ruleset, save_rules
+from app.services.embeddings import find_similar, rebuild as rebuild_embeddings, campaign_text
+from app.services.near_duplicates import find_near_duplicates, recommendation_duplicates, recommendation_text, \
+    rebuild_index, reindex_recommendations
+from app.services.review_queue import claim_next, lease_seconds, reviewable
+from app.services.scheduler import Throttled, check_quota, reserve_quota, refund_quota, settle_quota, estimate_tokens, \
+    scheduled
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
+# Longest a job status request may block waiting for completion
+MAX_JOB_WAIT_SECONDS = 30
 
-@ai_bp.route('/narrative-architect', methods=['POST'])
-@jwt_required()
-def narrative_architect():
-    """Request narrative recommendations from AI."""
-    current_user = get_current_user()
-    data = request.get_json()
-    
-    # Validate campaign_id
-    if 'campaign_id' not in data:
-        return jsonify({'error': 'campaign_id is required'}), 400
-    
-    campaign = db.session.get(Campaign, data['campaign_id'])
-    if not campaign:
-        return jsonify({'error': 'Campaign not found'}), 404
-    
-    # Check permissions
-    if not can_access_campaign(current_user, campaign):
-        return jsonify({'error': 'Insufficient permissions'}), 403
-    
-    # Prepare campaign data for AI
-    campaign_data = {
+
+def narrative_payload(campaign, data):
+    """Build Narrative Architect input for a campaign."""
+    return {
         'name': campaign.name,
         'campaign_type': campaign.campaign_type,
         'objectives': campaign.objectives or 'Not specified',
         'target_audience': campaign.target_audience or 'General public'
     }
+
+
+def content_payload(campaign, data):
+    """Build Content Synthesizer input from request data."""
+    return {
+        'content_type': data['content_type'],
+        'topic': data['topic'],
+        'narrative': data.get('narrative', ''),
+        'platform': data.get('platform', 'general')
+    }
+
+
+def distribution_payload(campaign, data):
+    """Build Distribution Optimizer input from request data."""
+    return {
+        'campaign_id': campaign.id,
+        'content_summary': data['content_summary'],
+        'target_audience': data.get('target_audience', campaign.target_audience or 'General public'),
+        'platforms': data.get('platforms', ['facebook', 'twitter', 'instagram']),
+        'budget': data.get('budget', 'N/A')
+    }
+
+
+def feedback_payload(campaign, data):
+    """Build Feedback Intelligence input from request data."""
+    return {
+        'engagement_metrics': data.get('engagement_metrics', {}),
+        'sample_comments': data.get('sample_comments', []),
+        'mentions': data.get('mentions', [])
+    }
+
+
+# Per agent type: (payload builder, required request fields, resulting recommendation status)
+AGENT_REQUESTS = {
+    'narrative_architect': (narrative_payload, [], 'pending'),
+    'content_synthesizer': (content_payload, ['content_type', 'topic'], 'pending'),
+    'distribution_optimizer': (distribution_payload, ['content_summary'], 'pending'),
+    # Feedback analysis is informational, auto-approved
+    'feedback_intelligence': (feedback_payload, [], 'completed')
+}
+
+
+def wants_async(data):
+    """Check whether the caller asked for job mode."""
+    return bool(data.get('async')) or request.args.get('async', 'false').lower() == 'true'
+
+
+def wants_stream(data):
+    """Check whether the caller asked for a Server-Sent Events stream."""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events message."""
+    return f'event: {event}\ndata: {json.dumps(payload)}\n\n'
+
+
+def throttled_response(error):
+    """429 response telling the client when to retry."""
+    return jsonify({
+        'error': str(error),
+        'retry_after': error.retry_after
+    }), 429, {'Retry-After': str(error.retry_after)}
+
+
+def stream_content(current_user, campaign, content_request):
+    """
+    Stream Content Synthesizer output as Server-Sent Events.
+    
+    Emits 'delta' events with partial text while the model backend generates,
+    then persists the accumulated result as a recommendation and emits a
+    'done' event with its id. Failures are reported as an 'error' event.
+    """
+    backend = get_backend()
+    model = f'{backend.name}:{backend.model}'
+    user_id = current_user.id
+    campaign_id = campaign.id
+    organization_id = campaign.organization_id
+    tokens = estimate_tokens(content_request)
+    
+    # Charge the quota up front so an over-quota request gets a plain 429
+    try:
+        reserve_quota(organization_id, tokens=tokens)
+    except Throttled as e:
+        return throttled_response(e)
     
-    # Get AI agent and generate recommendations
-    agent = get_ai_agent('narrative_architect')
-    result = agent.generate_recommendations(campaign_data)
+    def generate():
+        result = None
+        started = time.monotonic()
+        try:
+            with scheduled(organization_id, content_request, reserve=False) as waited:
+                for kind, value in ContentSynthesizer.stream_content(content_request, backend):
+                    if kind == 'delta':
+                        yield sse_event('delta', {'text': value})
+                    else:
+                        result = value
+        except Throttled as e:
+            refund_quota(organization_id, tokens=tokens)
+            record_call(organization_id, 'content_synthesizer', model, wall_seconds=time.monotonic() - started,
+                        error=True)
+            yield sse_event('error', {'error': str(e), 'retry_after': e.retry_after})
+            return
+        except Exception as e:
+            record_call(organization_id, 'content_synthesizer', model, wall_seconds=time.monotonic() - started,
+                        error=True)
+            yield sse_event('error', {'error': str(e)})
+            return
+        
+        record_call(organization_id, 'content_synthesizer', model, result,
+                    wall_seconds=time.monotonic() - started, queue_seconds=waited)
+        settle_quota(organization_id, tokens, result)
+        
+        # Save the accumulated result once generation is complete
+        recommendation = AIRecommendation(
+            campaign_id=campaign_id,
+            agent_type='content_synthesizer',
+            status='pending',
+            requested_by=user_id
+        )
+        recommendation.set_recommendation_data(result)
+        
+        try:
+            db.session.add(recommendation)
+            db.session.flush()
+            log_recommendation_requested(user_id, recommendation.id, 'content_synthesizer')
+            # The view has already returned, so the request's unit of work cannot commit this
+            commit_now()
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'error': str(e)})
+            return
+        
+        yield sse_event('done', {'recommendation_id': recommendation.id, 'data': result})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def dispatch_agent(current_user, campaign, agent_type, payload, data, message, recommendation_status='pending'):
+    """
+    Run an agent synchronously, or queue it when job mode is requested.
+    
+    Synchronous calls return 201 with the result; generated content also
+    lists near-duplicates of it among the organization's content and approved
+    recommendations. Job mode returns 202 with a job id that can be polled at
+    /api/ai/jobs/<id>. Pass "bypass_cache": true to force a fresh agent run
+    instead of reusing a cached result. Requests over the organization's AI
+    quota or capacity get 429 with Retry-After.
+    """
+    bypass_cache = bool(data.get('bypass_cache'))
+    
+    if wants_async(data):
+        try:
+            check_quota(campaign.organization_id)
+        except Throttled as e:
+            return throttled_response(e)
+        job = enqueue_job(campaign.id, agent_type, payload, current_user.id, recommendation_status,
+                          bypass_cache=bypass_cache)
+        status_url = url_for('ai.get_job', job_id=job.id)
+        return jsonify({
+            'message': 'Job queued',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    
+    try:
+        result = cached_run_agent(agent_type, payload, bypass_cache=bypass_cache,
+                                  organization_id=campaign.organization_id)
+    except Throttled as e:
+        return throttled_response(e)
     
     if not result.get('success'):
         return jsonify({'error': result.get('error', 'AI generation failed')}), 500
@@ -47,33 +221,67 @@ def narrative_architect():
     # Save recommendation to database
     recommendation = AIRecommendation(
         campaign_id=campaign.id,
-        agent_type='narrative_architect',
-        status='pending',
+        agent_type=agent_type,
+        status=recommendation_status,
         requested_by=current_user.id
     )
     recommendation.set_recommendation_data(result)
     
     try:
         db.session.add(recommendation)
-        db.session.commit()
+        db.session.flush()
         
         # Log the request
-        log_recommendation_requested(current_user.id, recommendation.id, 'narrative_architect')
+        log_recommendation_requested(current_user.id, recommendation.id, agent_type)
         
-        return jsonify({
-            'message': 'Narrative recommendations generated successfully',
+        response = {
+            'message': message,
             'recommendation_id': recommendation.id,
             'data': result
-        }), 201
+        }
+        if agent_type == 'content_synthesizer':
+            response['near_duplicates'] = find_near_duplicates(
+                recommendation_text(agent_type, result), campaign.organization_id,
+                exclude=('recommendation', recommendation.id)
+            )
+        return jsonify(response), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+@ai_bp.route('/narrative-architect', methods=['POST'])
+@jwt_required()
+def narrative_architect():
+    """Request narrative recommendations from AI."""
+    current_user = get_current_user()
+    data = request.get_json()
+    
+    # Validate campaign_id
+    if 'campaign_id' not in data:
+        return jsonify({'error': 'campaign_id is required'}), 400
+    
+    campaign = db.session.get(Campaign, data['campaign_id'])
+    if not campaign:
+        return jsonify({'error': 'Campaign not found'}), 404
+    
+    # Check permissions
+    if not can_access_campaign(current_user, campaign):
+        return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    return dispatch_agent(current_user, campaign, 'narrative_architect', narrative_payload(campaign, data), data,
+                          'Narrative recommendations generated successfully')
+
+
 @ai_bp.route('/content-synthesizer', methods=['POST'])
 @jwt_required()
 def content_synthesizer():
-    """Generate content from AI."""
+    """
+    Generate content from AI.
+    
+    Pass "stream": true (or Accept: text/event-stream) to receive the content
+    incrementally as Server-Sent Events.
+    """
     current_user = get_current_user()
     data = request.get_json()
     
@@ -91,45 +299,12 @@ def content_synthesizer():
     if not can_access_campaign(current_user, campaign):
         return jsonify({'error': 'Insufficient permissions'}), 403
     
-    # Prepare content request
-    content_request = {
-        'content_type': data['content_type'],
-        'topic': data['topic'],
-        'narrative': data.get('narrative', ''),
-        'platform': data.get('platform', 'general')
-    }
-    
-    # Get AI agent and generate content
-    agent = get_ai_agent('content_synthesizer')
-    result = agent.generate_content(content_request)
-    
-    if not result.get('success'):
-        return jsonify({'error': result.get('error', 'AI generation failed')}), 500
-    
-    # Save recommendation to database
-    recommendation = AIRecommendation(
-        campaign_id=campaign.id,
-        agent_type='content_synthesizer',
-        status='pending',
-        requested_by=current_user.id
-    )
-    recommendation.set_recommendation_data(result)
+    # Stream partial content as Server-Sent Events when asked
+    if wants_stream(data):
+        return stream_content(current_user, campaign, content_payload(campaign, data))
     
-    try:
-        db.session.add(recommendation)
-        db.session.commit()
-        
-        # Log the request
-        log_recommendation_requested(current_user.id, recommendation.id, 'content_synthesizer')
-        
-        return jsonify({
-            'message': 'Content generated successfully',
-            'recommendation_id': recommendation.id,
-            'data': result
-        }), 201
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    return dispatch_agent(current_user, campaign, 'content_synthesizer', content_payload(campaign, data), data,
+                          'Content generated successfully')
 
 
 @ai_bp.route('/distribution-optimizer', methods=['POST'])
@@ -151,55 +326,170 @@ def distribution_optimizer():
     if not can_access_campaign(current_user, campaign):
         return jsonify({'error': 'Insufficient permissions'}), 403
     
-    # Prepare distribution request
-    distribution_request = {
-        'content_summary': data['content_summary'],
-        'target_audience': data.get('target_audience', campaign.target_audience or 'General public'),
-        'platforms': data.get('platforms', ['facebook', 'twitter', 'instagram']),
-        'budget': data.get('budget', 'N/A')
-    }
+    return dispatch_agent(current_user, campaign, 'distribution_optimizer', distribution_payload(campaign, data), data,
+                          'Distribution recommendations generated successfully')
+
+
+@ai_bp.route('/feedback-intelligence', methods=['POST'])
+@jwt_required()
+def feedback_intelligence():
+    """Analyze feedback data with AI."""
+    current_user = get_current_user()
+    data = request.get_json()
     
-    # Get AI agent and generate recommendations
-    agent = get_ai_agent('distribution_optimizer')
-    result = agent.generate_recommendations(distribution_request)
+    # Validate required fields
+    if 'campaign_id' not in data:
+        return jsonify({'error': 'campaign_id is required'}), 400
     
-    if not result.get('success'):
-        return jsonify({'error': result.get('error', 'AI generation failed')}), 500
+    campaign = db.session.get(Campaign, data['campaign_id'])
+    if not campaign:
+        return jsonify({'error': 'Campaign not found'}), 404
     
-    # Save recommendation to database
-    recommendation = AIRecommendation(
-        campaign_id=campaign.id,
-        agent_type='distribution_optimizer',
-        status='pending',
-        requested_by=current_user.id
+    # Check permissions
+    if not can_access_campaign(current_user, campaign):
+        return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    # Feedback analysis is informational, auto-approved
+    return dispatch_agent(current_user, campaign, 'feedback_intelligence', feedback_payload(campaign, data), data,
+                          'Feedback analysis completed successfully', recommendation_status='completed')
+
+
+@ai_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_recommendations():
+    """
+    Run many agent requests at once.
+    
+    Body: {"items": [{"campaign_id", "agent_type", "params"}], "bypass_cache", "include_data"}.
+    Campaigns are authorized in one query, agent calls run concurrently, and
+    all recommendations and audit entries are written in one transaction.
+    Returns a per-item status.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    items = data.get('items')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    
+    max_items = current_app.config['AI_BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} items are allowed per batch'}), 400
+    
+    # Authorize every referenced campaign in one query
+    campaign_ids = set()
+    for item in items:
+        try:
+            campaign_ids.add(int(item['campaign_id']))
+        except (TypeError, KeyError, ValueError):
+            pass
+    campaigns = {c.id: c for c in Campaign.query.filter(Campaign.id.in_(campaign_ids))} if campaign_ids else {}
+    
+    results = [None] * len(items)
+    calls = []
+    
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'error', 'code': 400, 'error': 'Item must be an object'}
+            continue
+        
+        agent_type = item.get('agent_type')
+        outcome = {'index': index, 'campaign_id': item.get('campaign_id'), 'agent_type': agent_type}
+        
+        if agent_type not in AGENT_REQUESTS:
+            results[index] = {**outcome, 'status': 'error', 'code': 400, 'error': 'Invalid agent_type'}
+            continue
+        
+        try:
+            campaign = campaigns.get(int(item.get('campaign_id')))
+        except (TypeError, ValueError):
+            campaign = None
+        if not campaign:
+            results[index] = {**outcome, 'status': 'error', 'code': 404, 'error': 'Campaign not found'}
+            continue
+        
+        if not can_access_campaign(current_user, campaign):
+            results[index] = {**outcome, 'status': 'error', 'code': 403, 'error': 'Insufficient permissions'}
+            continue
+        
+        build_payload, required_fields, recommendation_status = AGENT_REQUESTS[agent_type]
+        params = item.get('params') or {}
+        missing = [field for field in required_fields if field not in params]
+        if missing:
+            results[index] = {**outcome, 'status': 'error', 'code': 400,
+                              'error': f'{missing[0]} is required'}
+            continue
+        
+        calls.append((index, outcome, campaign, agent_type, build_payload(campaign, params), recommendation_status))
+    
+    # Fan the agent calls out concurrently
+    agent_results = run_agents_concurrently(
+        [(agent_type, payload, campaign.organization_id) for _, _, campaign, agent_type, payload, _ in calls],
+        bypass_cache=bool(data.get('bypass_cache'))
     )
-    recommendation.set_recommendation_data(result)
     
-    try:
-        db.session.add(recommendation)
-        db.session.commit()
+    created = []
+    for (index, outcome, campaign, agent_type, _, recommendation_status), result in zip(calls, agent_results):
+        if result.get('retry_after'):
+            results[index] = {**outcome, 'status': 'throttled', 'code': 429,
+                              'error': result['error'], 'retry_after': result['retry_after']}
+            continue
+        if not result.get('success'):
+            results[index] = {**outcome, 'status': 'error', 'code': 500,
+                              'error': result.get('error', 'AI generation failed')}
+            continue
         
-        # Log the request
-        log_recommendation_requested(current_user.id, recommendation.id, 'distribution_optimizer')
+        recommendation = AIRecommendation(
+            campaign_id=campaign.id,
+            agent_type=agent_type,
+            status=recommendation_status,
+            requested_by=current_user.id
+        )
+        recommendation.set_recommendation_data(result)
+        created.append((index, outcome, recommendation, result))
+    
+    # Save all recommendations and their audit entries in one transaction
+    try:
+        db.session.add_all([recommendation for _, _, recommendation, _ in created])
+        db.session.flush()
         
-        return jsonify({
-            'message': 'Distribution recommendations generated successfully',
-            'recommendation_id': recommendation.id,
-            'data': result
-        }), 201
+        for index, outcome, recommendation, result in created:
+            log_recommendation_requested(current_user.id, recommendation.id, recommendation.agent_type)
+            results[index] = {
+                **outcome,
+                'status': 'created',
+                'code': 201,
+                'recommendation_id': recommendation.id,
+                'cache_hit': result.get('cache', {}).get('hit', False)
+            }
+            if data.get('include_data'):
+                results[index]['data'] = result
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'results': results,
+        'created': len(created),
+        'failed': len(items) - len(created)
+    }), 200
 
 
-@ai_bp.route('/feedback-intelligence', methods=['POST'])
+@ai_bp.route('/pipeline', methods=['POST'])
 @jwt_required()
-def feedback_intelligence():
-    """Analyze feedback data with AI."""
+def agent_pipeline():
+    """
+    Run narrative -> content -> distribution for a campaign in one request.
+    
+    Body: {"campaign_id", "narrative_indices", "content_type", "platform",
+    "platforms", "budget", "bypass_cache"}. Each selected narrative is
+    expanded into content and a distribution plan concurrently; unchanged
+    steps are served from the response cache. Every step is saved as a
+    recommendation in one transaction.
+    """
     current_user = get_current_user()
-    data = request.get_json()
+    data = request.get_json() or {}
     
-    # Validate required fields
     if 'campaign_id' not in data:
         return jsonify({'error': 'campaign_id is required'}), 400
     
@@ -211,44 +501,230 @@ def feedback_intelligence():
     if not can_access_campaign(current_user, campaign):
         return jsonify({'error': 'Insufficient permissions'}), 403
     
-    # Prepare feedback data
-    feedback_data = {
-        'engagement_metrics': data.get('engagement_metrics', {}),
-        'sample_comments': data.get('sample_comments', []),
-        'mentions': data.get('mentions', [])
-    }
-    
-    # Get AI agent and analyze feedback
-    agent = get_ai_agent('feedback_intelligence')
-    result = agent.analyze_feedback(feedback_data)
+    narrative_indices = data.get('narrative_indices')
+    if narrative_indices is not None and not (
+        isinstance(narrative_indices, list) and all(isinstance(i, int) for i in narrative_indices)
+    ):
+        return jsonify({'error': 'narrative_indices must be a list of integers'}), 400
+    
+    result = run_pipeline(
+        narrative_payload(campaign, data),
+        {'content_type': data.get('content_type', 'post'), 'platform': data.get('platform', 'general')},
+        {
+            'campaign_id': campaign.id,
+            'target_audience': data.get('target_audience', campaign.target_audience or 'General public'),
+            'platforms': data.get('platforms', ['facebook', 'twitter', 'instagram']),
+            'budget': data.get('budget', 'N/A')
+        },
+        narrative_indices=narrative_indices,
+        bypass_cache=bool(data.get('bypass_cache')),
+        organization_id=campaign.organization_id
+    )
     
+    if result.get('retry_after'):
+        return throttled_response(Throttled(result['error'], result['retry_after']))
     if not result.get('success'):
-        return jsonify({'error': result.get('error', 'AI analysis failed')}), 500
+        return jsonify({'error': result.get('error', 'AI generation failed')}), 500
     
-    # Save recommendation to database
-    recommendation = AIRecommendation(
-        campaign_id=campaign.id,
-        agent_type='feedback_intelligence',
-        status='completed',  # Feedback analysis is informational, auto-approved
-        requested_by=current_user.id
-    )
-    recommendation.set_recommendation_data(result)
+    # Save every successful step as a recommendation
+    steps = [('narrative_architect', result['narrative'])]
+    for branch in result['branches']:
+        for agent_type, key in (('content_synthesizer', 'content'), ('distribution_optimizer', 'distribution')):
+            if branch.get(key):
+                steps.append((agent_type, branch[key]))
     
     try:
-        db.session.add(recommendation)
-        db.session.commit()
-        
-        # Log the request
-        log_recommendation_requested(current_user.id, recommendation.id, 'feedback_intelligence')
-        
-        return jsonify({
-            'message': 'Feedback analysis completed successfully',
-            'recommendation_id': recommendation.id,
-            'data': result
-        }), 201
+        for agent_type, step in steps:
+            step_result = step['result']
+            step['status'] = 'completed' if step_result.get('success') else 'failed'
+            step['cache_hit'] = step_result.get('cache', {}).get('hit', False)
+            if not step_result.get('success'):
+                continue
+            recommendation = AIRecommendation(
+                campaign_id=campaign.id,
+                agent_type=agent_type,
+                status='pending',
+                requested_by=current_user.id
+            )
+            recommendation.set_recommendation_data(step_result)
+            db.session.add(recommendation)
+            db.session.flush()
+            step['recommendation_id'] = recommendation.id
+            log_recommendation_requested(current_user.id, recommendation.id, agent_type)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'message': 'Pipeline completed',
+        'campaign_id': campaign.id,
+        'narrative': result['narrative'],
+        'branches': result['branches']
+    }), 201
+
+
+@ai_bp.route('/backend-stats', methods=['GET'])
+@jwt_required()
+@role_required('super_admin')
+def backend_stats():
+    """Get model backend counters, circuit breaker states and latencies for this process."""
+    return jsonify({'backend': current_app.config['AI_BACKEND'], 'endpoints': get_backend_stats()}), 200
+
+
+@ai_bp.route('/accounting', methods=['GET'])
+@jwt_required()
+@role_required('super_admin', 'org_admin')
+def agent_accounting():
+    """
+    Get AI agent call statistics per organization and agent type.
+    
+    Query: hours (default 24), agent_type, organization_id (super admins;
+    org admins always see their own organization). Includes call and cache
+    hit counts, token usage, cost, and wall time and queue wait percentiles.
+    """
+    current_user = get_current_user()
+    
+    try:
+        hours = min(max(float(request.args.get('hours', 24)), 0), 24 * 90)
+    except ValueError:
+        return jsonify({'error': 'hours must be a number'}), 400
+    
+    if current_user.role == 'super_admin':
+        organization_id = request.args.get('organization_id', type=int)
+    else:
+        organization_id = current_user.organization_id
+        if organization_id is None:
+            return jsonify({'since': None, 'stats': []}), 200
+    
+    # Include this worker's not yet flushed calls
+    flush_accounting()
+    
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return jsonify({
+        'since': since.isoformat(),
+        'stats': accounting_report(since, organization_id=organization_id,
+                                   agent_type=request.args.get('agent_type'))
+    }), 200
+
+
+@ai_bp.route('/misinformation-rules', methods=['GET'])
+@jwt_required()
+@role_required('super_admin', 'org_admin')
+def get_misinformation_rules():
+    """Get the active misinformation flagging rules and their version."""
+    ruleset = get_ruleset()
+    return jsonify({'version': ruleset.version, 'rules': ruleset.rules}), 200
+
+
+@ai_bp.route('/misinformation-rules', methods=['PUT'])
+@jwt_required()
+@role_required('super_admin')
+def update_misinformation_rules():
+    """
+    Replace the misinformation flagging rules.
+    
+    Body: {"rules": [{"id", "claim", "severity", "keywords", "phrases",
+    "patterns"}]}. The new version is used by every worker within
+    MISINFO_RULES_CHECK_SECONDS, without a restart.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    
+    try:
+        rule_set = save_rules(data.get('rules'), current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    log_action(current_user.id, 'misinformation_rules_updated', 'misinformation_rule_set', rule_set.id,
+               {'rules': len(rule_set.to_dict()['rules'])})
+    
+    return jsonify({
+        'message': 'Misinformation rules updated',
+        'rule_set': rule_set.to_dict()
+    }), 200
+
+
+@ai_bp.route('/near-duplicates', methods=['POST'])
+@jwt_required()
+def check_near_duplicates():
+    """
+    Find content and approved recommendations similar to a text.
+    
+    Body: {"campaign_id", "text", "scope": "organization" | "campaign",
+    "threshold"}. Similarity is the estimated fraction of shared word
+    3-grams, from 0 to 1.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    
+    if not data.get('campaign_id') or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'campaign_id and text are required'}), 400
+    scope = data.get('scope', 'organization')
+    if scope not in ('organization', 'campaign'):
+        return jsonify({'error': 'scope must be "organization" or "campaign"'}), 400
+    threshold = data.get('threshold')
+    if threshold is not None and (not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1):
+        return jsonify({'error': 'threshold must be between 0 and 1'}), 400
+    
+    campaign = db.session.get(Campaign, data['campaign_id'])
+    if not campaign:
+        return jsonify({'error': 'Campaign not found'}), 404
+    if not can_access_campaign(current_user, campaign):
+        return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    matches = find_near_duplicates(
+        data['text'], campaign.organization_id,
+        campaign_id=campaign.id if scope == 'campaign' else None,
+        threshold=threshold
+    )
+    return jsonify({'near_duplicates': matches}), 200
+
+
+@ai_bp.route('/near-duplicates/rebuild', methods=['POST'])
+@jwt_required()
+@role_required('super_admin')
+def rebuild_near_duplicates():
+    """Recompute the near-duplicate index from content and approved recommendations."""
+    current_user = get_current_user()
+    started = time.perf_counter()
+    indexed = rebuild_index()
+    
+    log_action(current_user.id, 'near_duplicate_index_rebuilt', 'content_signature', None, {'indexed': indexed})
+    
+    return jsonify({
+        'message': 'Near-duplicate index rebuilt',
+        'indexed': indexed,
+        'seconds': round(time.perf_counter() - started, 3)
+    }), 200
+
+
+@ai_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    Get the status of a queued agent job.
+    
+    Pass ?wait=<seconds> to block until the job finishes (up to 30 seconds).
+    """
+    current_user = get_current_user()
+    job = db.session.get(AgentJob, job_id)
+    
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    # Check permissions
+    if not can_access_campaign(current_user, job.campaign):
+        return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    wait = request.args.get('wait', 0, type=float)
+    if wait > 0:
+        job = wait_for_job(job, min(wait, MAX_JOB_WAIT_SECONDS))
+    
+    result = job.to_dict()
+    if job.recommendation:
+        result['recommendation'] = job.recommendation.to_dict()
+    
+    return jsonify(result), 200
 
 
 @ai_bp.route('/recommendations', methods=['GET', 'POST'])
@@ -303,7 +779,7 @@ def handle_recommendations():
         
         try:
             db.session.add(recommendation)
-            db.session.commit()
+            db.session.flush()
             log_recommendation_requested(current_user.id, recommendation.id, data['agent_type'])
             
             return jsonify({
@@ -318,41 +794,119 @@ def handle_recommendations():
     # Get query parameters
     agent_type = request.args.get('agent_type')
     status = request.args.get('status')
-    campaign_id = request.args.get('campaign_id')
+    campaign_id = request.args.get('campaign_id', type=int)
+    include_data = request.args.get('include_data', 'false').lower() == 'true'
     
-    # Build query
-    query = AIRecommendation.query
+    # Build query scoped to the caller's organization through the campaign
+    query = AIRecommendation.query.join(Campaign, AIRecommendation.campaign_id == Campaign.id)
     
-    # Filter by agent type
-    if agent_type:
-        query = query.filter_by(agent_type=agent_type)
+    if current_user.role != 'super_admin':
+        if current_user.organization_id:
+            query = query.filter(Campaign.organization_id == current_user.organization_id)
+        else:
+            return jsonify({'recommendations': [], **empty_page()}), 200
+    
+    # Filter by campaign
+    if campaign_id:
+        query = query.filter(AIRecommendation.campaign_id == campaign_id)
     
     # Filter by status
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(AIRecommendation.status == status)
     
-    # Filter by campaign
+    # Filter by agent type
+    if agent_type:
+        query = query.filter(AIRecommendation.agent_type == agent_type)
+    
+    # Skip loading the JSON body unless the caller wants it
+    if not include_data:
+        query = query.options(defer(AIRecommendation.recommendation_data))
+    
+    # Paginate (newest first)
+    try:
+        recommendations, page_meta = paginate_request(query, AIRecommendation)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'recommendations': [r.to_dict(include_data=include_data) for r in recommendations],
+        **page_meta
+    }), 200
+
+
+@ai_bp.route('/recommendations/similar', methods=['GET'])
+@jwt_required()
+def similar_recommendations():
+    """
+    Find earlier approved recommendations for similar campaigns.
+    
+    Query parameters: campaign_id (use that campaign's description), q
+    (free text; at least one of the two), agent_type, limit (default 5, up
+    to 50), exclude_campaign=true to leave out the campaign's own
+    recommendations and include_data=false to omit recommendation bodies.
+    """
+    current_user = get_current_user()
+    campaign_id = request.args.get('campaign_id', type=int)
+    text = request.args.get('q', '').strip()
+    agent_type = request.args.get('agent_type')
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+    include_data = request.args.get('include_data', 'true').lower() == 'true'
+    
+    if not campaign_id and not text:
+        return jsonify({'error': 'campaign_id or q is required'}), 400
+    if agent_type and not get_ai_agent(agent_type):
+        return jsonify({'error': f'Unknown agent_type: {agent_type}'}), 400
+    
+    exclude_campaign_id = None
     if campaign_id:
-        query = query.filter_by(campaign_id=int(campaign_id))
+        campaign = db.session.get(Campaign, campaign_id)
+        if not campaign:
+            return jsonify({'error': 'Campaign not found'}), 404
+        if not can_access_campaign(current_user, campaign):
+            return jsonify({'error': 'Insufficient permissions'}), 403
+        text = campaign_text(campaign) + '\n' + text
+        if request.args.get('exclude_campaign', 'false').lower() == 'true':
+            exclude_campaign_id = campaign.id
+    
+    # Only super admins search across organizations
+    if current_user.role == 'super_admin':
+        organization_id = None
+    elif current_user.organization_id:
+        organization_id = current_user.organization_id
+    else:
+        return jsonify({'results': []}), 200
+    
+    results = find_similar(text, organization_id=organization_id, agent_type=agent_type, limit=limit,
+                           exclude_campaign_id=exclude_campaign_id)
+    return jsonify({
+        'results': [
+            {'similarity': score, 'recommendation': recommendation.to_dict(include_data=include_data)}
+            for recommendation, score in results
+        ]
+    }), 200
+
+
+@ai_bp.route('/recommendations/similar/rebuild', methods=['POST'])
+@jwt_required()
+@role_required('super_admin')
+def rebuild_similar_recommendations():
+    """
+    Re-embed all approved recommendations into a new similarity index snapshot.
     
-    # Order by created date (newest first)
-    query = query.order_by(AIRecommendation.created_at.desc())
+    Returns 409 if another worker is already rebuilding it.
+    """
+    current_user = get_current_user()
+    started = time.perf_counter()
+    indexed = rebuild_embeddings()
+    if indexed is None:
+        return jsonify({'error': 'A similarity index rebuild is already running'}), 409
     
-    recommendations = query.all()
+    log_action(current_user.id, 'similarity_index_rebuilt', 'ai_recommendation', None, {'indexed': indexed})
     
     return jsonify({
-        'recommendations': [{
-            'id': r.id,
-            'campaign_id': r.campaign_id,
-            'agent_type': r.agent_type,
-            'prompt': r.prompt,
-            'recommendation': r.recommendation,
-            'status': r.status,
-            'reviewed_by': r.reviewed_by,
-            'review_notes': r.review_notes,
-            'created_at': r.created_at.isoformat() if r.created_at else None,
-            'reviewed_at': r.reviewed_at.isoformat() if r.reviewed_at else None
-        } for r in recommendations]
+        'message': 'Similarity index rebuilt',
+        'indexed': indexed,
+        'seconds': round(time.perf_counter() - started, 3)
     }), 200
 
 
@@ -374,6 +928,98 @@ def get_recommendation(recommendation_id):
     return jsonify(recommendation.to_dict()), 200
 
 
+@ai_bp.route('/review-queue/next', methods=['POST'])
+@jwt_required()
+def next_for_review():
+    """
+    Claim the next pending recommendations for the caller to review.
+    
+    Body (optional): {"limit", "campaign_id", "agent_type"}. Claimed
+    recommendations are not handed to other reviewers until the claim lapses
+    (lease_expires_at); asking again renews the caller's own claims. Users
+    only claim their own organization's recommendations.
+    """
+    current_user = get_current_user()
+    if current_user.role not in ['super_admin', 'org_admin', 'campaign_manager', 'reviewer']:
+        return jsonify({'error': 'Insufficient permissions to review'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = int(data.get('limit', current_app.config['REVIEW_QUEUE_BATCH']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, current_app.config['REVIEW_QUEUE_MAX_BATCH']))
+    
+    campaign_id = data.get('campaign_id')
+    if campaign_id is not None:
+        campaign = db.session.get(Campaign, campaign_id)
+        if not campaign:
+            return jsonify({'error': 'Campaign not found'}), 404
+        if not can_access_campaign(current_user, campaign):
+            return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    if current_user.role == 'super_admin':
+        organization_id = None
+    elif current_user.organization_id:
+        organization_id = current_user.organization_id
+    else:
+        return jsonify({'recommendations': [], 'lease_expires_at': None}), 200
+    
+    claimed = claim_next(current_user.id, limit, organization_id=organization_id, campaign_id=campaign_id,
+                         agent_type=data.get('agent_type'))
+    lease_expires_at = claimed[0].claimed_at + timedelta(seconds=lease_seconds()) if claimed else None
+    
+    return jsonify({
+        'recommendations': [
+            {**recommendation.to_dict(), 'campaign': {
+                'id': recommendation.campaign.id,
+                'name': recommendation.campaign.name,
+                'organization_id': recommendation.campaign.organization_id
+            }}
+            for recommendation in claimed
+        ],
+        'lease_expires_at': lease_expires_at.isoformat() if lease_expires_at else None
+    }), 200
+
+
+_REVIEW_CONFLICT_ERROR = 'Recommendation is already reviewed or claimed by another reviewer'
+
+
+def _review_conflict(recommendation_id):
+    return {'id': recommendation_id, 'status': 'error', 'code': 409, 'error': _REVIEW_CONFLICT_ERROR}
+
+
+def _review_values(current_user, status, review_notes, reviewed_at):
+    """Columns set by a review; the reviewer's claim ends with it."""
+    return {
+        AIRecommendation.status: status,
+        AIRecommendation.reviewed_by: current_user.id,
+        AIRecommendation.reviewed_at: reviewed_at,
+        AIRecommendation.review_notes: review_notes,
+        AIRecommendation.claimed_by: None,
+        AIRecommendation.claimed_at: None
+    }
+
+
+def _review_one(current_user, recommendation, status, review_notes):
+    """
+    Review one recommendation with the same conditional UPDATE as the bulk review.
+    
+    Returns:
+        False, leaving it alone, if it is already reviewed or under another
+        reviewer's live claim
+    """
+    updated = AIRecommendation.query.filter(
+        AIRecommendation.id == recommendation.id, reviewable(current_user.id)
+    ).update(_review_values(current_user, status, review_notes, datetime.utcnow()), synchronize_session='fetch')
+    if not updated:
+        return False
+    # The UPDATE skips the mapper events that keep this index current
+    reindex_recommendations([recommendation.id])
+    log_recommendation_reviewed(current_user.id, recommendation.id, status)
+    return True
+
+
 @ai_bp.route('/recommendations/<int:recommendation_id>/approve', methods=['PUT'])
 @jwt_required()
 def approve_recommendation(recommendation_id):
@@ -395,20 +1041,14 @@ def approve_recommendation(recommendation_id):
     
     data = request.get_json() or {}
     
-    recommendation.status = 'approved'
-    recommendation.reviewed_by = current_user.id
-    recommendation.reviewed_at = datetime.utcnow()
-    recommendation.review_notes = data.get('review_notes', '')
-    
     try:
-        db.session.commit()
-        
-        # Log the review
-        log_recommendation_reviewed(current_user.id, recommendation.id, 'approved')
+        if not _review_one(current_user, recommendation, 'approved', data.get('review_notes', '')):
+            return jsonify({'error': _REVIEW_CONFLICT_ERROR}), 409
         
         return jsonify({
             'message': 'Recommendation approved successfully',
-            'recommendation': recommendation.to_dict()
+            'recommendation': recommendation.to_dict(),
+            'near_duplicates': recommendation_duplicates(recommendation)
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -439,16 +1079,9 @@ def reject_recommendation(recommendation_id):
     if not data.get('review_notes'):
         return jsonify({'error': 'review_notes is required for rejection'}), 400
     
-    recommendation.status = 'rejected'
-    recommendation.reviewed_by = current_user.id
-    recommendation.reviewed_at = datetime.utcnow()
-    recommendation.review_notes = data['review_notes']
-    
     try:
-        db.session.commit()
-        
-        # Log the review
-        log_recommendation_reviewed(current_user.id, recommendation.id, 'rejected')
+        if not _review_one(current_user, recommendation, 'rejected', data['review_notes']):
+            return jsonify({'error': _REVIEW_CONFLICT_ERROR}), 409
         
         return jsonify({
             'message': 'Recommendation rejected successfully',
@@ -489,22 +1122,112 @@ def review_recommendation(recommendation_id):
     if status == 'rejected' and not data.get('review_notes'):
         return jsonify({'error': 'review_notes is required for rejection'}), 400
     
-    recommendation.status = status
-    recommendation.reviewed_by = current_user.id
-    recommendation.reviewed_at = datetime.utcnow()
-    recommendation.review_notes = data.get('review_notes', '')
-    
     try:
-        db.session.commit()
-        
-        # Log the review
-        log_recommendation_reviewed(current_user.id, recommendation.id, status)
+        if not _review_one(current_user, recommendation, status, data.get('review_notes', '')):
+            return jsonify({'error': _REVIEW_CONFLICT_ERROR}), 409
         
         return jsonify({
             'message': f'Recommendation {status} successfully',
-            'recommendation': recommendation.to_dict()
+            'recommendation': recommendation.to_dict(),
+            'near_duplicates': recommendation_duplicates(recommendation) if status == 'approved' else []
         }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+
+@ai_bp.route('/recommendations/review', methods=['PUT'])
+@jwt_required()
+def bulk_review_recommendations():
+    """
+    Review many recommendations at once.
+    
+    Body: {"ids": [...], "status": "approved" or "rejected", "review_notes"}.
+    Recommendations are authorized in one query, updated with one UPDATE and
+    audited with one multi-row insert. Returns a per-id status; recommendations
+    already reviewed or under another reviewer's live claim get a 409.
+    """
+    current_user = get_current_user()
+    if current_user.role not in ['super_admin', 'org_admin', 'campaign_manager', 'reviewer']:
+        return jsonify({'error': 'Insufficient permissions to review'}), 403
+    
+    data = request.get_json() or {}
+    ids = data.get('ids')
+    status = data.get('status')
+    
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'ids must be a non-empty list'}), 400
+    
+    max_ids = current_app.config['AI_REVIEW_MAX_IDS']
+    if len(ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} ids are allowed per review'}), 400
+    
+    try:
+        ids = list(dict.fromkeys(int(recommendation_id) for recommendation_id in ids))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ids must be integers'}), 400
+    
+    if status not in ['approved', 'rejected']:
+        return jsonify({'error': 'status must be either "approved" or "rejected"'}), 400
+    
+    if status == 'rejected' and not data.get('review_notes'):
+        return jsonify({'error': 'review_notes is required for rejection'}), 400
+    
+    # Authorize every recommendation in one query; still_reviewable is false for
+    # recommendations already reviewed or under another reviewer's live claim
+    found = {
+        row.id: row for row in db.session.query(
+            AIRecommendation.id, Campaign.organization_id, reviewable(current_user.id).label('still_reviewable')
+        ).join(
+            Campaign, AIRecommendation.campaign_id == Campaign.id
+        ).filter(AIRecommendation.id.in_(ids))
+    }
+    
+    results = {}
+    reviewed = []
+    for recommendation_id in ids:
+        row = found.get(recommendation_id)
+        if row is None:
+            results[recommendation_id] = {'id': recommendation_id, 'status': 'error', 'code': 404,
+                                          'error': 'Recommendation not found'}
+        elif not can_access_campaign(current_user, row):
+            results[recommendation_id] = {'id': recommendation_id, 'status': 'error', 'code': 403,
+                                          'error': 'Insufficient permissions'}
+        elif not row.still_reviewable:
+            results[recommendation_id] = _review_conflict(recommendation_id)
+        else:
+            reviewed.append(recommendation_id)
+            results[recommendation_id] = {'id': recommendation_id, 'status': status, 'code': 200}
+    
+    if reviewed:
+        reviewed_at = datetime.utcnow()
+        try:
+            # The UPDATE re-checks the same condition, so a recommendation reviewed
+            # or claimed by someone else since the query above is left alone
+            updated = AIRecommendation.query.filter(
+                AIRecommendation.id.in_(reviewed), reviewable(current_user.id)
+            ).update(_review_values(current_user, status, data.get('review_notes', ''), reviewed_at),
+                     synchronize_session=False)
+            if updated < len(reviewed):
+                won = {row.id for row in db.session.query(AIRecommendation.id).filter(
+                    AIRecommendation.id.in_(reviewed),
+                    AIRecommendation.reviewed_by == current_user.id,
+                    AIRecommendation.reviewed_at == reviewed_at
+                )}
+                for recommendation_id in reviewed:
+                    if recommendation_id not in won:
+                        results[recommendation_id] = _review_conflict(recommendation_id)
+                reviewed = [recommendation_id for recommendation_id in reviewed if recommendation_id in won]
+            if reviewed:
+                # The bulk UPDATE skips the mapper events that keep this index current
+                reindex_recommendations(reviewed)
+                log_recommendations_reviewed(current_user.id, reviewed, status)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'results': list(results.values()),
+        'reviewed': len(reviewed),
+        'failed': len(ids) - len(reviewed)
+    }), 200
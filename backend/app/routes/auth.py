@@ -43,7 +43,7 @@ def register():
     
     try:
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         
         return jsonify({
             'message': 'User registered successfully',
@@ -70,9 +70,8 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Account is inactive'}), 403
     
-    # Update last login
+    # Update last login; committed with the audit entry when the request ends
     user.last_login = datetime.utcnow()
-    db.session.commit()
     
     # Create tokens
     access_token = create_access_token(identity=str(user.id))
@@ -142,7 +141,6 @@ def change_password():
         return jsonify({'error': 'Current password is incorrect'}), 401
     
     user.set_password(data['new_password'])
-    db.session.commit()
     
     return jsonify({'message': 'Password changed successfully'}), 200
 
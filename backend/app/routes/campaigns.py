@@ -1,21 +1,31 @@
 """Campaign management routes."""
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from datetime import datetime
-from app.models import Campaign, Analytics, db
-from app.utils.auth import get_current_user, can_access_campaign, can_edit_campaign
-from app.utils.audit import log_campaign_created
+from sqlalchemy import case, exists, func, or_
+from app.models import Campaign, Analytics, AIRecommendation, AgentJob, Content, db
+from app.utils.auth import get_current_user, can_access_campaign, can_edit_campaign, editable_campaigns_filter
+from app.utils.audit import log_action, log_campaign_created
+from app.utils.pagination import paginate_request, empty_page, InvalidCursor
+from app.services import lookup, search
 
 campaigns_bp = Blueprint('campaigns', __name__, url_prefix='/api/campaigns')
 
+VALID_STATUSES = ['draft', 'active', 'paused', 'completed']
+VALID_TYPES = ['political', 'civic_education', 'advocacy']
+
+# Fields a bulk request's "filter" may match on
+BULK_FILTER_FIELDS = ('organization_id', 'status', 'campaign_type')
+
+# Campaigns with rows in these tables cannot be deleted
+DEPENDENT_MODELS = (AIRecommendation, AgentJob, Content, Analytics)
+
 
 @campaigns_bp.route('', methods=['GET'])
 @jwt_required()
 def list_campaigns():
     """List campaigns."""
     current_user = get_current_user()
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
     
     query = Campaign.query
     
@@ -24,7 +34,7 @@ def list_campaigns():
         if current_user.organization_id:
             query = query.filter_by(organization_id=current_user.organization_id)
         else:
-            return jsonify({'campaigns': [], 'total': 0}), 200
+            return jsonify({'campaigns': [], **empty_page()}), 200
     
     # Apply filters
     if 'organization_id' in request.args:
@@ -39,16 +49,14 @@ def list_campaigns():
         query = query.filter_by(campaign_type=request.args['campaign_type'])
     
     # Paginate
-    pagination = query.order_by(Campaign.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    try:
+        campaigns, page_meta = paginate_request(query, Campaign)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'campaigns': [campaign.to_dict() for campaign in pagination.items],
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': pagination.pages
+        'campaigns': [campaign.to_dict() for campaign in campaigns],
+        **page_meta
     }), 200
 
 
@@ -83,8 +91,7 @@ def create_campaign():
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
     # Validate campaign type
-    valid_types = ['political', 'civic_education', 'advocacy']
-    if data['campaign_type'] not in valid_types:
+    if data['campaign_type'] not in VALID_TYPES:
         return jsonify({'error': 'Invalid campaign type'}), 400
     
     # Determine organization_id
@@ -126,7 +133,7 @@ def create_campaign():
     
     try:
         db.session.add(campaign)
-        db.session.commit()
+        db.session.flush()
         
         # Log campaign creation
         log_campaign_created(current_user.id, campaign.id)
@@ -164,8 +171,7 @@ def update_campaign(campaign_id):
         campaign.description = data['description']
     
     if 'status' in data:
-        valid_statuses = ['draft', 'active', 'paused', 'completed']
-        if data['status'] in valid_statuses:
+        if data['status'] in VALID_STATUSES:
             campaign.status = data['status']
     
     if 'target_audience' in data:
@@ -187,7 +193,7 @@ def update_campaign(campaign_id):
             return jsonify({'error': 'Invalid end_date format'}), 400
     
     try:
-        db.session.commit()
+        db.session.flush()
         return jsonify({
             'message': 'Campaign updated successfully',
             'campaign': campaign.to_dict()
@@ -213,13 +219,204 @@ def delete_campaign(campaign_id):
     
     try:
         db.session.delete(campaign)
-        db.session.commit()
+        db.session.flush()
         return jsonify({'message': 'Campaign deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+def _filter_error(filters):
+    """Why a bulk request's filter is invalid, or None if it is usable."""
+    if not isinstance(filters, dict) or not filters or set(filters) - set(BULK_FILTER_FIELDS):
+        return f'filter must match on one or more of {", ".join(BULK_FILTER_FIELDS)}'
+    organization_id = filters.get('organization_id')
+    if 'organization_id' in filters and (not isinstance(organization_id, int) or isinstance(organization_id, bool)):
+        return 'filter organization_id must be an integer'
+    if 'status' in filters and filters['status'] not in VALID_STATUSES:
+        return f'filter status must be one of {", ".join(VALID_STATUSES)}'
+    if 'campaign_type' in filters and filters['campaign_type'] not in VALID_TYPES:
+        return f'filter campaign_type must be one of {", ".join(VALID_TYPES)}'
+    return None
+
+
+def _bulk_targets(current_user, data, check_dependents=False):
+    """
+    Resolve and authorize a bulk request's campaigns in one query.
+    
+    The body selects campaigns by "ids" or by "filter" (any of
+    BULK_FILTER_FIELDS); filters only match campaigns the user can see.
+    Either way at most CAMPAIGN_BULK_MAX_IDS campaigns are selected.
+    Editing follows can_edit_campaign.
+    
+    Returns:
+        Tuple of (per-campaign results, ids to change, selection for the
+        audit record), or (None, None, error response)
+    """
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if (ids is None) == (filters is None):
+        return None, None, (jsonify({'error': 'Provide either ids or filter'}), 400)
+    
+    editable = case((editable_campaigns_filter(current_user), True), else_=False).label('editable')
+    columns = [Campaign.id, editable]
+    if check_dependents:
+        columns.append(or_(*(
+            exists().where(model.campaign_id == Campaign.id) for model in DEPENDENT_MODELS
+        )).label('has_dependents'))
+    query = db.session.query(*columns)
+    max_ids = current_app.config['CAMPAIGN_BULK_MAX_IDS']
+    
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            return None, None, (jsonify({'error': 'ids must be a non-empty list'}), 400)
+        if len(ids) > max_ids:
+            return None, None, (jsonify({'error': f'At most {max_ids} ids are allowed per request'}), 400)
+        try:
+            ids = list(dict.fromkeys(int(campaign_id) for campaign_id in ids))
+        except (TypeError, ValueError):
+            return None, None, (jsonify({'error': 'ids must be integers'}), 400)
+        found = {row.id: row for row in query.filter(Campaign.id.in_(ids))}
+        selection = {'ids': ids}
+    else:
+        error = _filter_error(filters)
+        if error:
+            return None, None, (jsonify({'error': error}), 400)
+        query = query.filter_by(**filters)
+        if current_user.role != 'super_admin':
+            query = query.filter(Campaign.organization_id == current_user.organization_id)
+        found = {row.id: row for row in query.order_by(Campaign.id).limit(max_ids + 1)}
+        if len(found) > max_ids:
+            return None, None, (jsonify({
+                'error': f'filter matches more than {max_ids} campaigns; narrow it or send ids'
+            }), 400)
+        ids = list(found)
+        selection = {'filter': filters}
+    
+    results = []
+    allowed = []
+    for campaign_id in ids:
+        row = found.get(campaign_id)
+        if row is None:
+            results.append({'id': campaign_id, 'status': 'error', 'code': 404, 'error': 'Campaign not found'})
+        elif not row.editable:
+            results.append({'id': campaign_id, 'status': 'error', 'code': 403, 'error': 'Insufficient permissions'})
+        elif check_dependents and row.has_dependents:
+            results.append({'id': campaign_id, 'status': 'error', 'code': 409,
+                            'error': 'Campaign has recommendations, jobs, content or analytics'})
+        else:
+            allowed.append(campaign_id)
+            results.append({'id': campaign_id, 'status': 'ok', 'code': 200})
+    return results, allowed, selection
+
+
+def _shifted(column, days):
+    """Date column moved by a number of days, in SQL."""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, f'{days:+d} days')
+    return column + days
+
+
+def _bulk_response(results, allowed, done_key='updated'):
+    return jsonify({
+        'results': results,
+        done_key: len(allowed),
+        'failed': len(results) - len(allowed)
+    }), 200
+
+
+@campaigns_bp.route('/bulk/status', methods=['PUT'])
+@jwt_required()
+def bulk_update_status():
+    """
+    Set the status of many campaigns at once.
+    
+    Body: {"ids": [...]} or {"filter": {...}}, plus "status". Runs as one
+    UPDATE and writes one audit record for the batch. Returns a per-campaign
+    status.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    status = data.get('status')
+    if status not in VALID_STATUSES:
+        return jsonify({'error': f'status must be one of {", ".join(VALID_STATUSES)}'}), 400
+    
+    results, allowed, selection = _bulk_targets(current_user, data)
+    if results is None:
+        return selection
+    
+    if allowed:
+        Campaign.query.filter(Campaign.id.in_(allowed)).update(
+            {Campaign.status: status}, synchronize_session=False
+        )
+        lookup.invalidate('campaign')
+        log_action(current_user.id, 'campaigns_status_changed', 'campaign', None, {
+            **selection, 'status': status, 'campaign_ids': allowed
+        })
+    return _bulk_response(results, allowed)
+
+
+@campaigns_bp.route('/bulk/dates', methods=['PUT'])
+@jwt_required()
+def bulk_shift_dates():
+    """
+    Move the start and end dates of many campaigns by a number of days.
+    
+    Body: {"ids": [...]} or {"filter": {...}}, plus "shift_days" (negative
+    moves earlier; missing dates stay missing). Runs as one UPDATE and
+    writes one audit record for the batch. Returns a per-campaign status.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    shift_days = data.get('shift_days')
+    if not isinstance(shift_days, int) or isinstance(shift_days, bool) or not shift_days \
+            or abs(shift_days) > 3650:
+        return jsonify({'error': 'shift_days must be a non-zero whole number of days, at most 3650'}), 400
+    
+    results, allowed, selection = _bulk_targets(current_user, data)
+    if results is None:
+        return selection
+    
+    if allowed:
+        Campaign.query.filter(Campaign.id.in_(allowed)).update({
+            Campaign.start_date: _shifted(Campaign.start_date, shift_days),
+            Campaign.end_date: _shifted(Campaign.end_date, shift_days)
+        }, synchronize_session=False)
+        log_action(current_user.id, 'campaigns_dates_shifted', 'campaign', None, {
+            **selection, 'shift_days': shift_days, 'campaign_ids': allowed
+        })
+    return _bulk_response(results, allowed)
+
+
+@campaigns_bp.route('/bulk/delete', methods=['POST'])
+@jwt_required()
+def bulk_delete():
+    """
+    Delete many campaigns at once.
+    
+    Body: {"ids": [...]} or {"filter": {...}}. Campaigns that still have
+    recommendations, jobs, content or analytics are left alone (409). Runs
+    as one DELETE and writes one audit record for the batch. Returns a
+    per-campaign status.
+    """
+    current_user = get_current_user()
+    data = request.get_json() or {}
+    
+    results, allowed, selection = _bulk_targets(current_user, data, check_dependents=True)
+    if results is None:
+        return selection
+    
+    if allowed:
+        # A set-based DELETE skips the mapper events that maintain these indexes
+        search.remove_documents('campaign', allowed)
+        Campaign.query.filter(Campaign.id.in_(allowed)).delete(synchronize_session=False)
+        lookup.invalidate('campaign')
+        log_action(current_user.id, 'campaigns_deleted', 'campaign', None, {
+            **selection, 'campaign_ids': allowed
+        })
+    return _bulk_response(results, allowed, 'deleted')
+
+
 @campaigns_bp.route('/<int:campaign_id>/analytics', methods=['GET'])
 @jwt_required()
 def get_campaign_analytics(campaign_id):
@@ -40,8 +40,8 @@ def seed_database():
         )
         db.session.add(org)
         
-        # Commit all changes
-        db.session.commit()
+        # Write all changes; committed when the request ends
+        db.session.flush()
         
         return jsonify({
             'status': 'success',
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.models import Organization, db
 from app.utils.auth import role_required, get_current_user, can_access_organization
+from app.utils.pagination import paginate_request, empty_page, InvalidCursor
 
 organizations_bp = Blueprint('organizations', __name__, url_prefix='/api/organizations')
 
@@ -12,8 +13,6 @@ organizations_bp = Blueprint('organizations', __name__, url_prefix='/api/organiz
 def list_organizations():
     """List organizations."""
     current_user = get_current_user()
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
     
     query = Organization.query
     
@@ -22,7 +21,7 @@ def list_organizations():
         if current_user.organization_id:
             query = query.filter_by(id=current_user.organization_id)
         else:
-            return jsonify({'organizations': [], 'total': 0}), 200
+            return jsonify({'organizations': [], **empty_page()}), 200
     
     # Apply filters
     if 'type' in request.args:
@@ -33,14 +32,14 @@ def list_organizations():
         query = query.filter_by(is_active=is_active)
     
     # Paginate
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    try:
+        organizations, page_meta = paginate_request(query, Organization)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'organizations': [org.to_dict() for org in pagination.items],
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': pagination.pages
+        'organizations': [org.to_dict() for org in organizations],
+        **page_meta
     }), 200
 
 
@@ -93,7 +92,7 @@ def create_organization():
     
     try:
         db.session.add(organization)
-        db.session.commit()
+        db.session.flush()
         
         return jsonify({
             'message': 'Organization created successfully',
@@ -148,7 +147,7 @@ def update_organization(org_id):
             organization.compliance_status = data['compliance_status']
     
     try:
-        db.session.commit()
+        db.session.flush()
         return jsonify({
             'message': 'Organization updated successfully',
             'organization': organization.to_dict()
@@ -172,7 +171,7 @@ def delete_organization(org_id):
     organization.is_active = False
     
     try:
-        db.session.commit()
+        db.session.flush()
         return jsonify({'message': 'Organization deactivated successfully'}), 200
     except Exception as e:
         db.session.rollback()
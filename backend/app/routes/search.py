@@ -0,0 +1,93 @@
+"""Search routes."""
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from app.models import Campaign, db
+from app.utils.auth import get_current_user, can_access_campaign
+from app.services.search import DOC_TYPES, search as search_documents
+from app.services.lookup import SOURCES as LOOKUP_TYPES, lookup as lookup_names
+
+search_bp = Blueprint('search', __name__, url_prefix='/api')
+
+
+@search_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search():
+    """
+    Full-text search over campaigns, content and recommendations.
+
+    Query parameters: q (required), type (comma-separated subset of
+    campaign, content, recommendation), campaign_id, per_page and offset.
+    Results are ranked best first; matched words in 'highlight' are wrapped
+    in <mark> tags. Users only see their own organization's documents.
+    """
+    current_user = get_current_user()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+
+    doc_types = [doc_type.strip() for doc_type in request.args.get('type', '').split(',') if doc_type.strip()]
+    invalid = [doc_type for doc_type in doc_types if doc_type not in DOC_TYPES]
+    if invalid:
+        return jsonify({'error': f'type must be one of {", ".join(DOC_TYPES)}'}), 400
+
+    per_page = request.args.get('per_page', current_app.config['ITEMS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_ITEMS_PER_PAGE']))
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    campaign_id = request.args.get('campaign_id', type=int)
+    if campaign_id:
+        campaign = db.session.get(Campaign, campaign_id)
+        if not campaign:
+            return jsonify({'error': 'Campaign not found'}), 404
+        if not can_access_campaign(current_user, campaign):
+            return jsonify({'error': 'Insufficient permissions'}), 403
+
+    if current_user.role == 'super_admin':
+        organization_id = None
+    elif current_user.organization_id:
+        organization_id = current_user.organization_id
+    else:
+        return jsonify({'results': [], 'per_page': per_page, 'has_more': False, 'next_offset': None}), 200
+
+    # One extra row tells whether another page exists
+    results = search_documents(query, organization_id=organization_id, doc_types=doc_types or None,
+                               campaign_id=campaign_id, limit=per_page + 1, offset=offset)
+    has_more = len(results) > per_page
+
+    return jsonify({
+        'results': results[:per_page],
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_offset': offset + per_page if has_more else None
+    }), 200
+
+
+@search_bp.route('/lookup', methods=['GET'])
+@jwt_required()
+def lookup():
+    """
+    Typeahead matches for campaign, organization or user names.
+
+    Query parameters: type (campaign, organization or user), q and limit.
+    Prefix matches come first, then close (fuzzy) matches. Users only see
+    their own organization; user lookups need super_admin or org_admin.
+    """
+    current_user = get_current_user()
+    lookup_type = request.args.get('type')
+    if lookup_type not in LOOKUP_TYPES:
+        return jsonify({'error': f'type must be one of {", ".join(LOOKUP_TYPES)}'}), 400
+    if lookup_type == 'user' and current_user.role not in ['super_admin', 'org_admin']:
+        return jsonify({'error': 'Insufficient permissions'}), 403
+
+    limit = request.args.get('limit', current_app.config['LOOKUP_LIMIT'], type=int)
+    limit = max(1, min(limit, current_app.config['LOOKUP_MAX_LIMIT']))
+
+    if current_user.role == 'super_admin':
+        scope_id = None
+    elif current_user.organization_id:
+        scope_id = current_user.organization_id
+    else:
+        return jsonify({'results': []}), 200
+
+    results = lookup_names(lookup_type, request.args.get('q', ''), scope_id=scope_id, limit=limit)
+    return jsonify({'results': results}), 200
@@ -1,9 +1,13 @@
 """User management routes."""
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required
 from app.models import User, db
 from app.utils.auth import role_required, get_current_user, can_manage_users
 from app.utils.audit import log_user_created
+from app.utils.pagination import paginate_request, InvalidCursor
+from app.services.user_import import FORMATS as IMPORT_FORMATS, UnreadableUpload, import_users as import_user_rows, \
+    read_rows
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -14,8 +18,6 @@ users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 def list_users():
     """List users."""
     current_user = get_current_user()
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
     
     # Build query based on user role
     query = User.query
@@ -38,14 +40,14 @@ def list_users():
             query = query.filter_by(organization_id=org_id)
     
     # Paginate
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    try:
+        users, page_meta = paginate_request(query, User)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'users': [user.to_dict() for user in pagination.items],
-        'total': pagination.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': pagination.pages
+        'users': [user.to_dict() for user in users],
+        **page_meta
     }), 200
 
 
@@ -112,7 +114,7 @@ def create_user():
     
     try:
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         
         # Log user creation
         log_user_created(current_user.id, user.id)
@@ -126,6 +128,54 @@ def create_user():
         return jsonify({'error': str(e)}), 500
 
 
+@users_bp.route('/import', methods=['POST'])
+@jwt_required()
+@role_required('super_admin', 'org_admin')
+def import_users():
+    """
+    Create users in bulk from a CSV or JSON Lines file.
+    
+    Send the file as the request body or as multipart field "file"; the
+    format comes from ?format=csv|jsonl, else the content type or file name.
+    Fields: email, password, full_name, role, and optionally is_active,
+    is_verified and (super admins only) organization_id; super admins may
+    also pass ?organization_id= as the default. Org admins import into their
+    own organization. The response streams one JSON line per row with its
+    outcome, then a {"summary": ...} line. If the file stops decoding or
+    parsing partway, an {"error": ...} line comes before the summary and the
+    remaining rows are not imported.
+    """
+    current_user = get_current_user()
+    
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    file_format = request.args.get('format')
+    if not file_format:
+        name = (upload.filename if upload else '') or ''
+        content_type = upload.mimetype if upload else request.mimetype
+        jsonl = name.endswith(('.jsonl', '.ndjson')) or content_type in (
+            'application/jsonl', 'application/x-ndjson', 'application/x-jsonlines'
+        )
+        file_format = 'jsonl' if jsonl else 'csv'
+    if file_format not in IMPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(IMPORT_FORMATS)}'}), 400
+    
+    organization_id = request.args.get('organization_id', type=int)
+    
+    def generate():
+        summary = {'created': 0, 'failed': 0}
+        try:
+            for result in import_user_rows(read_rows(stream, file_format), current_user, organization_id):
+                summary['created' if result['status'] == 'created' else 'failed'] += 1
+                yield json.dumps(result) + '\n'
+        except UnreadableUpload as e:
+            processed = summary['created'] + summary['failed']
+            yield json.dumps({'error': f'{e}; rows after row {processed} were not imported'}) + '\n'
+        yield json.dumps({'summary': summary}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @users_bp.route('/<int:user_id>', methods=['PUT'])
 @jwt_required()
 def update_user(user_id):
@@ -169,7 +219,7 @@ def update_user(user_id):
         user.is_verified = data['is_verified']
     
     try:
-        db.session.commit()
+        db.session.flush()
         return jsonify({
             'message': 'User updated successfully',
             'user': user.to_dict()
@@ -203,7 +253,7 @@ def delete_user(user_id):
     user.is_active = False
     
     try:
-        db.session.commit()
+        db.session.flush()
         return jsonify({'message': 'User deactivated successfully'}), 200
     except Exception as e:
         db.session.rollback()
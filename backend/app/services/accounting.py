@@ -0,0 +1,308 @@
+"""Accounting for AI agent calls: latency, queue wait, tokens and cost.
+
+Every agent call made through the response cache is recorded in this
+process's in-memory accumulator, keyed by (organization, agent type,
+backend). A background thread periodically flushes the accumulated counters
+and latency histograms to ``agent_call_stats`` through its own session,
+so a flush during a request never commits or discards the request's
+changes, and a failed flush keeps its statistics for the next one. Reports
+merge the flushed rows from every worker.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+from flask import current_app
+from app.models import AgentCallStats
+from app.utils.unit_of_work import separate_session
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last
+# bucket catches everything slower
+BUCKET_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram that can be merged across workers."""
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts else [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, seconds * 1000)] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def percentile(self, fraction):
+        """
+        Upper bound in milliseconds of the bucket holding the percentile
+        (the largest bound for calls slower than every bucket).
+        """
+        total = sum(self.counts)
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKET_BOUNDS_MS[min(index, len(BUCKET_BOUNDS_MS) - 1)]
+        return None
+
+    def summary(self):
+        return {
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99)
+        }
+
+
+class CallStats:
+    """Counters and histograms for one (organization, agent type, backend)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.wall_seconds = 0.0
+        self.wall = Histogram()
+        self.queue = Histogram()
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.cache_hits += other.cache_hits
+        self.errors += other.errors
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cost_usd += other.cost_usd
+        self.wall_seconds += other.wall_seconds
+        self.wall.merge(other.wall)
+        self.queue.merge(other.queue)
+
+
+class Accumulator:
+    """Thread-safe per-process store of call statistics awaiting a flush."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, wall_seconds, queue_seconds, input_tokens, output_tokens, cost_usd,
+               cache_hit, error):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = CallStats()
+            stats.calls += 1
+            stats.cache_hits += int(cache_hit)
+            stats.errors += int(error)
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += cost_usd
+            stats.wall_seconds += wall_seconds
+            stats.wall.record(wall_seconds)
+            stats.queue.record(queue_seconds)
+
+    def drain(self):
+        """Take and reset everything recorded so far."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        return stats
+
+    def restore(self, drained):
+        """Put back statistics taken by drain() that could not be flushed."""
+        with self._lock:
+            for key, stats in drained.items():
+                current = self._stats.get(key)
+                if current is None:
+                    self._stats[key] = stats
+                else:
+                    current.merge(stats)
+
+
+_accumulator = Accumulator()
+
+
+def call_cost(model, input_tokens, output_tokens):
+    """Cost in USD of a call, from AI_MODEL_PRICES (USD per million tokens)."""
+    prices = current_app.config['AI_MODEL_PRICES'].get(model)
+    if not prices:
+        return 0.0
+    input_price, output_price = prices
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def record_call(organization_id, agent_type, backend, result=None, wall_seconds=0.0, queue_seconds=0.0,
+                error=False):
+    """
+    Record one agent call.
+
+    Tokens are only counted for calls that actually reached the model; cache
+    hits and coalesced calls reuse another call's output.
+
+    Args:
+        organization_id: Organization the call was made for (None if unknown)
+        agent_type: Type of AI agent
+        backend: Backend identifier, e.g. 'openai:gpt-4o-mini'
+        result: Agent result dict, if the call returned one
+        wall_seconds: End-to-end duration of the call
+        queue_seconds: Time spent waiting for scheduler or backend capacity
+        error: Whether the call failed or was throttled
+    """
+    result = result or {}
+    cache = result.get('cache') or {}
+    cache_hit = bool(cache.get('hit'))
+    usage = {} if cache_hit else (result.get('usage') or {})
+    input_tokens = int(usage.get('input_tokens', 0))
+    output_tokens = int(usage.get('output_tokens', 0))
+    model = backend.split(':', 1)[-1]
+
+    _accumulator.record(
+        (organization_id, agent_type, backend),
+        wall_seconds,
+        queue_seconds + usage.get('queue_seconds', 0),
+        input_tokens,
+        output_tokens,
+        call_cost(model, input_tokens, output_tokens),
+        cache_hit,
+        error or not result.get('success', False)
+    )
+
+
+def flush():
+    """Write this process's accumulated statistics to the database."""
+    drained = _accumulator.drain()
+    if not drained:
+        return 0
+
+    period_start = datetime.utcnow().replace(second=0, microsecond=0)
+    try:
+        with separate_session() as session:
+            session.add_all([
+                AgentCallStats(
+                    period_start=period_start,
+                    organization_id=organization_id,
+                    agent_type=agent_type,
+                    backend=backend,
+                    calls=stats.calls,
+                    cache_hits=stats.cache_hits,
+                    errors=stats.errors,
+                    input_tokens=stats.input_tokens,
+                    output_tokens=stats.output_tokens,
+                    cost_usd=stats.cost_usd,
+                    wall_seconds=stats.wall_seconds,
+                    wall_histogram=json.dumps(stats.wall.counts),
+                    queue_histogram=json.dumps(stats.queue.counts)
+                )
+                for (organization_id, agent_type, backend), stats in drained.items()
+            ])
+    except Exception as e:
+        print(f"Error flushing agent call statistics: {e}")
+        _accumulator.restore(drained)
+        return 0
+    return len(drained)
+
+
+def report(since, organization_id=None, agent_type=None):
+    """
+    Aggregate flushed statistics per organization and agent type.
+
+    Args:
+        since: Only include periods starting at or after this datetime
+        organization_id: Restrict to one organization
+        agent_type: Restrict to one agent type
+
+    Returns:
+        List of dicts with totals, cache hit rate, cost, latency and queue
+        wait percentiles, and a per-backend call breakdown
+    """
+    query = AgentCallStats.query.filter(AgentCallStats.period_start >= since)
+    if organization_id is not None:
+        query = query.filter(AgentCallStats.organization_id == organization_id)
+    if agent_type:
+        query = query.filter(AgentCallStats.agent_type == agent_type)
+
+    groups = {}
+    for row in query:
+        key = (row.organization_id, row.agent_type)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'stats': CallStats(), 'backends': {}}
+        stats = group['stats']
+        stats.calls += row.calls
+        stats.cache_hits += row.cache_hits
+        stats.errors += row.errors
+        stats.input_tokens += row.input_tokens
+        stats.output_tokens += row.output_tokens
+        stats.cost_usd += row.cost_usd
+        stats.wall_seconds += row.wall_seconds
+        stats.wall.merge(Histogram(json.loads(row.wall_histogram)))
+        stats.queue.merge(Histogram(json.loads(row.queue_histogram)))
+        group['backends'][row.backend] = group['backends'].get(row.backend, 0) + row.calls
+
+    rows = []
+    for (org_id, agent), group in sorted(groups.items(), key=lambda item: (item[0][0] or 0, item[0][1])):
+        stats = group['stats']
+        rows.append({
+            'organization_id': org_id,
+            'agent_type': agent,
+            'calls': stats.calls,
+            'cache_hits': stats.cache_hits,
+            'cache_hit_rate': round(stats.cache_hits / stats.calls, 4) if stats.calls else 0,
+            'errors': stats.errors,
+            'input_tokens': stats.input_tokens,
+            'output_tokens': stats.output_tokens,
+            'cost_usd': round(stats.cost_usd, 6),
+            'avg_wall_ms': round(stats.wall_seconds * 1000 / stats.calls, 1) if stats.calls else None,
+            'wall_time': stats.wall.summary(),
+            'queue_wait': stats.queue.summary(),
+            'backends': group['backends']
+        })
+    return rows
+
+
+def _run_flusher(app, interval):
+    stopped = threading.Event()
+    while not stopped.wait(interval):
+        try:
+            with app.app_context():
+                flush()
+        except Exception as e:
+            print(f"Error flushing agent call statistics: {e}")
+
+
+def _ensure_flusher(app):
+    """Start this process's flush thread (once per process, after any fork)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(
+            target=_run_flusher,
+            args=(app, app.config['AI_ACCOUNTING_FLUSH_SECONDS']),
+            name='agent-accounting',
+            daemon=True
+        ).start()
+
+        def flush_on_exit():
+            with app.app_context():
+                flush()
+        atexit.register(flush_on_exit)
+        _flusher_pid = os.getpid()
+
+
+def init_app(app):
+    """Flush agent call statistics periodically in each serving process."""
+    @app.before_request
+    def start_agent_accounting():
+        _ensure_flusher(app)
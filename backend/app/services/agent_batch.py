@@ -0,0 +1,65 @@
+"""Concurrent fan-out of AI agent calls on a bounded executor."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.services.agent_cache import cached_run_agent
+from app.services.scheduler import Throttled
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Get this process's shared, bounded agent executor."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config['AI_BATCH_MAX_WORKERS'],
+                    thread_name_prefix='agent-batch'
+                )
+    return _executor
+
+
+def run_concurrently(fn, argument_lists):
+    """
+    Call fn once per argument list on the shared executor, each inside the
+    current app context.
+
+    Returns:
+        List of return values in the same order as argument_lists
+    """
+    app = current_app._get_current_object()
+
+    def run(args):
+        with app.app_context():
+            return fn(*args)
+
+    futures = [get_executor().submit(run, args) for args in argument_lists]
+    return [future.result() for future in futures]
+
+
+def run_agents_concurrently(calls, bypass_cache=False):
+    """
+    Run several agent calls concurrently.
+
+    Args:
+        calls: List of (agent_type, payload, organization_id) tuples
+        bypass_cache: Always run the agents instead of reusing cached results
+
+    Returns:
+        List of agent results in the same order as calls. A call that raises
+        yields a failed result instead of aborting the others; throttled
+        calls also carry 'retry_after'.
+    """
+    def run(agent_type, payload, organization_id):
+        try:
+            return cached_run_agent(agent_type, payload, bypass_cache=bypass_cache,
+                                    organization_id=organization_id)
+        except Throttled as e:
+            return {'success': False, 'error': str(e), 'retry_after': e.retry_after}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    return run_concurrently(run, calls)
@@ -0,0 +1,402 @@
+"""Content-addressed cache for AI agent outputs.
+
+Results are keyed by a hash of (agent_type, model, normalized input payload),
+so the same campaign sent through the same agent with the same inputs reuses
+the earlier output. A per-process LRU tier with TTL and size limits sits in
+front of an optional database tier shared by all workers. The database tier
+is swept periodically: expired entries are removed, then the oldest entries
+beyond AGENT_CACHE_MAX_ROWS. Concurrent misses for the same key are
+coalesced so only one agent call runs per key.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import AgentCacheEntry
+from app.services.ai_agents import run_agent, get_ai_agent
+from app.services.model_backends import get_backend
+from app.services.scheduler import estimate_tokens, scheduled, settle_quota
+from app.services.accounting import record_call
+from app.services.single_flight import SingleFlight, claim_owner, acquire_claim, release_claim, wait_for_leader
+from app.utils.unit_of_work import separate_session
+
+
+def normalize_payload(value):
+    """Normalize an input payload so trivially different inputs hash the same."""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {str(k): normalize_payload(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_payload(v) for v in value]
+    return value
+
+
+def cache_key(agent_type, model, payload, version=None):
+    """Compute the content-addressed cache key for an agent invocation."""
+    canonical = json.dumps(
+        [agent_type, model, normalize_payload(payload)] + ([version] if version is not None else []),
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe in-memory LRU cache with TTL and entry/byte limits."""
+
+    def __init__(self, ttl_seconds, max_entries, max_bytes):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, cached_at, serialized)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (serialized value, cached_at) or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, cached_at, serialized = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return serialized, cached_at
+
+    def set(self, key, serialized, cached_at, ttl_seconds=None):
+        """Store a serialized value, evicting least recently used entries."""
+        if len(serialized) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, cached_at, serialized)
+            self._bytes += len(serialized)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, serialized = self._entries.pop(key)
+        self._bytes -= len(serialized)
+
+
+_memory_cache = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache():
+    """Get this process's in-memory cache tier."""
+    global _memory_cache
+    if _memory_cache is None:
+        with _memory_cache_lock:
+            if _memory_cache is None:
+                config = current_app.config
+                _memory_cache = ResponseCache(
+                    config['AGENT_CACHE_TTL_SECONDS'],
+                    config['AGENT_CACHE_MAX_ENTRIES'],
+                    config['AGENT_CACHE_MAX_BYTES']
+                )
+    return _memory_cache
+
+
+def _load_persistent(key):
+    """
+    Read an unexpired entry from the database tier.
+
+    Returns:
+        Tuple of (result dict, created_at, expires_at), or None; expired
+        entries are left for the sweep
+    """
+    with separate_session() as session:
+        entry = session.get(AgentCacheEntry, key)
+        if entry is None or entry.expires_at <= datetime.utcnow():
+            return None
+        return entry.get_payload(), entry.created_at, entry.expires_at
+
+
+def _store_persistent(key, agent_type, model, result, cached_at):
+    """
+    Write an entry to the database tier (best effort).
+    
+    The result body goes to the shared payload blobs, so an entry and the
+    recommendations saved from it store that body once.
+    """
+    ttl = timedelta(seconds=current_app.config['AGENT_CACHE_TTL_SECONDS'])
+    try:
+        # Its own transaction, so caching never commits the caller's pending changes
+        with separate_session() as session:
+            entry = session.get(AgentCacheEntry, key)
+            if entry is None:
+                entry = AgentCacheEntry(key=key)
+                session.add(entry)
+            entry.agent_type = agent_type
+            entry.model = model
+            entry.set_payload(result)
+            entry.created_at = cached_at
+            entry.expires_at = cached_at + ttl
+    except Exception as e:
+        print(f"Error storing agent cache entry: {e}")
+
+
+def lookup(key):
+    """
+    Look a key up in the memory tier, then the database tier.
+
+    Returns:
+        Tuple of (result dict, tier, cached_at), or None on a miss
+    """
+    config = current_app.config
+    memory = get_memory_cache()
+
+    hit = memory.get(key)
+    if hit is not None:
+        serialized, cached_at = hit
+        return json.loads(serialized), 'memory', cached_at
+
+    if config['AGENT_CACHE_PERSISTENT']:
+        hit = _load_persistent(key)
+        if hit is not None:
+            result, cached_at, expires_at = hit
+            remaining = (expires_at - datetime.utcnow()).total_seconds()
+            memory.set(key, json.dumps(result), cached_at, ttl_seconds=remaining)
+            return result, 'database', cached_at
+
+    return None
+
+
+def store(key, agent_type, model, result):
+    """Store a successful agent result in every enabled tier."""
+    result = {k: v for k, v in result.items() if k != 'cache'}
+    cached_at = datetime.utcnow()
+    get_memory_cache().set(key, json.dumps(result), cached_at)
+    if current_app.config['AGENT_CACHE_PERSISTENT']:
+        _store_persistent(key, agent_type, model, result, cached_at)
+
+
+# Claim key electing one process to sweep the database tier at a time
+SWEEP_CLAIM_KEY = 'agent-cache-sweep'
+
+
+def sweep():
+    """
+    Evict database tier entries: expired ones first, then the oldest beyond
+    AGENT_CACHE_MAX_ROWS.
+
+    At most AGENT_CACHE_SWEEP_BATCH entries go per call. Entries are deleted
+    through the ORM so the payload blobs they reference are released, and
+    only one process sweeps at a time.
+
+    Returns:
+        Number of entries removed
+    """
+    config = current_app.config
+    owner = claim_owner()
+    if not acquire_claim(SWEEP_CLAIM_KEY, owner, config['AGENT_CACHE_SWEEP_SECONDS']):
+        return 0
+    try:
+        batch = config['AGENT_CACHE_SWEEP_BATCH']
+        with separate_session() as session:
+            entries = session.query(AgentCacheEntry).filter(
+                AgentCacheEntry.expires_at <= datetime.utcnow()
+            ).order_by(AgentCacheEntry.expires_at).limit(batch).all()
+
+            excess = session.query(AgentCacheEntry).count() - len(entries) - config['AGENT_CACHE_MAX_ROWS']
+            if excess > 0 and len(entries) < batch:
+                oldest = session.query(AgentCacheEntry).order_by(AgentCacheEntry.created_at, AgentCacheEntry.key)
+                if entries:
+                    oldest = oldest.filter(AgentCacheEntry.key.notin_([entry.key for entry in entries]))
+                entries += oldest.limit(min(excess, batch - len(entries))).all()
+
+            for entry in entries:
+                session.delete(entry)
+        return len(entries)
+    finally:
+        release_claim(SWEEP_CLAIM_KEY, owner)
+
+
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+
+def _run_sweeper(app, interval):
+    stopped = threading.Event()
+    while not stopped.wait(interval):
+        try:
+            with app.app_context():
+                # Keep going while whole batches are removed, so a backlog drains
+                while sweep() >= app.config['AGENT_CACHE_SWEEP_BATCH']:
+                    pass
+        except Exception as e:
+            print(f"Error sweeping agent cache: {e}")
+
+
+def _ensure_sweeper(app):
+    """Start this process's sweep thread (once per process, after any fork)."""
+    global _sweeper_pid
+    if _sweeper_pid == os.getpid():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        threading.Thread(
+            target=_run_sweeper,
+            args=(app, app.config['AGENT_CACHE_SWEEP_SECONDS']),
+            name='agent-cache-sweep',
+            daemon=True
+        ).start()
+        _sweeper_pid = os.getpid()
+
+
+def init_app(app):
+    """Sweep the database tier of the cache periodically in each serving process."""
+    if not app.config['AGENT_CACHE_PERSISTENT']:
+        return
+
+    @app.before_request
+    def start_agent_cache_sweeper():
+        _ensure_sweeper(app)
+
+
+_flights = SingleFlight()
+
+
+def _run_scheduled(agent_type, payload, organization_id):
+    """Run the agent under the organization's limits, noting any slot wait in its usage."""
+    with scheduled(organization_id, payload) as waited:
+        result = run_agent(agent_type, payload)
+    settle_quota(organization_id, estimate_tokens(payload), result)
+    if waited:
+        usage = result.setdefault('usage', {})
+        usage['queue_seconds'] = usage.get('queue_seconds', 0) + waited
+    return result
+
+
+def _run_and_store(agent_type, model, key, payload, organization_id=None):
+    """Run the agent and cache a successful result; returns it serialized."""
+    result = _run_scheduled(agent_type, payload, organization_id)
+    # Demo fallbacks from a failing backend are not worth keeping
+    if result.get('success') and not result.get('fallback_reason'):
+        store(key, agent_type, model, result)
+    return json.dumps(result)
+
+
+def _run_coalesced(agent_type, model, key, payload, organization_id=None):
+    """
+    Run the agent as this process's leader for a key, deferring to another
+    process's leader if one already holds the claim.
+
+    Returns:
+        Tuple of (serialized result, cache hit tuple or None)
+    """
+    config = current_app.config
+    if not config['AGENT_CACHE_PERSISTENT']:
+        return _run_and_store(agent_type, model, key, payload, organization_id), None
+
+    owner = claim_owner()
+    if not acquire_claim(key, owner, config['AGENT_SINGLE_FLIGHT_TIMEOUT_SECONDS']):
+        hit = wait_for_leader(key, lambda: lookup(key), config['AGENT_SINGLE_FLIGHT_TIMEOUT_SECONDS'])
+        if hit is not None:
+            result, tier, cached_at = hit
+            return json.dumps(result), (tier, cached_at)
+        # The other leader failed or timed out, so run it here
+        return _run_and_store(agent_type, model, key, payload, organization_id), None
+
+    try:
+        return _run_and_store(agent_type, model, key, payload, organization_id), None
+    finally:
+        release_claim(key, owner)
+
+
+def cached_run_agent(agent_type, payload, bypass_cache=False, organization_id=None, queued_seconds=0.0):
+    """
+    Run an AI agent through the response cache.
+
+    Concurrent identical calls share one execution, and only calls that
+    reach the model count against the organization's quota. The returned result
+    carries a 'cache' entry recording whether the output was reused, so it
+    is kept alongside the stored recommendation.
+
+    Args:
+        agent_type: Type of AI agent
+        payload: Input dict passed to the agent
+        bypass_cache: Skip the cache lookup and coalescing, always run the agent
+        organization_id: Organization charged for model calls (see scheduler)
+        queued_seconds: Time the call already spent queued, e.g. as a job
+
+    Returns:
+        Dict containing the agent result
+
+    Raises:
+        Throttled: If the organization is over quota or capacity is exhausted
+    """
+    backend = get_backend()
+    model = f'{backend.name}:{backend.model}'
+    started = time.monotonic()
+    result = None
+    try:
+        result = _cached_run(agent_type, model, payload, bypass_cache, organization_id)
+        return result
+    finally:
+        # Every call is accounted, including throttled and failed ones
+        record_call(organization_id, agent_type, model, result,
+                    wall_seconds=time.monotonic() - started, queue_seconds=queued_seconds,
+                    error=result is None)
+
+
+def _cached_run(agent_type, model, payload, bypass_cache, organization_id):
+    if not current_app.config['AGENT_CACHE_ENABLED']:
+        return _run_scheduled(agent_type, payload, organization_id)
+
+    # Agents whose output depends on more than the payload expose a version
+    agent = get_ai_agent(agent_type)
+    cache_version = getattr(agent, 'cache_version', None)
+    key = cache_key(agent_type, model, payload, cache_version(payload) if cache_version else None)
+
+    if bypass_cache:
+        result = json.loads(_run_and_store(agent_type, model, key, payload, organization_id))
+        result['cache'] = {'hit': False, 'key': key, 'bypassed': True}
+        return result
+
+    hit = lookup(key)
+    if hit is not None:
+        result, tier, cached_at = hit
+        result['cache'] = {
+            'hit': True,
+            'key': key,
+            'tier': tier,
+            'cached_at': cached_at.isoformat()
+        }
+        return result
+
+    (serialized, remote_hit), shared = _flights.do(
+        key, lambda: _run_coalesced(agent_type, model, key, payload, organization_id)
+    )
+    result = json.loads(serialized)
+
+    if remote_hit is not None:
+        tier, cached_at = remote_hit
+        result['cache'] = {
+            'hit': True,
+            'key': key,
+            'tier': tier,
+            'cached_at': cached_at.isoformat(),
+            'coalesced': True
+        }
+    elif shared:
+        result['cache'] = {'hit': True, 'key': key, 'tier': 'inflight', 'coalesced': True}
+    else:
+        result['cache'] = {'hit': False, 'key': key, 'bypassed': False}
+    return result
@@ -1,5 +1,10 @@
-"""AI Agent services using demo data."""
+"""AI Agent services backed by a model backend, with demo data as fallback."""
+import json
 from datetime import datetime
+from app.services.model_backends import get_backend, approximate_tokens
+from app.services.sentiment import analyze_comments
+from app.services.misinformation import flag_feedback, get_ruleset
+from app.services.posting_windows import recommend as recommend_posting_windows, profile_version
 
 
 class NarrativeArchitect:
@@ -8,6 +13,14 @@ class NarrativeArchitect:
     Analyzes public discourse and suggests narrative frameworks.
     """
     
+    result_key = 'recommendations'
+    system_prompt = (
+        'You are a civic engagement narrative strategist. Given campaign details, propose '
+        'educational, non-manipulative narrative frameworks as JSON: {"narratives": [{"title", '
+        '"description", "key_points", "emotional_tone", "risk_assessment", "sources"}], '
+        '"safety_notes", "compliance_check"}.'
+    )
+    
     @staticmethod
     def generate_recommendations(campaign_data):
         """
@@ -82,6 +95,12 @@ class ContentSynthesizer:
     Generates educational explainer content.
     """
     
+    result_key = 'content'
+    system_prompt = (
+        'You write factual, educational civic content. Given a content request, respond as JSON: '
+        '{"title", "body", "key_messages", "call_to_action", "sources"}.'
+    )
+    
     @staticmethod
     def generate_content(content_request):
         """
@@ -115,17 +134,128 @@ class ContentSynthesizer:
         }
 
 
+    @staticmethod
+    def build_prompt(content_request):
+        """Build the model prompt for a content request."""
+        return (
+            f"Write a {content_request.get('content_type', 'post')} for {content_request.get('platform', 'general')} "
+            f"about {content_request.get('topic', '')}.\n"
+            f"Narrative: {content_request.get('narrative', '')}"
+        )
+    
+    @staticmethod
+    def stream_content(content_request, backend):
+        """
+        Generate content incrementally from a model backend.
+        
+        Args:
+            content_request: Dict containing content type, topic, narrative, etc.
+            backend: ModelBackend that generates the body
+        
+        Yields:
+            ('delta', text) tuples as the body is generated, then a final
+            ('result', dict) tuple shaped like generate_content's result.
+            Outside demo mode the result holds only the streamed text: the
+            title is the text's heading line if it starts with one, else the
+            requested topic, and the other content fields are left empty.
+        """
+        prompt = ContentSynthesizer.build_prompt(content_request)
+        system = 'Write the requested content as plain text.'
+        chunks = []
+        for chunk in backend.stream(prompt, system=system):
+            chunks.append(chunk)
+            yield 'delta', chunk
+        body = ''.join(chunks)
+        
+        if backend.name == 'demo':
+            result = ContentSynthesizer.generate_content(content_request)
+            result['content']['body'] = body
+            result['model_used'] = backend.model
+            result['streamed'] = True
+            yield 'result', result
+            return
+        
+        first_line = next((line.strip() for line in body.splitlines() if line.strip()), '')
+        heading = first_line.lstrip('#').strip() if first_line.startswith('#') else ''
+        result = {
+            'success': True,
+            'agent_type': 'content_synthesizer',
+            'content': {
+                'title': heading or content_request.get('topic', ''),
+                'body': body,
+                'key_messages': [],
+                'call_to_action': '',
+                'sources': []
+            },
+            'generated_at': datetime.utcnow().isoformat(),
+            'model_used': backend.model,
+            'demo_mode': False,
+            'streamed': True,
+            'usage': {
+                'input_tokens': approximate_tokens(system + prompt),
+                'output_tokens': approximate_tokens(body),
+                'estimated': True
+            }
+        }
+        yield 'result', result
+
+
 class DistributionOptimizer:
     """
     Distribution Optimizer AI Agent
     Recommends optimal posting times and channels.
     """
     
+    result_key = 'recommendations'
+    system_prompt = (
+        'You plan content distribution for civic campaigns. Given a content summary, audience, '
+        'platforms and budget, respond as JSON: {"optimal_times": [{"day", "time", "reason"}], '
+        '"channels": [{"platform", "priority", "reason"}], "content_format": []}. '
+        'When engagement_windows are given, base times and channels on them.'
+    )
+    
+    @staticmethod
+    def cache_version(campaign_data):
+        """Analytics watermark; cached plans are not reused once new engagement data arrives."""
+        campaign_id = campaign_data.get('campaign_id')
+        return profile_version(campaign_id) if campaign_id else None
+    
+    @staticmethod
+    def engagement_windows(campaign_data):
+        """Posting windows and channel ranking from Analytics, or None without history."""
+        campaign_id = campaign_data.get('campaign_id')
+        if not campaign_id:
+            return None
+        return recommend_posting_windows(campaign_id, campaign_data.get('platforms'))
+    
+    @staticmethod
+    def apply_engagement_windows(campaign_data, recommendations, windows=None):
+        """Replace posting times and channel priorities with ones measured from Analytics."""
+        windows = windows or DistributionOptimizer.engagement_windows(campaign_data)
+        if windows:
+            recommendations.update(windows)
+        return recommendations
+    
+    @staticmethod
+    def model_input(campaign_data):
+        """Model prompt input, including measured engagement windows when available."""
+        windows = DistributionOptimizer.engagement_windows(campaign_data)
+        return {**campaign_data, 'engagement_windows': windows} if windows else campaign_data
+    
+    @staticmethod
+    def postprocess_output(campaign_data, output):
+        """Ground the model's posting times and channels in measured engagement."""
+        return DistributionOptimizer.apply_engagement_windows(campaign_data, output)
+    
     @staticmethod
     def optimize_distribution(campaign_data):
         """
         Optimize content distribution strategy.
         
+        Posting times and channel priorities come from the campaign's
+        Analytics history (or its organization's) when there is any; the
+        remaining fields are demo data.
+        
         Args:
             campaign_data: Dict containing campaign info and target audience
         
@@ -133,7 +263,7 @@ class DistributionOptimizer:
             Dict containing distribution recommendations
         """
         
-        return {
+        result = {
             'success': True,
             'agent_type': 'distribution_optimizer',
             'recommendations': {
@@ -157,6 +287,8 @@ class DistributionOptimizer:
             'model_used': 'demo-mode',
             'demo_mode': True
         }
+        DistributionOptimizer.apply_engagement_windows(campaign_data, result['recommendations'])
+        return result
 
 
 class FeedbackIntelligence:
@@ -165,11 +297,76 @@ class FeedbackIntelligence:
     Analyzes engagement data and flags misinformation.
     """
     
+    result_key = 'analysis'
+    system_prompt = (
+        'You analyze civic campaign feedback. Given engagement metrics, comments and mentions, '
+        'respond as JSON: {"sentiment": {"positive", "neutral", "negative"}, "key_themes", '
+        '"engagement_metrics", "flags", "recommendations"}.'
+    )
+    
+    # Comments included verbatim in the model prompt; the rest are summarized
+    MAX_MODEL_COMMENTS = 50
+    
+    @staticmethod
+    def comment_texts(feedback_data):
+        """Text of the submitted sample comments (strings or {"text": ...} objects)."""
+        texts = []
+        for comment in feedback_data.get('sample_comments') or []:
+            if isinstance(comment, dict):
+                comment = comment.get('text')
+            if isinstance(comment, str) and comment:
+                texts.append(comment)
+        return texts
+    
+    @staticmethod
+    def cache_version(feedback_data):
+        """Misinformation rule version; cached analyses are not reused across rule changes."""
+        return get_ruleset().version
+    
+    @staticmethod
+    def apply_local_analysis(feedback_data, analysis):
+        """
+        Flag known misinformation in the comments and mentions, and replace
+        sentiment and key themes with lexicon scores of the comments.
+        """
+        analysis['flags'] = flag_feedback(feedback_data)
+        comments = FeedbackIntelligence.comment_texts(feedback_data)
+        if not comments:
+            return analysis
+        scored = analyze_comments(comments)
+        analysis['sentiment'] = scored['sentiment']
+        analysis['key_themes'] = scored['key_themes']
+        analysis['term_frequencies'] = scored['term_frequencies']
+        analysis['comments_analyzed'] = scored['comments_analyzed']
+        return analysis
+    
+    @staticmethod
+    def model_input(feedback_data):
+        """Model prompt input: a sample of the comments plus their local analysis."""
+        comments = FeedbackIntelligence.comment_texts(feedback_data)
+        if len(comments) <= FeedbackIntelligence.MAX_MODEL_COMMENTS:
+            return feedback_data
+        scored = analyze_comments(comments)
+        return {
+            **feedback_data,
+            'sample_comments': comments[:FeedbackIntelligence.MAX_MODEL_COMMENTS],
+            'comment_analysis': {key: scored[key] for key in ('sentiment', 'term_frequencies', 'comments_analyzed')}
+        }
+    
+    @staticmethod
+    def postprocess_output(feedback_data, output):
+        """Ground the model's sentiment, themes and flags in the local analysis."""
+        return FeedbackIntelligence.apply_local_analysis(feedback_data, output)
+    
     @staticmethod
     def analyze_feedback(feedback_data):
         """
         Analyze engagement and feedback data.
         
+        Sentiment and key themes are scored from sample_comments when any
+        are given, and flags come from the misinformation rules; the
+        remaining fields are demo data.
+        
         Args:
             feedback_data: Dict containing engagement metrics and comments
         
@@ -177,7 +374,7 @@ class FeedbackIntelligence:
             Dict containing analysis results
         """
         
-        return {
+        result = {
             'success': True,
             'agent_type': 'feedback_intelligence',
             'analysis': {
@@ -207,6 +404,8 @@ class FeedbackIntelligence:
             'model_used': 'demo-mode',
             'demo_mode': True
         }
+        FeedbackIntelligence.apply_local_analysis(feedback_data, result['analysis'])
+        return result
 
 
 def get_ai_agent(agent_type):
@@ -226,3 +425,69 @@ def get_ai_agent(agent_type):
         'feedback_intelligence': FeedbackIntelligence
     }
     return agents.get(agent_type)
+
+
+# Entry point method for each agent type
+AGENT_METHODS = {
+    'narrative_architect': 'generate_recommendations',
+    'content_synthesizer': 'generate_content',
+    'distribution_optimizer': 'optimize_distribution',
+    'feedback_intelligence': 'analyze_feedback'
+}
+
+
+def run_agent(agent_type, payload, backend=None):
+    """
+    Run an AI agent on its input payload.
+    
+    The configured model backend generates the result. Demo mode, or any
+    backend failure, falls back to the agent's curated demo data; fallbacks
+    record the reason in the result. Backend results carry a 'usage' entry
+    with token counts and backend queue wait.
+    
+    Args:
+        agent_type: Type of AI agent
+        payload: Input dict passed to the agent's entry point method
+        backend: ModelBackend to use (defaults to the configured backend)
+    
+    Returns:
+        Dict containing the agent result
+    """
+    agent = get_ai_agent(agent_type)
+    if not agent:
+        return {'success': False, 'error': f'Unknown agent type: {agent_type}'}
+    
+    demo = getattr(agent, AGENT_METHODS[agent_type])
+    backend = backend or get_backend()
+    if backend.name == 'demo':
+        return demo(payload)
+    
+    model_input = getattr(agent, 'model_input', None)
+    prompt = json.dumps(model_input(payload) if model_input else payload, default=str)
+    usage = {}
+    try:
+        completion = backend.complete(prompt, system=agent.system_prompt, json_mode=True, usage=usage)
+        output = json.loads(completion)
+        postprocess = getattr(agent, 'postprocess_output', None)
+        if postprocess and isinstance(output, dict):
+            output = postprocess(payload, output)
+    except Exception as e:
+        result = demo(payload)
+        result['fallback_reason'] = str(e)
+        return result
+    
+    # Backends that do not report token usage get an approximation
+    if not usage.get('input_tokens') and not usage.get('output_tokens'):
+        usage['input_tokens'] = approximate_tokens(agent.system_prompt + prompt)
+        usage['output_tokens'] = approximate_tokens(completion)
+        usage['estimated'] = True
+    
+    return {
+        'success': True,
+        'agent_type': agent_type,
+        agent.result_key: output,
+        'generated_at': datetime.utcnow().isoformat(),
+        'model_used': backend.model,
+        'demo_mode': False,
+        'usage': usage
+    }
@@ -0,0 +1,404 @@
+"""Similarity search over approved recommendations with local embeddings.
+
+Each approved recommendation is embedded together with its campaign's
+description, so a new campaign can find earlier recommendations made for
+similar campaigns and reuse them instead of calling an agent again.
+
+Embeddings are hashed TF-IDF vectors: word unigrams and bigrams (stop words
+removed) are hashed into EMBEDDING_DIM buckets, weighted by sublinear term
+frequency and inverse document frequency, and L2-normalized, so cosine
+similarity is a dot product.
+
+The index is a snapshot written to EMBEDDING_INDEX_DIR: a float32 matrix
+memory-mapped by every worker, row metadata, and the IDF weights. A small
+manifest names the current snapshot and is replaced atomically on rebuild;
+the snapshot it replaced is kept so workers that just read the old manifest
+can still open it, and older ones are deleted.
+Recommendations approved after the snapshot are embedded at query time.
+Once there are more than EMBEDDING_MAX_DELTA of them a rebuild starts in a
+background thread, while queries keep using the stale snapshot plus the
+delta. A claim row makes sure only one process rebuilds at a time.
+Search is brute force; above EMBEDDING_IVF_MIN_ROWS rows the
+snapshot is also partitioned with k-means (IVF) and only the lists nearest
+the query are scanned.
+"""
+import json
+import math
+import os
+import re
+import threading
+import uuid
+import zlib
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from app.models import AIRecommendation, Campaign
+from app.services.near_duplicates import recommendation_text
+from app.services.sentiment import STOP_WORDS
+from app.services.single_flight import claim_owner, acquire_claim, release_claim
+
+MANIFEST = 'manifest.json'
+
+# Claim key electing one process to rebuild the snapshot at a time
+REBUILD_CLAIM_KEY = 'embedding-index-rebuild'
+
+# k-means iterations and training sample size for IVF partitioning
+IVF_ITERATIONS = 10
+IVF_TRAINING_ROWS = 20000
+
+_TOKEN_RE = re.compile(r'\w+')
+
+_ROW_DTYPE = np.dtype([('id', '<i8'), ('organization_id', '<i8'), ('campaign_id', '<i8'), ('agent', '<i2')])
+
+_loaded = None
+_loaded_lock = threading.Lock()
+_rebuild_thread = None
+_rebuild_lock = threading.Lock()
+
+
+def campaign_text(campaign):
+    """Text describing a campaign for embedding."""
+    parts = [campaign.name, campaign.campaign_type, campaign.description, campaign.objectives, campaign.target_audience]
+    return '\n'.join(part for part in parts if part)
+
+
+def document_text(recommendation):
+    """Campaign description plus recommendation text."""
+    return campaign_text(recommendation.campaign) + '\n' + recommendation_text(
+        recommendation.agent_type, recommendation.get_recommendation_data()
+    )
+
+
+def term_buckets(text, dim):
+    """Hash bucket of every unigram and bigram in a text."""
+    tokens = [token for token in _TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS]
+    grams = tokens + [f'{first} {second}' for first, second in zip(tokens, tokens[1:])]
+    return np.fromiter((zlib.crc32(gram.encode()) % dim for gram in grams), dtype=np.int64, count=len(grams))
+
+
+def term_frequencies(texts, dim):
+    """Sublinear term frequency matrix (float32, one row per text)."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts = np.bincount(term_buckets(text, dim), minlength=dim)
+        nonzero = counts > 0
+        matrix[row, nonzero] = 1 + np.log(counts[nonzero])
+    return matrix
+
+
+def inverse_document_frequency(frequencies):
+    documents = len(frequencies)
+    df = np.count_nonzero(frequencies, axis=0)
+    return (np.log((1 + documents) / (1 + df)) + 1).astype(np.float32)
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def embed(texts, idf):
+    """L2-normalized TF-IDF embeddings of texts."""
+    return normalize(term_frequencies(texts, len(idf)) * idf)
+
+
+class EmbeddingIndex:
+    """A loaded snapshot: memory-mapped vectors plus metadata."""
+
+    @classmethod
+    def empty(cls, dim):
+        """Stand-in before the first snapshot: no rows, so every approval is scored at query time."""
+        index = cls.__new__(cls)
+        index.manifest = None
+        index.version = None
+        index.built_at = None
+        index.agent_types = []
+        index.vectors = np.zeros((0, dim), dtype=np.float32)
+        index.rows = np.zeros(0, dtype=_ROW_DTYPE)
+        index.idf = np.ones(dim, dtype=np.float32)
+        index.centroids = np.zeros((0, dim), dtype=np.float32)
+        index.list_offsets = np.zeros(1, dtype=np.int64)
+        return index
+
+    def __init__(self, directory, manifest):
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.built_at = datetime.fromisoformat(manifest['built_at'])
+        self.agent_types = manifest['agent_types']
+        prefix = os.path.join(directory, self.version)
+        self.vectors = np.load(prefix + '-vectors.npy', mmap_mode='r')
+        self.rows = np.load(prefix + '-rows.npy')
+        model = np.load(prefix + '-model.npz')
+        self.idf = model['idf']
+        self.centroids = model['centroids']  # empty without IVF
+        self.list_offsets = model['list_offsets']
+
+    def __len__(self):
+        return len(self.rows)
+
+    def candidate_ranges(self, vector, probes):
+        """Row ranges to scan: everything, or the IVF lists nearest the query."""
+        if not len(self.centroids):
+            return [(0, len(self.rows))]
+        nearest = np.argsort(-(self.centroids @ vector))[:probes]
+        return [(int(self.list_offsets[index]), int(self.list_offsets[index + 1])) for index in nearest]
+
+
+def _directory():
+    return current_app.config['EMBEDDING_INDEX_DIR']
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def load_index():
+    """The current snapshot, reloaded when the manifest changes; None if never built."""
+    global _loaded
+    directory = _directory()
+    for _ in range(2):
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            return _loaded
+        with _loaded_lock:
+            if _loaded is not None and _loaded.version == manifest['version']:
+                return _loaded
+        try:
+            index = EmbeddingIndex(directory, manifest)
+        except FileNotFoundError:
+            # Replaced and cleaned up between reading the manifest and opening its files
+            continue
+        with _loaded_lock:
+            _loaded = index
+            return index
+    return _loaded
+
+
+def _kmeans(vectors, lists, seed=0):
+    """Spherical k-means centroids trained on a sample of the vectors."""
+    rng = np.random.RandomState(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), IVF_TRAINING_ROWS), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(IVF_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for index in range(lists):
+            members = sample[assignment == index]
+            if len(members):
+                centroids[index] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+
+def build_index(batch_size=500):
+    """
+    Embed every approved recommendation and publish a new snapshot.
+
+    Returns:
+        Number of recommendations indexed
+    """
+    config = current_app.config
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    built_at = datetime.utcnow()
+
+    recommendations = AIRecommendation.query.options(joinedload(AIRecommendation.campaign)).filter(
+        AIRecommendation.status == 'approved'
+    ).order_by(AIRecommendation.id)
+    texts, rows, agent_types = [], [], {}
+    for recommendation in recommendations.yield_per(batch_size):
+        texts.append(document_text(recommendation))
+        agent = agent_types.setdefault(recommendation.agent_type, len(agent_types))
+        rows.append((recommendation.id, recommendation.campaign.organization_id or -1,
+                     recommendation.campaign_id, agent))
+    rows = np.array(rows, dtype=_ROW_DTYPE)
+
+    frequencies = term_frequencies(texts, config['EMBEDDING_DIM'])
+    idf = inverse_document_frequency(frequencies) if len(texts) else np.ones(config['EMBEDDING_DIM'], np.float32)
+    vectors = normalize(frequencies * idf)
+    del frequencies
+
+    # Group rows by IVF list so each list is one contiguous slice of the matrix
+    centroids = np.empty((0, vectors.shape[1]), dtype=np.float32)
+    list_offsets = np.zeros(1, dtype=np.int64)
+    if len(vectors) >= config['EMBEDDING_IVF_MIN_ROWS']:
+        centroids = _kmeans(vectors, int(math.sqrt(len(vectors))))
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        vectors, rows = vectors[order], rows[order]
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+
+    # Sorts by build time, which the cleanup below relies on
+    version = f'{built_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+    prefix = os.path.join(directory, version)
+    stored = np.lib.format.open_memmap(prefix + '-vectors.npy', mode='w+', dtype=np.float32, shape=vectors.shape)
+    stored[:] = vectors
+    stored.flush()
+    del stored
+    np.save(prefix + '-rows.npy', rows)
+    np.savez(prefix + '-model.npz', idf=idf, centroids=centroids, list_offsets=list_offsets)
+
+    manifest = {
+        'version': version,
+        'built_at': built_at.isoformat(),
+        'count': len(rows),
+        'dim': int(vectors.shape[1]),
+        'ivf_lists': len(centroids),
+        'agent_types': list(agent_types)
+    }
+    previous = (_read_manifest(directory) or {}).get('version')
+    temporary = os.path.join(directory, f'{MANIFEST}.{uuid.uuid4().hex}')
+    with open(temporary, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+    # Keep the snapshot just replaced for workers that read the old manifest;
+    # only older ones go. Workers still holding them keep their open maps.
+    if previous:
+        for name in os.listdir(directory):
+            snapshot = name.rsplit('-', 1)[0]
+            if name.endswith(('.npy', '.npz')) and snapshot < previous and snapshot != version:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+    return len(rows)
+
+
+def rebuild():
+    """
+    Build a new snapshot unless another process is already building one.
+
+    Returns:
+        Number of recommendations indexed, or None if a rebuild was already
+        running elsewhere
+    """
+    owner = claim_owner()
+    if not acquire_claim(REBUILD_CLAIM_KEY, owner, current_app.config['EMBEDDING_REBUILD_TIMEOUT_SECONDS']):
+        return None
+    try:
+        return build_index()
+    finally:
+        release_claim(REBUILD_CLAIM_KEY, owner)
+
+
+def _rebuild_in_background(app):
+    try:
+        with app.app_context():
+            rebuild()
+    except Exception as e:
+        print(f"Error rebuilding similarity index: {e}")
+
+
+def request_rebuild():
+    """Start a rebuild in a background thread, unless this process already has one running."""
+    global _rebuild_thread
+    with _rebuild_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(
+            target=_rebuild_in_background,
+            args=(current_app._get_current_object(),),
+            name='embedding-index-rebuild',
+            daemon=True
+        )
+        _rebuild_thread.start()
+
+
+def _recent(index):
+    """Recommendations approved after the snapshot was built."""
+    query = AIRecommendation.query.options(joinedload(AIRecommendation.campaign)).filter(
+        AIRecommendation.status == 'approved'
+    )
+    if index.built_at is not None:
+        query = query.filter(AIRecommendation.reviewed_at >= index.built_at)
+    return query
+
+
+def current_index():
+    """
+    The snapshot to search.
+
+    A missing or too stale snapshot is rebuilt in the background; until the
+    new one is published, queries use the current one (or an empty stand-in)
+    and score the approvals since then directly.
+    """
+    index = load_index()
+    if index is None:
+        request_rebuild()
+        return EmbeddingIndex.empty(current_app.config['EMBEDDING_DIM'])
+    if _recent(index).count() > current_app.config['EMBEDDING_MAX_DELTA']:
+        request_rebuild()
+    return index
+
+
+def find_similar(text, organization_id=None, agent_type=None, limit=5, exclude_campaign_id=None):
+    """
+    Find approved recommendations whose campaign and content resemble a text.
+
+    Args:
+        text: Query text, e.g. a campaign description
+        organization_id: Only search this organization's recommendations
+            (None searches all)
+        agent_type: Only return recommendations from this agent
+        limit: Number of results
+        exclude_campaign_id: Leave out this campaign's own recommendations
+
+    Returns:
+        List of (AIRecommendation, similarity) pairs, most similar first
+    """
+    index = current_index()
+    vector = embed([text], index.idf)[0]
+
+    scored = {}
+    ranges = index.candidate_ranges(vector, current_app.config['EMBEDDING_IVF_PROBES'])
+    if agent_type is not None and agent_type not in index.agent_types:
+        ranges = []
+    for start, end in ranges:
+        rows = index.rows[start:end]
+        keep = np.ones(len(rows), dtype=bool)
+        if organization_id is not None:
+            keep &= rows['organization_id'] == organization_id
+        if agent_type is not None:
+            keep &= rows['agent'] == index.agent_types.index(agent_type)
+        if exclude_campaign_id is not None:
+            keep &= rows['campaign_id'] != exclude_campaign_id
+        if not keep.any():
+            continue
+        positions = np.flatnonzero(keep)
+        scores = np.asarray(index.vectors[start:end])[positions] @ vector
+        # Over-fetch so results can be dropped if since un-approved
+        for position in np.argsort(-scores)[:limit * 2]:
+            scored[int(rows['id'][positions[position]])] = float(scores[position])
+
+    # Recommendations approved since the snapshot are scored directly
+    recent = _recent(index)
+    if organization_id is not None:
+        recent = recent.join(Campaign, AIRecommendation.campaign_id == Campaign.id).filter(
+            Campaign.organization_id == organization_id
+        )
+    if agent_type is not None:
+        recent = recent.filter(AIRecommendation.agent_type == agent_type)
+    if exclude_campaign_id is not None:
+        recent = recent.filter(AIRecommendation.campaign_id != exclude_campaign_id)
+    recent = recent.all()
+    if recent:
+        scores = embed([document_text(recommendation) for recommendation in recent], index.idf) @ vector
+        for recommendation, score in zip(recent, scores):
+            scored[recommendation.id] = float(score)
+
+    top = sorted(scored.items(), key=lambda item: -item[1])[:limit * 2]
+    recommendations = {
+        recommendation.id: recommendation
+        for recommendation in AIRecommendation.query.filter(
+            AIRecommendation.id.in_([recommendation_id for recommendation_id, _ in top]),
+            AIRecommendation.status == 'approved'
+        )
+    }
+    results = [(recommendations[recommendation_id], round(score, 4))
+               for recommendation_id, score in top if recommendation_id in recommendations]
+    return results[:limit]
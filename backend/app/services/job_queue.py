@@ -0,0 +1,326 @@
+"""Database-backed job queue for asynchronous AI agent execution.
+
+Jobs live in the ``agent_jobs`` table, so any gunicorn worker on any node
+can enqueue a job and any other can run it without an external broker.
+On PostgreSQL workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``;
+on other databases (SQLite locally) a compare-and-set UPDATE gives the same
+one-claimer-per-job guarantee.
+
+A claim is a lease on ``locked_at`` that the worker renews every
+AGENT_JOB_HEARTBEAT_SECONDS while the agent runs, so only jobs of workers
+that died are reclaimed. A worker only finishes, fails or requeues a job it
+still holds, so a job reclaimed from a stalled worker is never finished twice.
+"""
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, or_, and_
+from app.models import AgentJob, AIRecommendation, db
+from app.services.agent_cache import cached_run_agent
+from app.services.scheduler import QuotaExceeded, CapacityExhausted
+from app.utils.audit import log_recommendation_requested
+from app.utils.unit_of_work import commit_now, separate_session
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def enqueue_job(campaign_id, agent_type, payload, requested_by, recommendation_status='pending',
+                bypass_cache=False):
+    """
+    Queue an agent invocation.
+
+    Args:
+        campaign_id: Campaign the recommendation belongs to
+        agent_type: Type of AI agent to run
+        payload: Input dict passed to the agent
+        requested_by: ID of the requesting user
+        recommendation_status: Status given to the resulting recommendation
+        bypass_cache: Always run the agent instead of reusing a cached result
+
+    Returns:
+        The committed AgentJob
+    """
+    job = AgentJob(
+        campaign_id=campaign_id,
+        agent_type=agent_type,
+        status='queued',
+        recommendation_status=recommendation_status,
+        requested_by=requested_by,
+        bypass_cache=bypass_cache
+    )
+    job.set_payload(payload)
+
+    db.session.add(job)
+    # Workers poll the table, so the job must be committed before the response
+    commit_now()
+
+    # Wake a local worker instead of waiting for its next poll
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.notify()
+
+    return job
+
+
+def _claimable(lease_cutoff):
+    """Filter for jobs that are queued or whose worker lease has expired."""
+    return or_(
+        AgentJob.status == 'queued',
+        and_(AgentJob.status == 'running', AgentJob.locked_at < lease_cutoff)
+    )
+
+
+def _matches(column, value):
+    """Equality filter that also handles NULL."""
+    return column.is_(None) if value is None else column == value
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim the oldest claimable job for a worker.
+
+    Returns:
+        The claimed AgentJob, or None if the queue is empty
+    """
+    now = datetime.utcnow()
+    lease_cutoff = now - timedelta(seconds=current_app.config['AGENT_JOB_LEASE_SECONDS'])
+    query = AgentJob.query.filter(_claimable(lease_cutoff)).order_by(AgentJob.created_at, AgentJob.id)
+    claim_values = {
+        'status': 'running',
+        'locked_by': worker_id,
+        'locked_at': now,
+        'started_at': now,
+        'attempts': AgentJob.attempts + 1
+    }
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        job_id = query.with_entities(AgentJob.id).with_for_update(skip_locked=True).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        db.session.execute(update(AgentJob).where(AgentJob.id == job_id).values(**claim_values))
+        db.session.commit()
+        return db.session.get(AgentJob, job_id)
+
+    # Compare-and-set: only succeeds if nobody claimed the job since we read it
+    for _ in range(5):
+        candidate = query.with_entities(AgentJob.id, AgentJob.status, AgentJob.locked_at).first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+        result = db.session.execute(
+            update(AgentJob)
+            .where(
+                AgentJob.id == candidate.id,
+                AgentJob.status == candidate.status,
+                _matches(AgentJob.locked_at, candidate.locked_at)
+            )
+            .values(**claim_values)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(AgentJob, candidate.id)
+
+    return None
+
+
+def _release(job, worker_id, **values):
+    """
+    Update a job this worker still holds.
+
+    Returns:
+        False if the job's lease lapsed and another worker reclaimed it; the
+        update is then discarded
+    """
+    result = db.session.execute(
+        update(AgentJob)
+        .where(AgentJob.id == job.id, AgentJob.status == 'running', AgentJob.locked_by == worker_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+    db.session.commit()
+    return True
+
+
+def _fail_or_retry(job, worker_id, error):
+    """Requeue a failed job, or mark it failed once attempts are exhausted."""
+    values = {'error': error, 'locked_by': None, 'locked_at': None}
+    if job.attempts >= current_app.config['AGENT_JOB_MAX_ATTEMPTS']:
+        values.update(status='failed', finished_at=datetime.utcnow())
+    else:
+        values.update(status='queued')
+    _release(job, worker_id, **values)
+
+
+def _requeue(job, worker_id):
+    """Put a job back in the queue without counting the attempt."""
+    _release(job, worker_id, status='queued', locked_by=None, locked_at=None,
+             attempts=max(job.attempts - 1, 0))
+
+
+@contextmanager
+def _lease_heartbeat(job_id, worker_id):
+    """Renew a job's lease every AGENT_JOB_HEARTBEAT_SECONDS until the block exits."""
+    app = current_app._get_current_object()
+    stopped = threading.Event()
+
+    def renew():
+        with app.app_context():
+            while not stopped.wait(app.config['AGENT_JOB_HEARTBEAT_SECONDS']):
+                try:
+                    with separate_session() as session:
+                        session.execute(update(AgentJob).where(
+                            AgentJob.id == job_id, AgentJob.status == 'running', AgentJob.locked_by == worker_id
+                        ).values(locked_at=datetime.utcnow()))
+                except Exception as e:
+                    print(f"Error renewing agent job lease: {e}")
+
+    thread = threading.Thread(target=renew, name=f'agent-job-lease-{job_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def process_job(job):
+    """Run a claimed job and store its result as an AIRecommendation."""
+    worker_id = job.locked_by
+    if job.attempts > current_app.config['AGENT_JOB_MAX_ATTEMPTS']:
+        _fail_or_retry(job, worker_id, job.error or 'Exceeded maximum attempts')
+        return
+
+    try:
+        with _lease_heartbeat(job.id, worker_id):
+            result = cached_run_agent(job.agent_type, job.get_payload(), bypass_cache=job.bypass_cache,
+                                      organization_id=job.campaign.organization_id,
+                                      queued_seconds=(job.started_at - job.created_at).total_seconds())
+    except CapacityExhausted:
+        # Other organizations hold the slots; try again on a later poll
+        _requeue(job, worker_id)
+        return
+    except QuotaExceeded as e:
+        job.attempts = current_app.config['AGENT_JOB_MAX_ATTEMPTS']
+        _fail_or_retry(job, worker_id, str(e))
+        return
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    if not result.get('success'):
+        _fail_or_retry(job, worker_id, result.get('error', 'AI generation failed'))
+        return
+
+    recommendation = AIRecommendation(
+        campaign_id=job.campaign_id,
+        agent_type=job.agent_type,
+        status=job.recommendation_status,
+        requested_by=job.requested_by
+    )
+    recommendation.set_recommendation_data(result)
+
+    try:
+        db.session.add(recommendation)
+        db.session.flush()
+        log_recommendation_requested(job.requested_by, recommendation.id, job.agent_type)
+        # Rolls the recommendation back too if another worker reclaimed the job
+        _release(job, worker_id, recommendation_id=recommendation.id, status='completed', error=None,
+                 locked_by=None, locked_at=None, finished_at=datetime.utcnow())
+    except Exception as e:
+        db.session.rollback()
+        _fail_or_retry(job, worker_id, str(e))
+
+
+def wait_for_job(job, timeout):
+    """
+    Block until a job reaches a terminal status or the timeout elapses.
+
+    Returns:
+        The refreshed AgentJob
+    """
+    deadline = time.monotonic() + timeout
+    status = job.status
+    while status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+        time.sleep(0.5)
+        # A fresh session sees other workers' commits without ending the request's transaction
+        with separate_session() as session:
+            status = session.scalar(select(AgentJob.status).where(AgentJob.id == job.id))
+    if status != job.status:
+        db.session.refresh(job)
+    return job
+
+
+class JobWorkerPool:
+    """Pool of threads that claim and run queued agent jobs."""
+
+    def __init__(self, app, size, poll_interval):
+        self.app = app
+        self.size = size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads."""
+        for index in range(self.size):
+            worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+            thread = threading.Thread(target=self._run, args=(worker_id,), name=f'agent-job-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Signal the worker threads to exit."""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wake idle workers because a job was queued."""
+        self._wakeup.set()
+
+    def _run(self, worker_id):
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    job = claim_next_job(worker_id)
+                    if job is not None:
+                        process_job(job)
+                        continue
+            except Exception as e:
+                print(f"Error processing agent job: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+def _ensure_pool(app):
+    """Start this process's worker pool (once per process, after any fork)."""
+    global _pool, _pool_pid
+    if _pool_pid == os.getpid():
+        return
+    with _pool_lock:
+        if _pool_pid == os.getpid():
+            return
+        _pool = JobWorkerPool(app, app.config['AGENT_JOB_WORKERS'], app.config['AGENT_JOB_POLL_INTERVAL'])
+        _pool.start()
+        _pool_pid = os.getpid()
+
+
+def init_app(app):
+    """Start agent job workers lazily in each serving process."""
+    if app.config['AGENT_JOB_WORKERS'] <= 0:
+        return
+
+    @app.before_request
+    def start_agent_job_workers():
+        _ensure_pool(app)
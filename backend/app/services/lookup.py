@@ -0,0 +1,290 @@
+"""Typeahead lookup of campaign, organization and user names.
+
+Matches are ranked prefix first (the query starts the name, then starts a
+later word of it), then by trigram word similarity (the share of the
+query's trigrams found in the name), so both "clim" and a typo like
+"climte" find "Youth Climate Action".
+
+On PostgreSQL the pg_trgm extension answers lookups from GIN trigram
+indexes on the lowercased names. Other databases (and PostgreSQL servers
+where the extension cannot be created) use an in-process index per entity
+type: a sorted list of every word-boundary suffix of every name for prefix
+matches, and trigram posting lists scored with NumPy for fuzzy matches.
+The in-process index is rebuilt when a cheap count/max-id/max-updated_at
+watermark changes, checked at most every LOOKUP_REFRESH_SECONDS, or
+immediately after a change made in the same process.
+"""
+import bisect
+import re
+import threading
+import time
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, func, text
+from app.models import Campaign, Organization, User, db
+
+_WORD_RE = re.compile(r'\w+')
+
+# label: the displayed name; search: what is matched (search_sql on PostgreSQL);
+# scope: column for organization scoping
+SOURCES = {
+    'campaign': {
+        'model': Campaign,
+        'table': 'campaigns',
+        'label': Campaign.name,
+        'detail': Campaign.status,
+        'scope': Campaign.organization_id,
+        'search': Campaign.name,
+        'search_sql': 'lower(name)'
+    },
+    'organization': {
+        'model': Organization,
+        'table': 'organizations',
+        'label': Organization.name,
+        'detail': Organization.type,
+        'scope': Organization.id,
+        'search': Organization.name,
+        'search_sql': 'lower(name)'
+    },
+    'user': {
+        'model': User,
+        'table': 'users',
+        'label': User.full_name,
+        'detail': User.email,
+        'scope': User.organization_id,
+        'search': User.full_name + ' ' + User.email,
+        'search_sql': "lower(full_name || ' ' || email)"
+    },
+}
+
+_pg_trgm = False
+
+
+def init_app(app):
+    """Create pg_trgm indexes on PostgreSQL; other databases use the in-process index."""
+    global _pg_trgm
+    with app.app_context():
+        connection = db.session.connection()
+        if connection.dialect.name != 'postgresql':
+            return
+        try:
+            connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for lookup_type, source in SOURCES.items():
+                connection.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS ix_{source['table']}_lookup_trgm ON {source['table']} "
+                    f"USING gin (({source['search_sql']}) gin_trgm_ops)"
+                )
+            db.session.commit()
+            _pg_trgm = True
+        except Exception:
+            # e.g. no privilege to create extensions; fall back to the in-process index
+            db.session.rollback()
+
+
+def trigrams(value):
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing."""
+    grams = set()
+    for word in _WORD_RE.findall(value.lower()):
+        padded = f'  {word} '
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def _normalize(value):
+    return ' '.join(_WORD_RE.findall(value.lower()))
+
+
+class TrigramIndex:
+    """In-process prefix and trigram index over one entity type's names."""
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: Iterable of (id, label, detail, scope_id, search_text)
+        """
+        self.ids, self.labels, self.details, scopes, texts = [], [], [], [], []
+        for row_id, label, detail, scope_id, search_text in rows:
+            self.ids.append(row_id)
+            self.labels.append(label)
+            self.details.append(detail)
+            scopes.append(-1 if scope_id is None else scope_id)
+            texts.append(_normalize(search_text))
+        self.scopes = np.array(scopes, dtype=np.int64)
+
+        suffixes = []
+        postings = {}
+        for position, search_text in enumerate(texts):
+            # Every word-boundary suffix, so "act" and "climate act" both find "climate action"
+            suffixes.append((search_text, position, True))
+            for match in re.finditer(r' ', search_text):
+                suffixes.append((search_text[match.end():], position, False))
+            for gram in trigrams(search_text):
+                postings.setdefault(gram, []).append(position)
+        suffixes.sort()
+        self._suffix_keys = [suffix for suffix, _, _ in suffixes]
+        self._suffix_positions = np.array([position for _, position, _ in suffixes], dtype=np.int32)
+        self._suffix_is_whole = np.array([whole for _, _, whole in suffixes], dtype=bool)
+        self._postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+    def search(self, query, scope_id=None, limit=10, threshold=0.6):
+        """
+        Rank entries matching a query.
+
+        Returns:
+            List of (position, score): prefix matches score above 1, the
+            rest their word similarity
+        """
+        query = _normalize(query)
+        count = len(self.ids)
+        if not query or not count:
+            return []
+        allowed = self.scopes == scope_id if scope_id is not None else np.ones(count, dtype=bool)
+
+        scores = np.zeros(count, dtype=np.float32)
+        query_grams = trigrams(query)
+        shared = np.zeros(count, dtype=np.int32)
+        for gram in query_grams:
+            positions = self._postings.get(gram)
+            if positions is not None:
+                shared += np.bincount(positions, minlength=count).astype(np.int32)
+        similarity = shared / max(len(query_grams), 1)
+        fuzzy = similarity >= threshold
+        scores[fuzzy] = similarity[fuzzy]
+
+        low = bisect.bisect_left(self._suffix_keys, query)
+        high = bisect.bisect_left(self._suffix_keys, query + '\uffff')
+        positions = self._suffix_positions[low:high]
+        scores[positions] = 1 + similarity[positions]
+        # Names that start with the query rank above those with a later word starting with it
+        scores[positions[self._suffix_is_whole[low:high]]] += 1
+
+        scores[~allowed] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = sorted(candidates, key=lambda position: (-scores[position], self.labels[position].lower()))
+        return [(int(position), float(scores[position])) for position in ranked]
+
+
+_indexes = {}
+_dirty = set()
+_indexes_lock = threading.Lock()
+
+
+def _watermark(source):
+    model = source['model']
+    return db.session.query(func.count(model.id), func.max(model.id), func.max(model.updated_at)).one()
+
+
+def _build(source):
+    model = source['model']
+    return TrigramIndex(db.session.query(
+        model.id, source['label'], source['detail'], source['scope'], source['search']
+    ).yield_per(1000))
+
+
+def get_index(lookup_type):
+    """The in-process index for a type, rebuilt if the table changed."""
+    source = SOURCES[lookup_type]
+    now = time.monotonic()
+    with _indexes_lock:
+        entry = _indexes.get(lookup_type)
+        fresh = entry is not None and lookup_type not in _dirty and \
+            now - entry['checked_at'] < current_app.config['LOOKUP_REFRESH_SECONDS']
+        if fresh:
+            return entry['index']
+        _dirty.discard(lookup_type)
+
+    watermark = _watermark(source)
+    if entry is None or entry['watermark'] != watermark:
+        entry = {'index': _build(source), 'watermark': watermark}
+    entry['checked_at'] = now
+    with _indexes_lock:
+        _indexes[lookup_type] = entry
+    return entry['index']
+
+
+def _mark_dirty(lookup_type):
+    def listener(mapper, connection, target):
+        _dirty.add(lookup_type)
+    return listener
+
+
+def invalidate(lookup_type):
+    """Rebuild a type's in-process index on next use, after bulk changes that bypass the mapper events."""
+    _dirty.add(lookup_type)
+
+
+for _type, _source in SOURCES.items():
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_source['model'], _event, _mark_dirty(_type))
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _postgres_lookup(source, query, scope_id, limit):
+    search_sql = source['search_sql']
+    scope_column = source['scope'].key
+    scope_filter = f'AND {scope_column} = :scope_id' if scope_id is not None else ''
+    statement = text(f"""
+        SELECT id, {source['label'].key} AS label, {source['detail'].key} AS detail, {scope_column} AS scope_id,
+               CASE WHEN {search_sql} LIKE :prefix THEN 2
+                    WHEN {search_sql} LIKE :word_prefix THEN 1
+                    ELSE 0 END + word_similarity(:query, {search_sql}) AS score
+        FROM {source['table']}
+        WHERE ({search_sql} LIKE :prefix OR {search_sql} LIKE :word_prefix OR :query <% {search_sql})
+              {scope_filter}
+        ORDER BY score DESC, lower({source['label'].key})
+        LIMIT :limit
+    """)
+    escaped = _escape_like(query)
+    return db.session.execute(statement, {
+        'prefix': escaped + '%',
+        'word_prefix': '% ' + escaped + '%',
+        'query': query,
+        'scope_id': scope_id,
+        'limit': limit
+    }).all()
+
+
+def lookup(lookup_type, query, scope_id=None, limit=10):
+    """
+    Typeahead matches for a name.
+
+    Args:
+        lookup_type: 'campaign', 'organization' or 'user'
+        query: What the user typed
+        scope_id: Organization to restrict matches to (None for all)
+        limit: Maximum matches
+
+    Returns:
+        List of {'id', 'label', 'detail', 'organization_id', 'score'} dicts,
+        best first
+    """
+    source = SOURCES[lookup_type]
+    if not _normalize(query):
+        return []
+
+    if _pg_trgm:
+        rows = _postgres_lookup(source, query.strip().lower(), scope_id, limit)
+        return [
+            {'id': row.id, 'label': row.label, 'detail': row.detail, 'organization_id': row.scope_id,
+             'score': round(float(row.score), 3)}
+            for row in rows
+        ]
+
+    index = get_index(lookup_type)
+    matches = index.search(query, scope_id=scope_id, limit=limit,
+                           threshold=current_app.config['LOOKUP_SIMILARITY_THRESHOLD'])
+    return [
+        {
+            'id': index.ids[position],
+            'label': index.labels[position],
+            'detail': index.details[position],
+            'organization_id': int(index.scopes[position]) if index.scopes[position] >= 0 else None,
+            'score': round(score, 3)
+        }
+        for position, score in matches
+    ]
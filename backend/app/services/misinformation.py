@@ -0,0 +1,323 @@
+"""Multi-pattern flagging of known misinformation claims in feedback text.
+
+Each rule describes one claim through keywords, phrases and regular
+expressions. All keywords and phrases of all rules are compiled into one
+Aho-Corasick automaton, so every document is scanned once for them
+regardless of how many rules exist. The regular expressions of each rule
+are compiled into one alternation per rule and scanned separately, so a
+match for one claim never hides an overlapping match for another.
+
+The default rules ship in ``misinformation_rules.json``. Rule sets saved
+through the API are stored as versioned rows in ``misinformation_rule_sets``;
+each worker checks the latest version periodically and recompiles when it
+changes, so edits take effect without restarting workers.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from flask import current_app
+from app.models import MisinformationRuleSet, db
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'misinformation_rules.json')
+
+SEVERITIES = ('low', 'medium', 'high')
+
+# Example matches returned per flagged claim
+MAX_EXAMPLES_PER_FLAG = 20
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over lowercase strings."""
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns: Iterable of (string, value) pairs; matches yield the value
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for pattern, value in patterns:
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = next_node
+            self._out[node].append((len(pattern), value))
+
+        # Breadth-first failure links; each node also reports its suffixes' outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, text):
+        """Yield (start, end, value) for every pattern occurrence in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in out[node]:
+                yield index - length + 1, index + 1, value
+
+
+def _lower(text):
+    """Lowercase text without changing its length, so offsets stay valid."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(char.lower()[0] for char in text)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class RuleSet:
+    """A compiled, immutable set of misinformation rules."""
+
+    def __init__(self, rules, version):
+        self.rules = rules
+        self.version = version
+        self._by_id = {rule['id']: rule for rule in rules}
+
+        literals = []
+        self._regexes = []
+        for rule in rules:
+            for literal in rule.get('keywords', []) + rule.get('phrases', []):
+                literals.append((' '.join(literal.lower().split()), rule['id']))
+            patterns = rule.get('patterns', [])
+            if patterns:
+                combined = '|'.join(f'(?:{pattern})' for pattern in patterns)
+                self._regexes.append((rule['id'], re.compile(combined, re.IGNORECASE)))
+
+        self._automaton = AhoCorasick(literals) if literals else None
+
+    def scan(self, text):
+        """
+        Find rule matches in one document.
+
+        Keyword and phrase matches must start and end on word boundaries.
+        Overlapping pattern matches are all reported when they belong to
+        different rules; within one rule, the first pattern to match at a
+        position wins.
+
+        Returns:
+            List of (rule_id, start, end) tuples sorted by offset
+        """
+        matches = []
+        if self._automaton is not None:
+            lowered = _lower(text)
+            for start, end, rule_id in self._automaton.finditer(lowered):
+                if start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if end < len(lowered) and _is_word_char(lowered[end]):
+                    continue
+                matches.append((rule_id, start, end))
+        for rule_id, regex in self._regexes:
+            for match in regex.finditer(text):
+                matches.append((rule_id, match.start(), match.end()))
+        matches.sort(key=lambda match: (match[1], match[2]))
+        return matches
+
+    def flag(self, documents):
+        """
+        Scan documents and aggregate matches per claim.
+
+        Args:
+            documents: Iterable of (source, index, text) tuples
+
+        Returns:
+            List of flags, highest severity and most frequent first, each
+            with the claim, match count, number of matching documents and
+            example matches with source, document index and character
+            offsets
+        """
+        flags = {}
+        for source, index, text in documents:
+            matched_rules = set()
+            for rule_id, start, end in self.scan(text):
+                flag = flags.get(rule_id)
+                if flag is None:
+                    rule = self._by_id[rule_id]
+                    flag = flags[rule_id] = {
+                        'rule_id': rule_id,
+                        'claim': rule['claim'],
+                        'severity': rule.get('severity', 'medium'),
+                        'count': 0,
+                        'documents': 0,
+                        'matches': []
+                    }
+                flag['count'] += 1
+                if rule_id not in matched_rules:
+                    matched_rules.add(rule_id)
+                    flag['documents'] += 1
+                if len(flag['matches']) < MAX_EXAMPLES_PER_FLAG:
+                    flag['matches'].append({
+                        'source': source,
+                        'index': index,
+                        'start': start,
+                        'end': end,
+                        'text': text[start:end]
+                    })
+
+        severity_rank = {severity: rank for rank, severity in enumerate(SEVERITIES)}
+        return sorted(
+            flags.values(),
+            key=lambda flag: (-severity_rank.get(flag['severity'], 1), -flag['count'], flag['rule_id'])
+        )
+
+
+def validate_rules(rules):
+    """
+    Check a rule list and normalize it.
+
+    Returns:
+        The normalized list of rule dicts
+
+    Raises:
+        ValueError: Describing the first invalid rule
+    """
+    if not isinstance(rules, list):
+        raise ValueError('rules must be a list')
+
+    normalized = []
+    seen = set()
+    for position, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f'Rule {position} must be an object')
+        rule_id = rule.get('id')
+        if not isinstance(rule_id, str) or not rule_id:
+            raise ValueError(f'Rule {position} needs a string id')
+        if rule_id in seen:
+            raise ValueError(f'Duplicate rule id: {rule_id}')
+        seen.add(rule_id)
+        if not isinstance(rule.get('claim'), str) or not rule['claim']:
+            raise ValueError(f'Rule {rule_id} needs a claim')
+        severity = rule.get('severity', 'medium')
+        if severity not in SEVERITIES:
+            raise ValueError(f'Rule {rule_id} severity must be one of {", ".join(SEVERITIES)}')
+
+        entry = {'id': rule_id, 'claim': rule['claim'], 'severity': severity}
+        for field in ('keywords', 'phrases', 'patterns'):
+            values = rule.get(field, [])
+            if not isinstance(values, list) or not all(isinstance(v, str) and v.strip() for v in values):
+                raise ValueError(f'Rule {rule_id} {field} must be a list of non-empty strings')
+            entry[field] = values
+        for pattern in entry['patterns']:
+            try:
+                # Compiled the way RuleSet embeds it, so e.g. inline global flags are caught here
+                compiled = re.compile(f'(?:{pattern})', re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f'Rule {rule_id} has an invalid pattern {pattern!r}: {e}')
+            # A rule's patterns are combined into one regex, so group names and numbers would clash
+            if compiled.groupindex or re.search(r'\\[1-9]', pattern):
+                raise ValueError(f'Rule {rule_id} patterns must not use named groups or backreferences')
+        if not (entry['keywords'] or entry['phrases'] or entry['patterns']):
+            raise ValueError(f'Rule {rule_id} needs at least one keyword, phrase or pattern')
+        normalized.append(entry)
+
+    try:
+        RuleSet(normalized, None)
+    except re.error as e:
+        raise ValueError(f'Patterns of a rule cannot be combined into one expression: {e}')
+    return normalized
+
+
+def load_default_rules():
+    """Rules shipped with the application (or at MISINFO_RULES_PATH)."""
+    path = current_app.config.get('MISINFO_RULES_PATH') or DEFAULT_RULES_PATH
+    with open(path, encoding='utf-8') as rules_file:
+        return validate_rules(json.load(rules_file)['rules'])
+
+
+_ruleset = None
+_checked_at = 0.0
+_ruleset_lock = threading.Lock()
+
+
+def _latest_version():
+    return db.session.query(db.func.max(MisinformationRuleSet.id)).scalar() or 0
+
+
+def get_ruleset():
+    """
+    Get the compiled rule set, recompiling if a newer version was saved.
+
+    The database is checked at most every MISINFO_RULES_CHECK_SECONDS.
+    Version 0 is the default rule file.
+    """
+    global _ruleset, _checked_at
+    interval = current_app.config['MISINFO_RULES_CHECK_SECONDS']
+    if _ruleset is not None and time.monotonic() - _checked_at < interval:
+        return _ruleset
+
+    with _ruleset_lock:
+        if _ruleset is not None and time.monotonic() - _checked_at < interval:
+            return _ruleset
+        version = _latest_version()
+        if _ruleset is None or _ruleset.version != version:
+            try:
+                if version:
+                    rules = json.loads(db.session.get(MisinformationRuleSet, version).rules)
+                else:
+                    rules = load_default_rules()
+                _ruleset = RuleSet(rules, version)
+            except (re.error, ValueError) as e:
+                # A version saved before validation caught this must not break flagging
+                print(f"Error compiling misinformation rules version {version}: {e}")
+                if _ruleset is None:
+                    _ruleset = RuleSet(load_default_rules(), 0)
+        _checked_at = time.monotonic()
+        return _ruleset
+
+
+def save_rules(rules, user_id):
+    """
+    Validate and store a new rule set version.
+
+    Returns:
+        The saved MisinformationRuleSet
+
+    Raises:
+        ValueError: If the rules are invalid
+    """
+    global _checked_at
+    rule_set = MisinformationRuleSet(rules=json.dumps(validate_rules(rules)), created_by=user_id)
+    db.session.add(rule_set)
+    db.session.flush()
+    # This worker picks the new version up immediately; others on their next check
+    _checked_at = 0.0
+    return rule_set
+
+
+def feedback_documents(feedback_data):
+    """Yield (source, index, text) for sample comments and mentions."""
+    for source, field in (('comment', 'sample_comments'), ('mention', 'mentions')):
+        for index, item in enumerate(feedback_data.get(field) or []):
+            if isinstance(item, dict):
+                item = item.get('text')
+            if isinstance(item, str) and item:
+                yield source, index, item
+
+
+def flag_feedback(feedback_data):
+    """Flag known misinformation claims in a feedback payload's comments and mentions."""
+    return get_ruleset().flag(feedback_documents(feedback_data))
@@ -0,0 +1,607 @@
+"""Pluggable model backends used by the AI agents.
+
+A backend turns a prompt into text, either all at once with ``complete`` or
+incrementally with ``stream``. The demo backend serves the curated demo
+content; the fake streaming backend produces deterministic text with a
+configurable per-token delay so streaming can be exercised offline; the
+HTTP backend talks to an OpenAI-compatible chat completions endpoint
+through a process-wide pooled client. Each endpoint has a circuit breaker,
+and a secondary endpoint can be used to hedge slow primary requests.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
+from flask import current_app
+
+DEMO_CONTENT_BODY = (
+    'Climate action is not just about environmental protection—it\'s about securing a '
+    'sustainable future for all. Young people have a crucial role to play in shaping climate '
+    'policy through democratic participation and informed voting.'
+)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+DEFAULT_BACKEND_URL = 'https://api.openai.com/v1'
+
+
+class BackendError(Exception):
+    """Raised when a model backend call fails."""
+
+
+class BackendUnavailable(BackendError):
+    """Raised when no backend capacity frees up in time."""
+
+
+class CircuitOpen(BackendError):
+    """Raised when an endpoint's circuit breaker is failing fast."""
+
+
+class ModelBackend:
+    """Base class for model backends."""
+
+    name = 'base'
+    model = 'none'
+
+    def complete(self, prompt, system=None, json_mode=False, usage=None):
+        """
+        Generate the full completion for a prompt.
+
+        Backends that know their token usage add 'input_tokens',
+        'output_tokens' and 'queue_seconds' to the usage dict if one is given.
+        """
+        return ''.join(self.stream(prompt, system=system))
+
+    def stream(self, prompt, system=None):
+        """Yield the completion for a prompt in chunks."""
+        raise NotImplementedError
+
+
+class DemoBackend(ModelBackend):
+    """Serves curated demo content regardless of the prompt."""
+
+    name = 'demo'
+    model = 'demo-mode'
+
+    def stream(self, prompt, system=None):
+        words = DEMO_CONTENT_BODY.split(' ')
+        for index, word in enumerate(words):
+            yield word if index == 0 else ' ' + word
+
+
+class FakeStreamingBackend(ModelBackend):
+    """Deterministic local backend that streams tokens with a delay."""
+
+    name = 'fake'
+    model = 'fake-stream'
+
+    VOCABULARY = [
+        'civic', 'participation', 'community', 'voters', 'policy', 'local', 'youth',
+        'engagement', 'education', 'democracy', 'action', 'informed', 'future', 'together'
+    ]
+
+    def __init__(self, token_delay=0.0, length=40):
+        self.token_delay = token_delay
+        self.length = length
+
+    def complete(self, prompt, system=None, json_mode=False, usage=None):
+        text = ''.join(self.stream(prompt, system=system))
+        return json.dumps({'text': text}) if json_mode else text
+
+    def stream(self, prompt, system=None):
+        digest = hashlib.sha256(((system or '') + prompt).encode('utf-8')).digest()
+        for index in range(self.length):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            word = self.VOCABULARY[digest[index % len(digest)] % len(self.VOCABULARY)]
+            yield word if index == 0 else ' ' + word
+
+
+_http_client = None
+_http_client_pid = None
+_semaphores = {}
+_breakers = {}
+_latencies = {}
+_counters = {}
+_hedge_executor = None
+_shared_lock = threading.Lock()
+
+
+def approximate_tokens(text):
+    """Approximate the token count of text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def add_usage(usage, **amounts):
+    """Accumulate token counts and waits into a caller-supplied usage dict."""
+    if usage is None:
+        return
+    with _shared_lock:
+        for name, amount in amounts.items():
+            usage[name] = usage.get(name, 0) + amount
+
+
+def increment(endpoint, name, amount=1):
+    """Increment a per-endpoint backend counter."""
+    with _shared_lock:
+        _counters.setdefault(endpoint, Counter())[name] += amount
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies for one endpoint."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction, min_samples=20):
+        """Return the given latency percentile, or None with too few samples."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    Opens when the error rate over a rolling window crosses a threshold,
+    fails fast while open, then lets a single probe through after a cooldown
+    (half-open). A successful probe closes the circuit again.
+    """
+
+    def __init__(self, window_seconds, min_requests, error_rate, cooldown_seconds):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.state = 'closed'
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes = deque()  # (timestamp, success)
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check whether a call may proceed."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def abandon(self):
+        """Give up an allowed call without judging the endpoint."""
+        with self._lock:
+            if self.state == 'half_open':
+                self._probe_in_flight = False
+
+    def record(self, success):
+        """Record the outcome of a call that was allowed through."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == 'half_open':
+                self._probe_in_flight = False
+                if success:
+                    self.state = 'closed'
+                    self._outcomes.clear()
+                else:
+                    self.state = 'open'
+                    self._opened_at = now
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+                self._outcomes.popleft()
+
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.error_rate:
+                self.state = 'open'
+                self._opened_at = now
+
+
+def get_circuit_breaker(key):
+    """Get the circuit breaker for one backend endpoint."""
+    config = current_app.config
+    with _shared_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(
+                config['AI_CIRCUIT_WINDOW_SECONDS'],
+                config['AI_CIRCUIT_MIN_REQUESTS'],
+                config['AI_CIRCUIT_ERROR_RATE'],
+                config['AI_CIRCUIT_COOLDOWN_SECONDS']
+            )
+    return breaker
+
+
+def get_latency_tracker(key):
+    """Get the latency tracker for one backend endpoint."""
+    with _shared_lock:
+        tracker = _latencies.get(key)
+        if tracker is None:
+            tracker = _latencies[key] = LatencyTracker()
+    return tracker
+
+
+def get_hedge_executor():
+    """Get this process's executor for hedged backend calls."""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _shared_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=2 * current_app.config['AI_BACKEND_MAX_CONCURRENCY'],
+                    thread_name_prefix='model-hedge'
+                )
+    return _hedge_executor
+
+
+def get_backend_stats():
+    """
+    Snapshot backend counters, circuit breaker states and latencies.
+
+    Returns:
+        Dict keyed by endpoint URL
+    """
+    with _shared_lock:
+        endpoints = set(_counters) | set(_breakers) | set(_latencies)
+        counters = {endpoint: dict(_counters.get(endpoint, {})) for endpoint in endpoints}
+        breakers = dict(_breakers)
+        latencies = dict(_latencies)
+
+    stats = {}
+    for endpoint in endpoints:
+        tracker = latencies.get(endpoint)
+        stats[endpoint] = {
+            'counters': counters[endpoint],
+            'circuit_state': breakers[endpoint].state if endpoint in breakers else None,
+            'latency_p50': tracker.percentile(0.5, min_samples=1) if tracker else None,
+            'latency_p95': tracker.percentile(0.95, min_samples=1) if tracker else None
+        }
+    return stats
+
+
+def get_http_client():
+    """
+    Get this process's pooled HTTP client.
+
+    The client keeps connections alive across calls and is recreated after a
+    fork, since pooled sockets must not be shared between gunicorn workers.
+    """
+    global _http_client, _http_client_pid
+    if _http_client is None or _http_client_pid != os.getpid():
+        with _shared_lock:
+            if _http_client is None or _http_client_pid != os.getpid():
+                config = current_app.config
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=config['AI_HTTP_MAX_CONNECTIONS'],
+                        max_keepalive_connections=config['AI_HTTP_MAX_KEEPALIVE'],
+                        keepalive_expiry=config['AI_HTTP_KEEPALIVE_EXPIRY']
+                    ),
+                    timeout=httpx.Timeout(
+                        config['AI_BACKEND_TIMEOUT'],
+                        connect=config['AI_BACKEND_CONNECT_TIMEOUT']
+                    )
+                )
+                _http_client_pid = os.getpid()
+    return _http_client
+
+
+def get_semaphore(key, limit):
+    """Get the concurrency semaphore shared by all calls to one backend endpoint."""
+    with _shared_lock:
+        semaphore = _semaphores.get(key)
+        if semaphore is None:
+            semaphore = _semaphores[key] = threading.BoundedSemaphore(limit)
+    return semaphore
+
+
+def backoff_delay(attempt, base_delay, max_delay, retry_after=None):
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class HTTPModelBackend(ModelBackend):
+    """
+    OpenAI-compatible chat completions backend.
+
+    Calls share one pooled keep-alive client per process, are limited by a
+    per-endpoint semaphore, and are retried with jittered backoff on
+    transport errors and retryable status codes. Pointing base_url at a
+    local stub server makes the backend testable offline.
+    """
+
+    name = 'openai'
+
+    def __init__(self, base_url, api_key, model, max_concurrency, max_retries,
+                 retry_base_delay, retry_max_delay, queue_timeout):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.queue_timeout = queue_timeout
+        # Resolved up front so calls also work from hedging threads without an app context
+        self.client = get_http_client()
+        self.semaphore = get_semaphore(self.base_url, max_concurrency)
+        self.breaker = get_circuit_breaker(self.base_url)
+        self.latency = get_latency_tracker(self.base_url)
+
+    def _headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        return headers
+
+    def _body(self, prompt, system, stream=False, json_mode=False):
+        messages = []
+        if system:
+            messages.append({'role': 'system', 'content': system})
+        messages.append({'role': 'user', 'content': prompt})
+        body = {'model': self.model, 'messages': messages}
+        if stream:
+            body['stream'] = True
+        if json_mode:
+            body['response_format'] = {'type': 'json_object'}
+        return body
+
+    def _acquire(self):
+        """
+        Take a concurrency slot for the endpoint.
+
+        Returns:
+            Seconds spent waiting for the slot
+        """
+        if not self.breaker.allow():
+            increment(self.base_url, 'short_circuited')
+            raise CircuitOpen(f'Circuit open for {self.base_url}')
+        waiting_since = time.monotonic()
+        if not self.semaphore.acquire(timeout=self.queue_timeout):
+            # Saturation is not an endpoint failure
+            self.breaker.abandon()
+            increment(self.base_url, 'rejected')
+            raise BackendUnavailable(f'No capacity available for {self.base_url}')
+        increment(self.base_url, 'requests')
+        return time.monotonic() - waiting_since
+
+    def _finish(self, started, success):
+        """
+        Record the outcome of a call for the breaker, latency and counters.
+
+        success is None for a call the caller gave up on (e.g. a stream whose
+        consumer went away), which says nothing about the endpoint.
+        """
+        if success is None:
+            self.breaker.abandon()
+            return
+        self.breaker.record(success)
+        if success:
+            self.latency.record(time.monotonic() - started)
+            increment(self.base_url, 'successes')
+        else:
+            increment(self.base_url, 'failures')
+
+    def _send(self, body, stream=False):
+        """
+        Send a request, retrying retryable failures.
+
+        Returns:
+            An httpx.Response (still open when stream=True; the caller closes it)
+        """
+        client = self.client
+        url = f'{self.base_url}/chat/completions'
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                increment(self.base_url, 'retries')
+            retry_after = None
+            try:
+                request = client.build_request('POST', url, json=body, headers=self._headers())
+                response = client.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                if stream:
+                    response.read()
+                response.close()
+                last_error = BackendError(f'Backend returned HTTP {response.status_code}')
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise last_error
+            except httpx.TransportError as e:
+                last_error = BackendError(f'Backend request failed: {e}')
+
+            if attempt < self.max_retries:
+                time.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay, retry_after))
+
+        raise last_error
+
+    def complete(self, prompt, system=None, json_mode=False, usage=None):
+        add_usage(usage, queue_seconds=self._acquire())
+        started = time.monotonic()
+        success = False
+        try:
+            response = self._send(self._body(prompt, system, json_mode=json_mode))
+            data = response.json()
+            content = data['choices'][0]['message']['content']
+            reported = data.get('usage') or {}
+            add_usage(usage, input_tokens=reported.get('prompt_tokens', 0),
+                      output_tokens=reported.get('completion_tokens', 0))
+            success = True
+            return content
+        except (ValueError, KeyError, IndexError) as e:
+            raise BackendError(f'Malformed backend response: {e}')
+        finally:
+            self._finish(started, success)
+            self.semaphore.release()
+
+    def stream(self, prompt, system=None):
+        self._acquire()
+        started = time.monotonic()
+        success = False
+        try:
+            response = self._send(self._body(prompt, system, stream=True), stream=True)
+            try:
+                for line in response.iter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    try:
+                        delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                    except (ValueError, KeyError, IndexError):
+                        continue
+                    if delta:
+                        yield delta
+                # Only a body read to the end counts as a success
+                success = True
+            except httpx.HTTPError as e:
+                raise BackendError(f'Backend stream failed: {e}')
+            except GeneratorExit:
+                success = None
+                raise
+            finally:
+                response.close()
+        finally:
+            self._finish(started, success)
+            self.semaphore.release()
+
+
+class HedgedBackend(ModelBackend):
+    """
+    Hedges a primary backend with a secondary one.
+
+    If the primary has not answered within the hedge delay (configured, or
+    the primary's observed p95 latency), the same request is sent to the
+    secondary and whichever succeeds first wins. A primary that fails fast,
+    e.g. with an open circuit, hands over to the secondary immediately.
+    """
+
+    name = 'openai'
+
+    def __init__(self, primary, secondary, hedge_delay=None, default_delay=2.0):
+        self.primary = primary
+        self.secondary = secondary
+        self.model = primary.model
+        self.configured_delay = hedge_delay
+        self.default_delay = default_delay
+        self.executor = get_hedge_executor()
+
+    def hedge_delay(self):
+        """Seconds to wait on the primary before hedging."""
+        if self.configured_delay is not None:
+            return self.configured_delay
+        p95 = self.primary.latency.percentile(0.95)
+        return p95 if p95 is not None else self.default_delay
+
+    def complete(self, prompt, system=None, json_mode=False, usage=None):
+        # Both legs of a hedge consume tokens, so both add to usage
+        primary = self.executor.submit(self.primary.complete, prompt, system, json_mode, usage)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()
+
+        increment(self.primary.base_url, 'hedges_fired')
+        secondary = self.executor.submit(self.secondary.complete, prompt, system, json_mode, usage)
+        pending = [secondary] if done else [primary, secondary]
+        errors = [primary.exception()] if done else []
+
+        while pending:
+            done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        increment(self.primary.base_url, 'hedge_wins')
+                    return future.result()
+                errors.append(future.exception())
+            pending = list(not_done)
+
+        raise errors[-1]
+
+    def stream(self, prompt, system=None):
+        # Streams are not duplicated; fall over to the secondary only if the
+        # primary fails before producing any output
+        started = False
+        try:
+            for chunk in self.primary.stream(prompt, system=system):
+                started = True
+                yield chunk
+            return
+        except BackendError:
+            if started:
+                raise
+        yield from self.secondary.stream(prompt, system=system)
+
+
+def get_backend(name=None):
+    """
+    Get a model backend by name.
+
+    Args:
+        name: Backend name ('demo', 'fake' or 'openai'); defaults to the
+            AI_BACKEND setting. The OpenAI backend falls back to demo mode
+            when no API key is configured for the default endpoint.
+
+    Returns:
+        ModelBackend instance
+    """
+    config = current_app.config
+    name = name or config['AI_BACKEND']
+
+    if name == 'fake':
+        return FakeStreamingBackend(token_delay=config['FAKE_BACKEND_TOKEN_DELAY'])
+
+    if name == 'openai':
+        base_url = config['AI_BACKEND_URL']
+        if config['OPENAI_API_KEY'] or base_url != DEFAULT_BACKEND_URL:
+            primary = _http_backend(base_url, config['OPENAI_API_KEY'])
+            secondary_url = config['AI_BACKEND_SECONDARY_URL']
+            if not secondary_url:
+                return primary
+            return HedgedBackend(
+                primary,
+                _http_backend(secondary_url, config['AI_BACKEND_SECONDARY_API_KEY'] or config['OPENAI_API_KEY']),
+                hedge_delay=config['AI_HEDGE_DELAY'],
+                default_delay=config['AI_HEDGE_DEFAULT_DELAY']
+            )
+
+    return DemoBackend()
+
+
+def _http_backend(base_url, api_key):
+    """Build an HTTP backend for one endpoint from the app configuration."""
+    config = current_app.config
+    return HTTPModelBackend(
+        base_url=base_url,
+        api_key=api_key,
+        model=config['AI_MODEL'],
+        max_concurrency=config['AI_BACKEND_MAX_CONCURRENCY'],
+        max_retries=config['AI_BACKEND_MAX_RETRIES'],
+        retry_base_delay=config['AI_BACKEND_RETRY_BASE_DELAY'],
+        retry_max_delay=config['AI_BACKEND_RETRY_MAX_DELAY'],
+        queue_timeout=config['AI_BACKEND_QUEUE_TIMEOUT']
+    )
@@ -0,0 +1,306 @@
+"""Near-duplicate detection over content bodies and approved recommendations.
+
+Texts are reduced to word 3-gram shingles and summarized by a 64-value
+MinHash signature, stored compactly as 256 bytes in ``content_signatures``.
+The fraction of equal signature values estimates the Jaccard similarity of
+two texts' shingle sets.
+
+For lookup, each signature is split into 16 bands of 4 values and every band
+is hashed into ``content_signature_bands`` (indexed by organization and band
+hash). Texts sharing any band hash are candidates; with these parameters a
+pair at 0.8 similarity becomes a candidate with probability above 0.999,
+while dissimilar pairs rarely do. Finding near-duplicates is one indexed
+query followed by a vectorized comparison of the candidates' signatures.
+
+The index is kept current by mapper events: inserting or editing Content,
+and approving (or un-approving) a recommendation, update its signature in
+the same transaction. ``rebuild_index`` recomputes it from the tables.
+"""
+import hashlib
+import re
+import zlib
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import load_only
+from app.models import AIRecommendation, Campaign, Content, ContentSignature, ContentSignatureBand, db
+from app.services.ai_agents import get_ai_agent
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+SHINGLE_SIZE = 3
+
+# Fixed seed so signatures stay comparable across processes and restarts
+_random = np.random.RandomState(20240611)
+# Multiply-shift hashing: high 32 bits of (a * x + b) mod 2**64, a odd
+_MULTIPLIERS = _random.randint(0, 2 ** 62, size=NUM_HASHES, dtype=np.int64).astype(np.uint64) * np.uint64(2) + \
+    np.uint64(1)
+_OFFSETS = _random.randint(0, 2 ** 62, size=NUM_HASHES, dtype=np.int64).astype(np.uint64)
+# Odd constants mixing a shingle's token hashes into one value
+_SHINGLE_MIX = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D], dtype=np.uint64)[:SHINGLE_SIZE]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Recommendation fields that describe the run rather than its content
+_METADATA_KEYS = {'agent_type', 'generated_at', 'model_used', 'demo_mode', 'usage', 'cache', 'model', 'stub'}
+
+_signatures = ContentSignature.__table__
+_bands = ContentSignatureBand.__table__
+
+
+def shingles(text):
+    """Unique 32-bit hashes of a text's word shingles (the words themselves for short texts)."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    if len(hashes) < SHINGLE_SIZE:
+        return np.unique(hashes)
+
+    windows = len(hashes) - SHINGLE_SIZE + 1
+    mixed = sum(hashes[offset:offset + windows] * _SHINGLE_MIX[offset] for offset in range(SHINGLE_SIZE))
+    return np.unique(mixed & np.uint64(0xFFFFFFFF))
+
+
+def minhash(text):
+    """
+    MinHash signature of a text.
+
+    Returns:
+        uint32 array of NUM_HASHES values, or None if the text has no words
+    """
+    values = shingles(text or '')
+    if not len(values):
+        return None
+    hashed = (_MULTIPLIERS[:, None] * values[None, :] + _OFFSETS[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def signature_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def band_keys(signature):
+    """One signed 64-bit hash per band, distinct across band positions."""
+    raw = signature.astype('<u4').tobytes()
+    width = ROWS_PER_BAND * 4
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(raw[band * width:(band + 1) * width], digest_size=8,
+                                 person=band.to_bytes(2, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def similarity(signature, signatures):
+    """Estimated Jaccard similarity of one signature against a matrix of signatures."""
+    return (signatures == signature[None, :]).mean(axis=1)
+
+
+def recommendation_text(agent_type, data):
+    """Text content of a recommendation's data, without run metadata."""
+    result_key = getattr(get_ai_agent(agent_type), 'result_key', None)
+    if isinstance(data, dict) and result_key in data:
+        data = data[result_key]
+
+    parts = []
+
+    def collect(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if key not in _METADATA_KEYS:
+                    collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    collect(data)
+    return '\n'.join(parts)
+
+
+def _recommendation_text(recommendation):
+    return recommendation_text(recommendation.agent_type, recommendation.get_recommendation_data())
+
+
+def _source_text(source_type, target):
+    if source_type == 'content':
+        return target.body
+    return _recommendation_text(target) if target.status == 'approved' else None
+
+
+def _remove(connection, source_type, source_id):
+    ids = select(_signatures.c.id).where(
+        _signatures.c.source_type == source_type, _signatures.c.source_id == source_id
+    )
+    connection.execute(_bands.delete().where(_bands.c.signature_id.in_(ids)))
+    connection.execute(_signatures.delete().where(
+        _signatures.c.source_type == source_type, _signatures.c.source_id == source_id
+    ))
+
+
+def _store(connection, source_type, source_id, campaign_id, organization_id, signature):
+    signature_id = connection.execute(_signatures.insert().values(
+        source_type=source_type,
+        source_id=source_id,
+        campaign_id=campaign_id,
+        organization_id=organization_id,
+        signature=signature_bytes(signature)
+    )).inserted_primary_key[0]
+    connection.execute(_bands.insert(), [
+        {'signature_id': signature_id, 'band': band, 'band_key': key, 'organization_id': organization_id}
+        for band, key in enumerate(band_keys(signature))
+    ])
+
+
+def _reindex(connection, source_type, target):
+    _remove(connection, source_type, target.id)
+    text = _source_text(source_type, target)
+    signature = minhash(text) if text else None
+    if signature is None:
+        return
+    organization_id = connection.execute(
+        select(Campaign.organization_id).where(Campaign.id == target.campaign_id)
+    ).scalar()
+    _store(connection, source_type, target.id, target.campaign_id, organization_id, signature)
+
+
+def _listen(model, source_type, fields):
+    def after_insert(mapper, connection, target):
+        _reindex(connection, source_type, target)
+
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in fields):
+            _reindex(connection, source_type, target)
+
+    def after_delete(mapper, connection, target):
+        _remove(connection, source_type, target.id)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'after_delete', after_delete)
+
+
+_listen(Content, 'content', ('body', 'campaign_id'))
+_listen(AIRecommendation, 'recommendation', ('status', 'recommendation_data', 'payload_hash', 'campaign_id'))
+
+
+def reindex_recommendations(recommendation_ids):
+    """
+    Update the index for recommendations changed by a bulk UPDATE, which
+    bypasses the mapper events.
+    """
+    connection = db.session.connection()
+    ids = select(_signatures.c.id).where(
+        _signatures.c.source_type == 'recommendation', _signatures.c.source_id.in_(recommendation_ids)
+    )
+    connection.execute(_bands.delete().where(_bands.c.signature_id.in_(ids)))
+    connection.execute(_signatures.delete().where(
+        _signatures.c.source_type == 'recommendation', _signatures.c.source_id.in_(recommendation_ids)
+    ))
+
+    approved = db.session.query(AIRecommendation, Campaign.organization_id).join(
+        Campaign, AIRecommendation.campaign_id == Campaign.id
+    ).filter(AIRecommendation.id.in_(recommendation_ids), AIRecommendation.status == 'approved')
+    for recommendation, organization_id in approved:
+        signature = minhash(_recommendation_text(recommendation))
+        if signature is not None:
+            _store(connection, 'recommendation', recommendation.id, recommendation.campaign_id, organization_id,
+                   signature)
+
+
+def find_near_duplicates(text, organization_id, campaign_id=None, exclude=None, threshold=None, limit=None):
+    """
+    Find indexed content and approved recommendations similar to a text.
+
+    Args:
+        text: Text to check
+        organization_id: Organization to search within
+        campaign_id: Restrict matches to one campaign
+        exclude: (source_type, source_id) of the item being checked, if indexed
+        threshold: Minimum estimated similarity (default NEAR_DUPLICATE_THRESHOLD)
+        limit: Maximum matches (default NEAR_DUPLICATE_LIMIT)
+
+    Returns:
+        List of {'source_type', 'source_id', 'campaign_id', 'similarity'}
+        dicts, most similar first
+    """
+    signature = minhash(text or '')
+    if signature is None:
+        return []
+    if threshold is None:
+        threshold = current_app.config['NEAR_DUPLICATE_THRESHOLD']
+    if limit is None:
+        limit = current_app.config['NEAR_DUPLICATE_LIMIT']
+
+    org_filter = (ContentSignatureBand.organization_id == organization_id if organization_id is not None
+                  else ContentSignatureBand.organization_id.is_(None))
+    candidates = db.session.query(ContentSignatureBand.signature_id).filter(
+        org_filter,
+        ContentSignatureBand.band_key.in_(band_keys(signature))
+    )
+    query = db.session.query(
+        ContentSignature.source_type, ContentSignature.source_id, ContentSignature.campaign_id,
+        ContentSignature.signature
+    ).filter(ContentSignature.id.in_(candidates))
+    if campaign_id is not None:
+        query = query.filter(ContentSignature.campaign_id == campaign_id)
+    rows = [row for row in query.all() if exclude is None or (row.source_type, row.source_id) != tuple(exclude)]
+    if not rows:
+        return []
+
+    matrix = np.frombuffer(b''.join(row.signature for row in rows), dtype='<u4').reshape(len(rows), NUM_HASHES)
+    scores = similarity(signature, matrix)
+    order = np.argsort(-scores, kind='stable')
+    return [
+        {
+            'source_type': rows[index].source_type,
+            'source_id': rows[index].source_id,
+            'campaign_id': rows[index].campaign_id,
+            'similarity': round(float(scores[index]), 3)
+        }
+        for index in order[:limit] if scores[index] >= threshold
+    ]
+
+
+def recommendation_duplicates(recommendation, scope='organization'):
+    """Near-duplicates of a recommendation's text among other indexed items."""
+    campaign = recommendation.campaign
+    return find_near_duplicates(
+        _recommendation_text(recommendation),
+        campaign.organization_id,
+        campaign_id=campaign.id if scope == 'campaign' else None,
+        exclude=('recommendation', recommendation.id)
+    )
+
+
+def rebuild_index(batch_size=500):
+    """
+    Recompute every signature from the content and recommendation tables.
+
+    Returns:
+        Number of items indexed
+    """
+    connection = db.session.connection()
+    connection.execute(_bands.delete())
+    connection.execute(_signatures.delete())
+
+    organizations = dict(db.session.query(Campaign.id, Campaign.organization_id).all())
+    sources = (
+        ('content', Content, Content.query.options(load_only(Content.id, Content.campaign_id, Content.body))),
+        ('recommendation', AIRecommendation, AIRecommendation.query.filter(AIRecommendation.status == 'approved')),
+    )
+    indexed = 0
+    for source_type, model, query in sources:
+        for target in query.order_by(model.id).yield_per(batch_size):
+            text = _source_text(source_type, target)
+            signature = minhash(text) if text else None
+            if signature is not None:
+                _store(connection, source_type, target.id, target.campaign_id,
+                       organizations.get(target.campaign_id), signature)
+                indexed += 1
+    db.session.commit()
+    return indexed
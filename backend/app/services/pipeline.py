@@ -0,0 +1,107 @@
+"""Agent pipeline: narrative -> content -> distribution, run as a DAG.
+
+The Narrative Architect runs first. Each selected narrative then becomes an
+independent branch that runs the Content Synthesizer and, on its output, the
+Distribution Optimizer. Branches run concurrently. Every step goes through
+the content-addressed response cache, so re-running a pipeline only
+recomputes the steps whose inputs changed.
+"""
+from app.services.agent_cache import cached_run_agent
+from app.services.agent_batch import run_concurrently
+from app.services.scheduler import Throttled
+
+# Longest content summary handed to the Distribution Optimizer
+MAX_SUMMARY_LENGTH = 500
+
+
+def content_summary(content_result):
+    """Summarize generated content for the Distribution Optimizer."""
+    content = content_result.get('content') or {}
+    if not isinstance(content, dict):
+        return str(content)[:MAX_SUMMARY_LENGTH]
+    summary = ': '.join(part for part in (content.get('title'), content.get('body')) if part)
+    return summary[:MAX_SUMMARY_LENGTH]
+
+
+def _safe_run(agent_type, payload, bypass_cache, organization_id):
+    try:
+        return cached_run_agent(agent_type, payload, bypass_cache=bypass_cache, organization_id=organization_id)
+    except Throttled as e:
+        return {'success': False, 'error': str(e), 'retry_after': e.retry_after}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+def run_branch(index, narrative, content_options, distribution_options, bypass_cache=False,
+               organization_id=None):
+    """
+    Run one narrative branch: content generation, then distribution planning.
+
+    Returns:
+        Dict with the narrative index and each step's request and result
+    """
+    branch = {'narrative_index': index, 'narrative_title': narrative.get('title')}
+
+    content_request = {
+        'content_type': content_options.get('content_type', 'post'),
+        'topic': narrative.get('title', ''),
+        'narrative': narrative.get('description', ''),
+        'platform': content_options.get('platform', 'general')
+    }
+    content = _safe_run('content_synthesizer', content_request, bypass_cache, organization_id)
+    branch['content'] = {'request': content_request, 'result': content}
+    if not content.get('success'):
+        branch['distribution'] = None
+        return branch
+
+    distribution_request = {
+        'campaign_id': distribution_options.get('campaign_id'),
+        'content_summary': content_summary(content),
+        'target_audience': distribution_options.get('target_audience', 'General public'),
+        'platforms': distribution_options.get('platforms', ['facebook', 'twitter', 'instagram']),
+        'budget': distribution_options.get('budget', 'N/A')
+    }
+    distribution = _safe_run('distribution_optimizer', distribution_request, bypass_cache, organization_id)
+    branch['distribution'] = {'request': distribution_request, 'result': distribution}
+    return branch
+
+
+def run_pipeline(narrative_input, content_options, distribution_options, narrative_indices=None,
+                 bypass_cache=False, organization_id=None):
+    """
+    Run the narrative -> content -> distribution pipeline.
+
+    Args:
+        narrative_input: Narrative Architect payload
+        content_options: content_type and platform for generated content
+        distribution_options: campaign_id, target_audience, platforms and budget
+        narrative_indices: Indices of the narratives to expand (default all)
+        bypass_cache: Recompute every step instead of reusing cached results
+        organization_id: Organization whose AI quota the model calls count against
+
+    Returns:
+        Dict with 'success', the narrative step and one entry per branch
+    """
+    narrative = _safe_run('narrative_architect', narrative_input, bypass_cache, organization_id)
+    if not narrative.get('success'):
+        return {'success': False, 'error': narrative.get('error', 'AI generation failed'),
+                'retry_after': narrative.get('retry_after'), 'narrative': narrative}
+
+    recommendations = narrative.get('recommendations') or {}
+    narratives = recommendations.get('narratives', []) if isinstance(recommendations, dict) else []
+    if narrative_indices is None:
+        selected = list(enumerate(narratives))
+    else:
+        selected = [(i, narratives[i]) for i in narrative_indices if 0 <= i < len(narratives)]
+
+    branches = run_concurrently(run_branch, [
+        (index, item if isinstance(item, dict) else {'title': str(item)}, content_options,
+         distribution_options, bypass_cache, organization_id)
+        for index, item in selected
+    ])
+
+    return {
+        'success': True,
+        'narrative': {'request': narrative_input, 'result': narrative},
+        'branches': branches
+    }
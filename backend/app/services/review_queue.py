@@ -0,0 +1,106 @@
+"""Shared work queue over pending AI recommendations for human reviewers.
+
+Reviewers claim the oldest pending recommendations in batches, so several
+reviewers working the same queue never get the same item. A claim is a
+lease: ``claimed_by``/``claimed_at`` on the recommendation, which lapses
+after REVIEW_CLAIM_LEASE_SECONDS if the item has not been reviewed, putting
+it back in the queue. Asking again renews the caller's own claims.
+
+On PostgreSQL candidates are locked with ``SELECT ... FOR UPDATE SKIP
+LOCKED`` so concurrent claimers pass over each other's rows instead of
+waiting; on other databases (SQLite locally) a conditional UPDATE that
+re-checks claimability gives the same one-claimer-per-item guarantee.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import joinedload
+from app.models import AIRecommendation, Campaign, db
+
+
+def lease_seconds():
+    """How long a claim lasts before its recommendation returns to the queue."""
+    return current_app.config['REVIEW_CLAIM_LEASE_SECONDS']
+
+
+def _claimable(user_id, lease_cutoff):
+    """Filter for pending recommendations that are unclaimed, lapsed, or already the caller's."""
+    return and_(
+        AIRecommendation.status == 'pending',
+        or_(
+            AIRecommendation.claimed_at.is_(None),
+            AIRecommendation.claimed_at < lease_cutoff,
+            AIRecommendation.claimed_by == user_id
+        )
+    )
+
+
+def reviewable(user_id):
+    """Filter for recommendations user_id may review now: pending and not under another reviewer's live claim."""
+    return _claimable(user_id, datetime.utcnow() - timedelta(seconds=lease_seconds()))
+
+
+def _candidates(user_id, lease_cutoff, organization_id, campaign_id, agent_type):
+    query = db.session.query(AIRecommendation.id).filter(_claimable(user_id, lease_cutoff))
+    if organization_id is not None:
+        query = query.join(Campaign, AIRecommendation.campaign_id == Campaign.id).filter(
+            Campaign.organization_id == organization_id
+        )
+    if campaign_id is not None:
+        query = query.filter(AIRecommendation.campaign_id == campaign_id)
+    if agent_type is not None:
+        query = query.filter(AIRecommendation.agent_type == agent_type)
+    return query.order_by(AIRecommendation.created_at, AIRecommendation.id)
+
+
+def claim_next(user_id, limit, organization_id=None, campaign_id=None, agent_type=None):
+    """
+    Claim up to limit of the oldest pending recommendations for a reviewer.
+
+    Args:
+        user_id: Reviewer claiming the recommendations
+        limit: Maximum recommendations to claim
+        organization_id: Only claim this organization's recommendations
+            (None for all)
+        campaign_id: Only claim recommendations of this campaign
+        agent_type: Only claim recommendations from this agent
+
+    Returns:
+        The claimed AIRecommendations, oldest first, with their campaigns loaded
+    """
+    now = datetime.utcnow()
+    lease_cutoff = now - timedelta(seconds=lease_seconds())
+    query = _candidates(user_id, lease_cutoff, organization_id, campaign_id, agent_type)
+    claim_values = {'claimed_by': user_id, 'claimed_at': now}
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        ids = [row.id for row in query.with_for_update(skip_locked=True, of=AIRecommendation).limit(limit)]
+        if ids:
+            db.session.execute(update(AIRecommendation).where(AIRecommendation.id.in_(ids)).values(**claim_values))
+    else:
+        ids = []
+        # Compare-and-set: the UPDATE only takes rows nobody claimed since we read them
+        for _ in range(5):
+            pending = query.filter(AIRecommendation.id.notin_(ids)) if ids else query
+            candidates = [row.id for row in pending.limit(limit - len(ids))]
+            if not candidates:
+                break
+            db.session.execute(
+                update(AIRecommendation)
+                .where(AIRecommendation.id.in_(candidates), _claimable(user_id, lease_cutoff))
+                .values(**claim_values)
+                .execution_options(synchronize_session=False)
+            )
+            ids.extend(row.id for row in db.session.query(AIRecommendation.id).filter(
+                AIRecommendation.id.in_(candidates),
+                AIRecommendation.claimed_by == user_id,
+                AIRecommendation.claimed_at == now
+            ))
+            if len(ids) >= limit:
+                break
+
+    if not ids:
+        return []
+    return AIRecommendation.query.options(joinedload(AIRecommendation.campaign)).filter(
+        AIRecommendation.id.in_(ids)
+    ).populate_existing().order_by(AIRecommendation.created_at, AIRecommendation.id).all()
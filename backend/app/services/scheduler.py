@@ -0,0 +1,333 @@
+"""Per-organization fair scheduling and quotas for AI agent workloads.
+
+All state lives in the database so limits hold across gunicorn workers and
+nodes:
+
+* Budgets: each organization gets a request and token budget per fixed
+  window, tracked in ``org_usage_windows`` and charged with a conditional
+  UPDATE, so an over-quota request is rejected before any model call. The
+  token charge is an estimate until the call returns; settle_quota() then
+  corrects it to the usage the backend reported.
+* Concurrency: running agent calls hold rows in ``agent_slots``. A unique
+  (scope, slot_no) constraint caps both each organization and the global
+  pool without explicit locks.
+* Fairness: an organization may use up to its cap while alone, but once
+  other organizations are active its cap shrinks to its weighted share of
+  the global pool, so one large tenant cannot starve the rest.
+
+Quota and slot writes commit through their own sessions, so scheduling a call
+mid-request never commits or discards the request's own changes.
+"""
+import json
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from app.models import OrgUsageWindow, AgentSlot, db
+from app.services.single_flight import claim_owner
+from app.utils.unit_of_work import separate_session
+from app.services.model_backends import approximate_tokens
+
+GLOBAL_SCOPE = 'global'
+EPOCH = datetime(1970, 1, 1)
+
+
+class Throttled(Exception):
+    """Raised when an agent call must be rejected; maps to HTTP 429."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class QuotaExceeded(Throttled):
+    """The organization's request or token budget for this window is spent."""
+
+
+class CapacityExhausted(Throttled):
+    """No agent slot freed up within the scheduling wait."""
+
+
+def org_scope(organization_id):
+    """Slot scope for one organization."""
+    return f'org:{organization_id}'
+
+
+def org_weight(organization_id):
+    """Scheduling weight of an organization (default 1)."""
+    return float(current_app.config['AI_ORG_WEIGHTS'].get(str(organization_id), 1))
+
+
+def estimate_tokens(payload):
+    """Rough token estimate for an agent call: input size plus expected output."""
+    input_tokens = approximate_tokens(json.dumps(payload, default=str))
+    return input_tokens + current_app.config['AI_QUOTA_OUTPUT_TOKEN_ESTIMATE']
+
+
+def _window(now):
+    """Start and end of the quota window containing now."""
+    length = current_app.config['AI_QUOTA_WINDOW_SECONDS']
+    elapsed = int((now - EPOCH).total_seconds())
+    start = EPOCH + timedelta(seconds=elapsed - elapsed % length)
+    return start, start + timedelta(seconds=length)
+
+
+def _enabled(organization_id):
+    return organization_id is not None and current_app.config['AI_SCHEDULER_ENABLED']
+
+
+def _limits(organization_id):
+    config = current_app.config
+    weight = org_weight(organization_id)
+    return (
+        int(config['AI_QUOTA_REQUESTS_PER_WINDOW'] * weight),
+        int(config['AI_QUOTA_TOKENS_PER_WINDOW'] * weight)
+    )
+
+
+def reserve_quota(organization_id, requests=1, tokens=0):
+    """
+    Charge requests and tokens against the organization's current window.
+
+    Raises:
+        QuotaExceeded: If the charge would exceed either budget
+    """
+    if not _enabled(organization_id):
+        return
+    now = datetime.utcnow()
+    window_start, window_end = _window(now)
+    request_limit, token_limit = _limits(organization_id)
+
+    # Make sure the window row exists; a concurrent insert is fine
+    try:
+        with separate_session() as session:
+            if session.get(OrgUsageWindow, (organization_id, window_start)) is None:
+                session.add(OrgUsageWindow(organization_id=organization_id, window_start=window_start))
+    except IntegrityError:
+        pass
+
+    with separate_session() as session:
+        result = session.execute(
+            update(OrgUsageWindow)
+            .where(
+                OrgUsageWindow.organization_id == organization_id,
+                OrgUsageWindow.window_start == window_start,
+                OrgUsageWindow.requests + requests <= request_limit,
+                OrgUsageWindow.tokens + tokens <= token_limit
+            )
+            .values(requests=OrgUsageWindow.requests + requests, tokens=OrgUsageWindow.tokens + tokens)
+        )
+
+    if result.rowcount != 1:
+        raise QuotaExceeded('AI quota exceeded for this organization', (window_end - now).total_seconds())
+
+
+def refund_quota(organization_id, requests=1, tokens=0):
+    """Return an unused reservation to the organization's current window."""
+    if not _enabled(organization_id):
+        return
+    window_start, _ = _window(datetime.utcnow())
+    try:
+        with separate_session() as session:
+            session.execute(
+                update(OrgUsageWindow)
+                .where(
+                    OrgUsageWindow.organization_id == organization_id,
+                    OrgUsageWindow.window_start == window_start,
+                    OrgUsageWindow.requests >= requests,
+                    OrgUsageWindow.tokens >= tokens
+                )
+                .values(requests=OrgUsageWindow.requests - requests, tokens=OrgUsageWindow.tokens - tokens)
+            )
+    except Exception as e:
+        print(f"Error refunding AI quota: {e}")
+
+
+def result_tokens(result):
+    """Tokens an agent result reports in its usage, or None if it reports none."""
+    usage = (result or {}).get('usage') or {}
+    if 'input_tokens' not in usage and 'output_tokens' not in usage:
+        return None
+    return int(usage.get('input_tokens', 0)) + int(usage.get('output_tokens', 0))
+
+
+def settle_quota(organization_id, estimated_tokens, result):
+    """
+    Correct a call's token charge from its estimate to the reported usage.
+
+    The difference goes to the current window, without a limit check: the
+    tokens are already spent, and an overdrawn window rejects later calls.
+    Results without usage keep the estimate.
+    """
+    actual = result_tokens(result)
+    if actual is None or actual == estimated_tokens or not _enabled(organization_id):
+        return
+    window_start, _ = _window(datetime.utcnow())
+    tokens = OrgUsageWindow.tokens + (actual - estimated_tokens)
+    try:
+        with separate_session() as session:
+            session.execute(
+                update(OrgUsageWindow)
+                .where(
+                    OrgUsageWindow.organization_id == organization_id,
+                    OrgUsageWindow.window_start == window_start
+                )
+                .values(tokens=case((tokens > 0, tokens), else_=0))
+            )
+    except Exception as e:
+        print(f"Error settling AI quota: {e}")
+
+
+def check_quota(organization_id):
+    """
+    Reject early if the organization has no request budget left.
+
+    Raises:
+        QuotaExceeded: If the current window's request budget is spent
+    """
+    if not _enabled(organization_id):
+        return
+    now = datetime.utcnow()
+    window_start, window_end = _window(now)
+    request_limit, token_limit = _limits(organization_id)
+    with separate_session() as session:
+        usage = session.get(OrgUsageWindow, (organization_id, window_start))
+    if usage and (usage.requests >= request_limit or usage.tokens >= token_limit):
+        raise QuotaExceeded('AI quota exceeded for this organization', (window_end - now).total_seconds())
+
+
+def _try_slot(scope, limit, owner):
+    """
+    Try to take one of the first `limit` slots in a scope.
+
+    Returns:
+        The AgentSlot id, or None if all slots are taken
+    """
+    now = datetime.utcnow()
+    with separate_session() as session:
+        session.query(AgentSlot).filter(
+            AgentSlot.scope == scope, AgentSlot.expires_at < now
+        ).delete(synchronize_session=False)
+        session.commit()
+        taken = {slot_no for (slot_no,) in session.query(AgentSlot.slot_no).filter(AgentSlot.scope == scope)}
+
+    # Slots numbered above a shrunken limit still count until released
+    if len(taken) >= limit:
+        return None
+    ttl = timedelta(seconds=current_app.config['AI_SCHEDULER_SLOT_TTL_SECONDS'])
+    for slot_no in range(limit):
+        if slot_no in taken:
+            continue
+        slot = AgentSlot(scope=scope, slot_no=slot_no, owner=owner, acquired_at=now, expires_at=now + ttl)
+        try:
+            with separate_session() as session:
+                session.add(slot)
+            return slot.id
+        except IntegrityError:
+            # Another worker took it first
+            continue
+    return None
+
+
+def _release_slot(slot_id):
+    try:
+        with separate_session() as session:
+            session.query(AgentSlot).filter_by(id=slot_id).delete(synchronize_session=False)
+    except Exception as e:
+        print(f"Error releasing agent slot: {e}")
+
+
+def org_concurrency_limit(organization_id):
+    """
+    Current concurrency limit for an organization.
+
+    The weighted cap applies while the organization is the only active one;
+    with other organizations active it is reduced to its weighted share of
+    the global pool (at least one slot).
+    """
+    config = current_app.config
+    weight = org_weight(organization_id)
+    cap = max(1, int(math.ceil(config['AI_ORG_MAX_CONCURRENCY'] * weight)))
+
+    own_scope = org_scope(organization_id)
+    active_scopes = {scope for (scope,) in db.session.query(AgentSlot.scope).filter(
+        AgentSlot.scope.like('org:%'),
+        AgentSlot.expires_at >= datetime.utcnow()
+    ).distinct()}
+    active_scopes.add(own_scope)
+
+    total_weight = sum(org_weight(scope.split(':', 1)[1]) for scope in active_scopes)
+    share = max(1, int(math.ceil(config['AI_SCHEDULER_GLOBAL_SLOTS'] * weight / total_weight)))
+    return min(cap, share)
+
+
+def acquire_slot(organization_id):
+    """
+    Wait for an organization slot and a global slot.
+
+    Returns:
+        Tuple of the held slot ids
+
+    Raises:
+        CapacityExhausted: If no slot frees up within AI_SCHEDULER_MAX_WAIT_SECONDS
+    """
+    config = current_app.config
+    owner = claim_owner()
+    deadline = time.monotonic() + config['AI_SCHEDULER_MAX_WAIT_SECONDS']
+
+    while True:
+        org_slot = _try_slot(org_scope(organization_id), org_concurrency_limit(organization_id), owner)
+        if org_slot is not None:
+            global_slot = _try_slot(GLOBAL_SCOPE, config['AI_SCHEDULER_GLOBAL_SLOTS'], owner)
+            if global_slot is not None:
+                return org_slot, global_slot
+            _release_slot(org_slot)
+
+        if time.monotonic() >= deadline:
+            raise CapacityExhausted('AI agents are at capacity, try again shortly',
+                                    config['AI_SCHEDULER_RETRY_AFTER_SECONDS'])
+        # Jitter keeps waiting workers from polling in lockstep
+        time.sleep(random.uniform(0.05, 0.2))
+
+
+@contextmanager
+def scheduled(organization_id, payload, reserve=True):
+    """
+    Run an agent call under the organization's quota and concurrency limits.
+
+    Args:
+        organization_id: Organization the call is charged to; None skips scheduling
+        payload: Agent input, used to estimate token usage
+        reserve: Charge the request/token budget (False if already charged)
+
+    Yields:
+        Seconds spent waiting for a slot
+
+    Raises:
+        Throttled: If the call must be rejected with HTTP 429
+    """
+    if not _enabled(organization_id):
+        yield 0.0
+        return
+
+    tokens = estimate_tokens(payload)
+    if reserve:
+        reserve_quota(organization_id, requests=1, tokens=tokens)
+
+    waiting_since = time.monotonic()
+    try:
+        slots = acquire_slot(organization_id)
+    except Throttled:
+        if reserve:
+            refund_quota(organization_id, requests=1, tokens=tokens)
+        raise
+
+    try:
+        yield time.monotonic() - waiting_since
+    finally:
+        for slot_id in slots:
+            _release_slot(slot_id)
@@ -0,0 +1,296 @@
+"""Full-text search across campaigns, content and recommendations.
+
+Searchable text is kept in ``search_documents``, one row per campaign,
+content item and recommendation, with its organization for tenant
+scoping. Mapper events keep those rows current in the same transaction
+as the change that affects them, so nothing is ever reindexed wholesale.
+
+The full-text index depends on the database:
+
+* PostgreSQL: a GIN expression index over a weighted ``tsvector`` of
+  title (weight A) and body (weight B), ranked with ``ts_rank_cd`` and
+  highlighted with ``ts_headline``.
+* SQLite: an external-content FTS5 table kept in sync with
+  ``search_documents`` by triggers, ranked with ``bm25`` and highlighted
+  with ``snippet``.
+
+Queries are reduced to words that must all match; the last word also
+matches as a prefix, so results appear while the user is still typing.
+"""
+import re
+from datetime import datetime
+from sqlalchemy import bindparam, event, inspect, select, text
+from app.models import AIRecommendation, Campaign, Content, SearchDocument, db
+from app.services.near_duplicates import recommendation_text
+
+DOC_TYPES = ('campaign', 'content', 'recommendation')
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+_WORD_RE = re.compile(r'\w+')
+
+_documents = SearchDocument.__table__
+
+
+def _postgres_vector(prefix=''):
+    """Weighted tsvector expression; queries must repeat the indexed expression exactly."""
+    return (f"setweight(to_tsvector('english', coalesce({prefix}title, '')), 'A') || "
+            f"setweight(to_tsvector('english', {prefix}body), 'B')")
+
+
+_POSTGRES_SETUP = [
+    f"CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING gin (({_postgres_vector()}))"
+]
+
+_SQLITE_SETUP = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+    "title, body, content='search_documents', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+
+def _dialect(bind):
+    return bind.dialect.name
+
+
+def init_app(app):
+    """Create the full-text index and backfill documents for existing data."""
+    with app.app_context():
+        connection = db.session.connection()
+        statements = {'postgresql': _POSTGRES_SETUP, 'sqlite': _SQLITE_SETUP}.get(_dialect(connection), [])
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        db.session.commit()
+
+        # Databases created before search existed get their documents once
+        if db.session.query(SearchDocument.id).first() is None and db.session.query(Campaign.id).first():
+            rebuild()
+
+
+def campaign_document(campaign):
+    body = '\n'.join(part for part in (campaign.description, campaign.objectives) if part)
+    return campaign.name, body or campaign.name
+
+
+def content_document(content):
+    return content.title, content.body
+
+
+def recommendation_document(recommendation):
+    title = f"{recommendation.agent_type.replace('_', ' ').title()} recommendation"
+    return title, recommendation_text(recommendation.agent_type, recommendation.get_recommendation_data())
+
+
+def _write(connection, doc_type, doc_id, organization_id, campaign_id, title, body):
+    connection.execute(_documents.delete().where(
+        _documents.c.doc_type == doc_type, _documents.c.doc_id == doc_id
+    ))
+    if body:
+        connection.execute(_documents.insert().values(
+            doc_type=doc_type, doc_id=doc_id, organization_id=organization_id, campaign_id=campaign_id,
+            title=title, body=body, updated_at=datetime.utcnow()
+        ))
+
+
+def _remove(connection, doc_type, doc_id):
+    connection.execute(_documents.delete().where(
+        _documents.c.doc_type == doc_type, _documents.c.doc_id == doc_id
+    ))
+
+
+def remove_documents(doc_type, doc_ids):
+    """Remove the documents of rows deleted in bulk, which bypasses the mapper events."""
+    db.session.execute(_documents.delete().where(
+        _documents.c.doc_type == doc_type, _documents.c.doc_id.in_(doc_ids)
+    ))
+
+
+def _organization_of(connection, campaign_id):
+    return connection.execute(select(Campaign.organization_id).where(Campaign.id == campaign_id)).scalar()
+
+
+def _index_campaign(connection, campaign):
+    _write(connection, 'campaign', campaign.id, campaign.organization_id, campaign.id,
+           *campaign_document(campaign))
+
+
+def _index_content(connection, content):
+    _write(connection, 'content', content.id, _organization_of(connection, content.campaign_id),
+           content.campaign_id, *content_document(content))
+
+
+def _index_recommendation(connection, recommendation):
+    _write(connection, 'recommendation', recommendation.id,
+           _organization_of(connection, recommendation.campaign_id), recommendation.campaign_id,
+           *recommendation_document(recommendation))
+
+
+def _changed(target, fields):
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _listen(model, doc_type, index, fields):
+    def after_insert(mapper, connection, target):
+        index(connection, target)
+
+    def after_update(mapper, connection, target):
+        if _changed(target, fields):
+            index(connection, target)
+
+    def after_delete(mapper, connection, target):
+        _remove(connection, doc_type, target.id)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'after_delete', after_delete)
+
+
+_listen(Campaign, 'campaign', _index_campaign, ('name', 'description', 'objectives', 'organization_id'))
+_listen(Content, 'content', _index_content, ('title', 'body', 'campaign_id'))
+_listen(AIRecommendation, 'recommendation', _index_recommendation, ('recommendation_data', 'payload_hash', 'campaign_id'))
+
+
+@event.listens_for(Campaign, 'after_update')
+def _move_campaign_documents(mapper, connection, target):
+    """Keep a campaign's content and recommendations in its organization's scope."""
+    if _changed(target, ('organization_id',)):
+        connection.execute(_documents.update().where(
+            _documents.c.campaign_id == target.id
+        ).values(organization_id=target.organization_id))
+
+
+def rebuild(batch_size=500):
+    """
+    Recreate every search document from the source tables.
+
+    Returns:
+        Number of documents written
+    """
+    connection = db.session.connection()
+    connection.execute(_documents.delete())
+
+    count = 0
+    for campaign in Campaign.query.order_by(Campaign.id).yield_per(batch_size):
+        _index_campaign(connection, campaign)
+        count += 1
+    for model, index in ((Content, _index_content), (AIRecommendation, _index_recommendation)):
+        for item in model.query.order_by(model.id).yield_per(batch_size):
+            index(connection, item)
+            count += 1
+    db.session.commit()
+    return count
+
+
+def query_words(query):
+    """Words of a user query, lowercased; empty if nothing searchable."""
+    return _WORD_RE.findall(query.lower())
+
+
+def _fts5_query(words):
+    # Quoted terms cannot be parsed as FTS5 operators
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _tsquery(words):
+    terms = list(words)
+    terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def search(query, organization_id=None, doc_types=None, campaign_id=None, limit=20, offset=0):
+    """
+    Search documents.
+
+    Args:
+        query: User query text
+        organization_id: Only search this organization's documents (None
+            searches all)
+        doc_types: Document types to include (default: all)
+        campaign_id: Only search documents of this campaign
+        limit: Maximum results
+        offset: Results to skip
+
+    Returns:
+        List of {'type', 'id', 'campaign_id', 'organization_id', 'title',
+        'highlight', 'rank'} dicts, best match first
+    """
+    words = query_words(query)
+    if not words:
+        return []
+
+    connection = db.session.connection()
+    dialect = _dialect(connection)
+    filters = ['d.doc_type IN :doc_types']
+    params = {'doc_types': list(doc_types or DOC_TYPES), 'limit': limit, 'offset': offset}
+    if organization_id is not None:
+        filters.append('d.organization_id = :organization_id')
+        params['organization_id'] = organization_id
+    if campaign_id is not None:
+        filters.append('d.campaign_id = :campaign_id')
+        params['campaign_id'] = campaign_id
+    where = ' AND '.join(filters)
+
+    if dialect == 'postgresql':
+        params['query'] = _tsquery(words)
+        sql = f"""
+            SELECT d.doc_type, d.doc_id, d.campaign_id, d.organization_id, d.title,
+                   ts_headline('english', d.body, q,
+                               'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2, MaxWords=20')
+                       AS highlight,
+                   ts_rank_cd({_postgres_vector('d.')}, q) AS rank
+            FROM search_documents d, to_tsquery('english', :query) q
+            WHERE ({_postgres_vector('d.')}) @@ q AND {where}
+            ORDER BY rank DESC, d.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    elif dialect == 'sqlite':
+        params['query'] = _fts5_query(words)
+        # bm25 is lower for better matches; titles count double
+        sql = f"""
+            SELECT d.doc_type, d.doc_id, d.campaign_id, d.organization_id, d.title,
+                   snippet(search_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 16) AS highlight,
+                   -bm25(search_fts, 2.0, 1.0) AS rank
+            FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid
+            WHERE search_fts MATCH :query AND {where}
+            ORDER BY rank DESC, d.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        # No full-text support: every word must appear somewhere, unranked
+        for position, word in enumerate(words):
+            filters.append(f"(lower(coalesce(d.title, '')) LIKE :word{position} "
+                           f"OR lower(d.body) LIKE :word{position})")
+            params[f'word{position}'] = f'%{word}%'
+        sql = f"""
+            SELECT d.doc_type, d.doc_id, d.campaign_id, d.organization_id, d.title,
+                   substr(d.body, 1, 200) AS highlight, 0 AS rank
+            FROM search_documents d
+            WHERE {' AND '.join(filters)}
+            ORDER BY d.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    statement = text(sql).bindparams(bindparam('doc_types', expanding=True))
+    return [
+        {
+            'type': row.doc_type,
+            'id': row.doc_id,
+            'campaign_id': row.campaign_id,
+            'organization_id': row.organization_id,
+            'title': row.title,
+            'highlight': row.highlight,
+            'rank': round(float(row.rank), 4)
+        }
+        for row in connection.execute(statement, params)
+    ]
@@ -0,0 +1,202 @@
+"""Lexicon-based sentiment scoring and theme extraction for comment batches.
+
+Comments are tokenized in one regular-expression pass over the joined text
+and mapped to integer term ids. Everything after that is vectorized with
+NumPy: lexicon scores are looked up per token, a term following a negator
+has its score flipped, per-comment scores are summed with ``bincount``, and
+theme counts come from the unique (comment, term) pairs.
+"""
+import re
+import numpy as np
+
+# Term polarity from -3 (very negative) to +3 (very positive), tuned for
+# feedback on civic campaigns
+LEXICON = {
+    'amazing': 3, 'excellent': 3, 'fantastic': 3, 'love': 3, 'loved': 3, 'outstanding': 3, 'wonderful': 3,
+    'awesome': 3, 'inspiring': 3, 'inspired': 3, 'brilliant': 3,
+    'appreciate': 2, 'appreciated': 2, 'agree': 2, 'beneficial': 2, 'clear': 2, 'empowering': 2,
+    'encouraging': 2, 'engaging': 2, 'enjoyed': 2, 'exciting': 2, 'excited': 2, 'glad': 2, 'good': 2,
+    'great': 2, 'happy': 2, 'helpful': 2, 'hopeful': 2, 'impressive': 2, 'informative': 2, 'insightful': 2,
+    'like': 1, 'liked': 2, 'motivated': 2, 'positive': 2, 'proud': 2, 'support': 2, 'supported': 2,
+    'thank': 2, 'thanks': 2, 'thankful': 2, 'trust': 2, 'useful': 2, 'valuable': 2, 'welcome': 2,
+    'accessible': 1, 'better': 1, 'fair': 1, 'fine': 1, 'hope': 1, 'important': 1, 'improve': 1,
+    'improved': 1, 'informed': 1, 'interested': 1, 'interesting': 1, 'ok': 1, 'okay': 1, 'progress': 1,
+    'relevant': 1, 'safe': 1, 'transparent': 1, 'want': 1, 'yes': 1,
+    'concern': -1, 'concerned': -1, 'confused': -1, 'confusing': -1, 'doubt': -1, 'expensive': -1,
+    'hard': -1, 'late': -1, 'miss': -1, 'missed': -1, 'missing': -1, 'slow': -1, 'unclear': -1,
+    'unsure': -1, 'worried': -1, 'worry': -1,
+    'angry': -2, 'annoying': -2, 'bad': -2, 'biased': -2, 'boring': -2, 'broken': -2, 'disagree': -2,
+    'disappointed': -2, 'disappointing': -2, 'fail': -2, 'failed': -2, 'failure': -2, 'fake': -2,
+    'frustrated': -2, 'frustrating': -2, 'hate': -3, 'ignored': -2, 'misleading': -2, 'poor': -2,
+    'problem': -2, 'propaganda': -2, 'sad': -2, 'scam': -3, 'spam': -2, 'unfair': -2, 'useless': -2,
+    'waste': -2, 'wrong': -2,
+    'awful': -3, 'corrupt': -3, 'disgusting': -3, 'horrible': -3, 'lies': -3, 'lie': -3, 'liar': -3,
+    'terrible': -3, 'worst': -3,
+}
+
+# Terms that flip the polarity of the term right after them
+NEGATORS = {
+    'not', 'no', 'never', 'nothing', 'hardly', 'without', "don't", "doesn't", "didn't", "isn't",
+    "wasn't", "aren't", "won't", "can't", "cannot", "couldn't", "shouldn't", 'dont', 'doesnt', 'didnt',
+    'isnt', 'wasnt', 'cant', 'wont'
+}
+
+STOP_WORDS = {
+    'a', 'about', 'after', 'all', 'also', 'am', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'been',
+    'but', 'by', 'can', 'could', 'did', 'do', 'does', 'for', 'from', 'get', 'got', 'had', 'has', 'have',
+    'he', 'her', 'here', 'his', 'how', 'i', "i'm", 'if', 'in', 'into', 'is', 'it', "it's", 'its', 'just',
+    'me', 'more', 'most', 'my', 'of', 'on', 'one', 'or', 'our', 'out', 'really', 'she', 'so', 'some',
+    'than', 'that', "that's", 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those',
+    'to', 'too', 'up', 'us', 'very', 'was', 'we', 'were', 'what', 'when', 'where', 'which', 'who', 'why',
+    'will', 'with', 'would', 'you', 'your'
+}
+
+# Separates comments in the joined text; never matched inside a comment
+_SEPARATOR = '\x00'
+_TOKEN_RE = re.compile(r"[a-z][a-z']*|\x00")
+
+# Comments scoring within this margin of zero count as neutral
+NEUTRAL_MARGIN = 0.5
+
+
+def tokenize(comments):
+    """
+    Tokenize comments in bulk.
+
+    Returns:
+        Tuple of (vocabulary list, token term ids, token comment indices)
+        as int32 arrays
+    """
+    text = _SEPARATOR.join(str(comment).replace(_SEPARATOR, ' ') for comment in comments).lower()
+    tokens = _TOKEN_RE.findall(text)
+
+    vocabulary = {_SEPARATOR: 0}
+    lookup = vocabulary.setdefault
+    ids = np.fromiter((lookup(token, len(vocabulary)) for token in tokens), dtype=np.int32, count=len(tokens))
+
+    # Every separator starts the next comment
+    separators = ids == 0
+    comment_index = np.cumsum(separators, dtype=np.int32)
+    keep = ~separators
+    return list(vocabulary), ids[keep], comment_index[keep]
+
+
+def _term_vector(vocabulary, mapping, dtype):
+    return np.fromiter((mapping.get(term, 0) for term in vocabulary), dtype=dtype, count=len(vocabulary))
+
+
+def score_comments(comments):
+    """
+    Score each comment against the lexicon.
+
+    Returns:
+        float32 array with one score per comment (positive above zero)
+    """
+    return score_tokens(*tokenize(comments), len(comments))
+
+
+def score_tokens(vocabulary, term_ids, comment_index, comment_count):
+    """Score tokenized comments; see score_comments."""
+    scores = _term_vector(vocabulary, LEXICON, np.float32)
+    negators = np.fromiter((term in NEGATORS for term in vocabulary), dtype=bool, count=len(vocabulary))
+
+    token_scores = scores[term_ids]
+    # Flip a term preceded by a negator within the same comment
+    negated = np.zeros(len(term_ids), dtype=bool)
+    negated[1:] = negators[term_ids[:-1]] & (comment_index[1:] == comment_index[:-1])
+    token_scores[negated] *= -1
+
+    return np.bincount(comment_index, weights=token_scores, minlength=comment_count).astype(np.float32)
+
+
+def sentiment_distribution(scores):
+    """Percentages of positive, neutral and negative comments."""
+    total = len(scores)
+    if not total:
+        return {'positive': 0, 'neutral': 0, 'negative': 0}
+    positive = int(np.count_nonzero(scores > NEUTRAL_MARGIN))
+    negative = int(np.count_nonzero(scores < -NEUTRAL_MARGIN))
+    return {
+        'positive': round(100 * positive / total, 1),
+        'neutral': round(100 * (total - positive - negative) / total, 1),
+        'negative': round(100 * negative / total, 1)
+    }
+
+
+def _document_frequencies(keys, comment_index, size):
+    """Number of comments each key occurs in."""
+    pairs = np.unique(comment_index.astype(np.int64) * size + keys)
+    return np.bincount((pairs % size).astype(np.int64), minlength=size)
+
+
+def term_frequencies(vocabulary, term_ids, comment_index, limit=10):
+    """
+    Most common content terms and two-word phrases, by number of comments.
+
+    Stop words, negators and sentiment terms are not themes. A term is left
+    out when a selected phrase containing it covers at least half of its
+    comments.
+
+    Returns:
+        List of {'term', 'comments'} dicts, phrases before single terms at
+        equal counts
+    """
+    vocabulary_size = len(vocabulary)
+    content = np.fromiter(
+        (len(term) > 2 and term not in STOP_WORDS and term not in NEGATORS and term not in LEXICON
+         for term in vocabulary),
+        dtype=bool, count=vocabulary_size
+    )
+    content_tokens = content[term_ids]
+
+    unigram_counts = _document_frequencies(term_ids[content_tokens], comment_index[content_tokens],
+                                           vocabulary_size)
+
+    # Adjacent content terms within one comment form a phrase
+    adjacent = content_tokens[:-1] & content_tokens[1:] & (comment_index[:-1] == comment_index[1:])
+    phrase_keys = term_ids[:-1][adjacent].astype(np.int64) * vocabulary_size + term_ids[1:][adjacent]
+    phrases, phrase_ids = np.unique(phrase_keys, return_inverse=True)
+    phrase_counts = _document_frequencies(phrase_ids, comment_index[:-1][adjacent], max(len(phrases), 1))
+
+    candidates = []
+    for index in np.argsort(-phrase_counts, kind='stable')[:limit]:
+        if phrase_counts[index] >= 2:
+            first, second = divmod(int(phrases[index]), vocabulary_size)
+            candidates.append((int(phrase_counts[index]), 1, f'{vocabulary[first]} {vocabulary[second]}'))
+    for index in np.argsort(-unigram_counts, kind='stable')[:limit]:
+        if unigram_counts[index] > 0:
+            candidates.append((int(unigram_counts[index]), 0, vocabulary[index]))
+
+    candidates.sort(key=lambda candidate: (-candidate[0], -candidate[1]))
+    selected = []
+    phrase_words = {}
+    for count, is_phrase, term in candidates:
+        if is_phrase:
+            for word in term.split(' '):
+                phrase_words[word] = max(phrase_words.get(word, 0), count)
+        elif phrase_words.get(term, 0) * 2 >= count:
+            continue
+        selected.append({'term': term, 'comments': count})
+        if len(selected) == limit:
+            break
+    return selected
+
+
+def analyze_comments(comments, theme_limit=5):
+    """
+    Sentiment distribution and key themes for a batch of comments.
+
+    Returns:
+        Dict with 'sentiment' percentages, 'key_themes', 'term_frequencies'
+        and 'comments_analyzed'
+    """
+    comments = [comment for comment in comments if comment]
+    vocabulary, term_ids, comment_index = tokenize(comments)
+    scores = score_tokens(vocabulary, term_ids, comment_index, len(comments))
+    terms = term_frequencies(vocabulary, term_ids, comment_index, limit=max(theme_limit, 10))
+    return {
+        'sentiment': sentiment_distribution(scores),
+        'key_themes': [entry['term'] for entry in terms[:theme_limit]],
+        'term_frequencies': terms,
+        'comments_analyzed': len(comments)
+    }
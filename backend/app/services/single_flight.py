@@ -0,0 +1,125 @@
+"""Single-flight coalescing of concurrent identical agent invocations.
+
+Within a process, callers with the same key wait on one Future. Across
+gunicorn workers and nodes, a claim row in ``agent_inflight_claims`` elects
+one leader per key; other processes wait for the leader's result to appear
+in the persistent cache tier instead of calling the model themselves. Claims
+are written through their own sessions, so taking or releasing one mid-request
+never commits or discards the request's own changes.
+"""
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from app.models import AgentInflightClaim
+from app.utils.unit_of_work import separate_session
+
+
+class SingleFlight:
+    """Run at most one call per key at a time within this process."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn, or wait for an in-flight call with the same key.
+
+        Returns:
+            Tuple of (result, shared) where shared is True if the result came
+            from another caller's execution
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+def claim_owner():
+    """Identify this process and thread as a claim owner."""
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def acquire_claim(key, owner, ttl_seconds):
+    """
+    Try to become the cross-process leader for a key.
+
+    Expired claims left behind by crashed workers are taken over.
+
+    Returns:
+        True if this owner now holds the claim
+    """
+    for _ in range(2):
+        now = datetime.utcnow()
+        try:
+            with separate_session() as session:
+                session.add(AgentInflightClaim(
+                    key=key,
+                    owner=owner,
+                    expires_at=now + timedelta(seconds=ttl_seconds)
+                ))
+            return True
+        except IntegrityError:
+            with separate_session() as session:
+                session.query(AgentInflightClaim).filter(
+                    AgentInflightClaim.key == key,
+                    AgentInflightClaim.expires_at < now
+                ).delete(synchronize_session=False)
+    return False
+
+
+def release_claim(key, owner):
+    """Release a claim held by this owner."""
+    try:
+        with separate_session() as session:
+            session.query(AgentInflightClaim).filter_by(key=key, owner=owner).delete(synchronize_session=False)
+    except Exception as e:
+        print(f"Error releasing in-flight claim: {e}")
+
+
+def wait_for_leader(key, lookup, timeout, interval=0.25):
+    """
+    Wait for another process's leader to publish a result.
+
+    Args:
+        key: Claimed key
+        lookup: Callable returning the published result or None
+        timeout: Maximum seconds to wait
+        interval: Seconds between polls
+
+    Returns:
+        The published result, or None if the leader finished without one
+        (or the wait timed out)
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = lookup()
+        if result is not None:
+            return result
+        # A fresh session each poll sees the leader's latest commits
+        with separate_session() as session:
+            claimed = session.get(AgentInflightClaim, key) is not None
+        if not claimed:
+            return lookup()
+        time.sleep(interval)
+    return None
@@ -0,0 +1,224 @@
+"""Bulk user import from CSV or JSON Lines uploads.
+
+Rows are read lazily from the upload and handled in batches of
+USER_IMPORT_BATCH_SIZE, so memory use does not grow with the file. Each
+batch is validated, checked against existing emails with one query, has its
+passwords hashed in parallel on a shared thread pool (bcrypt releases the GIL
+while hashing, so threads use every core without the fork hazards of a
+process pool in a server that already runs worker threads), and is written
+with one multi-row INSERT plus one multi-row audit insert, then committed.
+Per-row outcomes are yielded as each batch completes, and rows already
+reported as created stay created if a later batch fails. An upload that
+stops decoding or parsing partway raises UnreadableUpload.
+"""
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from flask import current_app
+from sqlalchemy import insert
+from app.models import Organization, User, db, hash_password
+from app.services import lookup
+from app.utils.audit import log_actions
+from app.utils.unit_of_work import commit_now
+
+FORMATS = ('csv', 'jsonl')
+ROLES = ('super_admin', 'org_admin', 'campaign_manager', 'content_creator', 'analyst', 'reviewer', 'viewer')
+REQUIRED_FIELDS = ('email', 'password', 'full_name', 'role')
+
+_TRUE = ('1', 'true', 'yes', 'y')
+_FALSE = ('0', 'false', 'no', 'n')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UnreadableUpload(ValueError):
+    """The upload could not be decoded or parsed past some row."""
+
+
+def get_executor():
+    """Get this process's shared password hashing executor."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config['USER_IMPORT_HASH_WORKERS'],
+                    thread_name_prefix='password-hash'
+                )
+    return _executor
+
+
+def read_rows(stream, file_format):
+    """
+    Lazily parse an upload.
+
+    Args:
+        stream: Binary file-like object
+        file_format: 'csv' (with a header row) or 'jsonl'
+
+    Yields:
+        One dict per row; None for a JSON line that is not an object
+
+    Raises:
+        UnreadableUpload: The upload is not UTF-8 or not valid CSV
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    except UnicodeDecodeError:
+        raise UnreadableUpload('File is not UTF-8 encoded') from None
+    except csv.Error as e:
+        raise UnreadableUpload(f'Invalid CSV: {e}') from None
+
+
+def _flag(value, default):
+    if isinstance(value, bool):
+        return value
+    value = str(value if value is not None else '').strip().lower()
+    if not value:
+        return default
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError
+
+
+def _validate(row, organization_id, can_assign_organization):
+    """
+    Check one row.
+
+    Returns:
+        Tuple of (column values, error message); exactly one is None
+    """
+    if row is None:
+        return None, 'Row must be a JSON object'
+    values = {field: str(row.get(field) or '').strip() for field in REQUIRED_FIELDS}
+    missing = [field for field in REQUIRED_FIELDS if not values[field]]
+    if missing:
+        return None, f'Missing required field: {missing[0]}'
+    if '@' not in values['email']:
+        return None, 'Invalid email'
+    if values['role'] not in ROLES:
+        return None, 'Invalid role'
+    if values['role'] == 'super_admin' and not can_assign_organization:
+        return None, 'Only super admins can create super admins'
+
+    if can_assign_organization and str(row.get('organization_id') or '').strip():
+        try:
+            organization_id = int(row['organization_id'])
+        except (TypeError, ValueError):
+            return None, 'Invalid organization_id'
+    try:
+        is_active = _flag(row.get('is_active'), True)
+        is_verified = _flag(row.get('is_verified'), False)
+    except ValueError:
+        return None, 'is_active and is_verified must be true or false'
+
+    values.update(organization_id=organization_id, is_active=is_active, is_verified=is_verified)
+    return values, None
+
+
+def _insert_batch(values, creator_id):
+    """Hash, insert and audit a batch of validated rows; returns the new user ids in order."""
+    hashes = get_executor().map(hash_password, [row.pop('password') for row in values])
+    for row, password_hash in zip(values, hashes):
+        row['password_hash'] = password_hash
+
+    ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), values).all()
+    log_actions(creator_id, 'user_created', 'user', [(user_id, {'import': True}) for user_id in ids])
+    commit_now()
+    # The bulk INSERT skips the mapper events that keep the lookup index current
+    lookup.invalidate('user')
+    return ids
+
+
+def import_users(rows, creator, organization_id=None):
+    """
+    Create users from parsed rows.
+
+    Args:
+        rows: Iterable of row dicts, as from read_rows
+        creator: User running the import; org admins always import into
+            their own organization
+        organization_id: Default organization for super admin imports
+
+    Yields:
+        {'row', 'email', 'status', ...} per row, in input order: status
+        'created' with the new 'id', or 'error' with an 'error' message
+
+    Raises:
+        UnreadableUpload: From read_rows; rows of the batch being read when
+            it was raised are not imported
+    """
+    batch_size = current_app.config['USER_IMPORT_BATCH_SIZE']
+    creator_id = creator.id
+    can_assign_organization = creator.role == 'super_admin'
+    if not can_assign_organization:
+        organization_id = creator.organization_id
+
+    rows = iter(rows)
+    number = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        results = []
+        pending = []
+        for row in batch:
+            number += 1
+            values, error = _validate(row, organization_id, can_assign_organization)
+            email = values['email'] if values else str((row or {}).get('email') or '').strip() or None
+            results.append({'row': number, 'email': email, 'status': 'error', 'error': error})
+            if values:
+                pending.append((results[-1], values))
+
+        # Existing emails and organizations for the whole batch in one query each;
+        # repeated emails within the batch lose too
+        taken = {email for (email,) in db.session.query(User.email).filter(
+            User.email.in_({values['email'] for _, values in pending})
+        )} if pending else set()
+        organization_ids = {values['organization_id'] for _, values in pending} - {None}
+        organizations = {organization_id for (organization_id,) in db.session.query(Organization.id).filter(
+            Organization.id.in_(organization_ids)
+        )} if organization_ids else set()
+        accepted = []
+        for result, values in pending:
+            if values['email'] in taken:
+                result['error'] = 'Email already registered'
+                continue
+            if values['organization_id'] is not None and values['organization_id'] not in organizations:
+                result['error'] = 'Organization not found'
+                continue
+            taken.add(values['email'])
+            accepted.append((result, values))
+
+        if accepted:
+            try:
+                ids = _insert_batch([values for _, values in accepted], creator_id)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception('User import batch failed')
+                for result, _ in accepted:
+                    result['error'] = 'Could not save this batch'
+            else:
+                for (result, _), user_id in zip(accepted, ids):
+                    result.update(status='created', id=user_id)
+                    del result['error']
+
+        yield from results
@@ -2,10 +2,16 @@
 from flask import request
 from app.models import AuditLog, db
 from datetime import datetime
+import json
 
 
 def log_action(user_id, action, resource_type, resource_id=None, details=None):
-    """Log an action to audit trail."""
+    """
+    Log an action to audit trail.
+    
+    The entry joins the request's unit of work: it is committed with the
+    change it records, or rolled back with it if the request fails.
+    """
     try:
         audit_log = AuditLog(
             user_id=user_id,
@@ -20,15 +26,41 @@ def log_action(user_id, action, resource_type, resource_id=None, details=None):
             audit_log.set_details(details)
         
         db.session.add(audit_log)
-        db.session.commit()
         
         return True
     except Exception as e:
         print(f"Error logging audit action: {e}")
-        db.session.rollback()
         return False
 
 
+def log_actions(user_id, action, resource_type, entries):
+    """
+    Log one action on many resources with a single multi-row insert.
+    
+    Args:
+        entries: Iterable of (resource_id, details) pairs
+    """
+    created_at = datetime.utcnow()
+    ip_address = request.remote_addr if request else None
+    user_agent = request.headers.get('User-Agent') if request else None
+    rows = [
+        {
+            'user_id': user_id,
+            'action': action,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'details': json.dumps(details) if details else None,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': created_at
+        }
+        for resource_id, details in entries
+    ]
+    if rows:
+        db.session.execute(AuditLog.__table__.insert(), rows)
+    return len(rows)
+
+
 def log_login(user_id, success=True):
     """Log login attempt."""
     action = 'login_success' if success else 'login_failed'
@@ -64,6 +96,13 @@ def log_recommendation_reviewed(user_id, recommendation_id, status):
     })
 
 
+def log_recommendations_reviewed(user_id, recommendation_ids, status):
+    """Log a bulk AI recommendation review."""
+    log_actions(user_id, 'recommendation_reviewed', 'recommendation', [
+        (recommendation_id, {'status': status, 'bulk': True}) for recommendation_id in recommendation_ids
+    ])
+
+
 def log_content_created(user_id, content_id, ai_generated=False):
     """Log content creation."""
     log_action(user_id, 'content_created', 'content', content_id, {
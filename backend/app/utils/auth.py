@@ -2,7 +2,8 @@
 from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
-from app.models import User, db
+from sqlalchemy import false, true
+from app.models import Campaign, User, db
 
 
 def role_required(*allowed_roles):
@@ -65,6 +66,17 @@ def can_edit_campaign(user, campaign):
     return False
 
 
+def editable_campaigns_filter(user):
+    """SQL filter for the campaigns can_edit_campaign lets the user edit."""
+    if user.role == 'super_admin':
+        return true()
+    if user.role == 'org_admin':
+        return Campaign.organization_id == user.organization_id
+    if user.role == 'campaign_manager':
+        return Campaign.created_by == user.id
+    return false()
+
+
 def can_approve_content(user):
     """Check if user can approve content."""
     return user.role in ['super_admin', 'org_admin', 'reviewer']
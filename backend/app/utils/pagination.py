@@ -0,0 +1,164 @@
+"""Keyset (cursor) pagination utilities.
+
+List endpoints page by cursor. The older page/per_page offset pagination is
+still accepted for existing clients when a request passes ``page``.
+"""
+import base64
+import json
+from datetime import datetime
+from flask import request, current_app
+from sqlalchemy import tuple_
+from app.models import db
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor (or legacy page number) cannot be used."""
+
+
+def encode_cursor(created_at, item_id):
+    """Encode a (created_at, id) position as an opaque cursor string."""
+    payload = json.dumps([created_at.isoformat(), item_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode an opaque cursor string back to a (created_at, id) position."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def estimate_count(query):
+    """
+    Estimate the number of rows a query returns.
+
+    On PostgreSQL the planner's row estimate is used, which avoids a full
+    COUNT(*) scan. Other databases fall back to an exact count.
+
+    Returns:
+        Tuple of (count, is_estimate)
+    """
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return query.order_by(None).count(), False
+
+    compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+    result = db.session.connection().exec_driver_sql(
+        'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params
+    ).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+
+def _order(model):
+    """Newest first, ties broken by id; the (created_at, id) indexes serve it scanned backwards."""
+    return model.created_at.desc(), model.id.desc()
+
+
+def _after(model, created_at, item_id):
+    """Filter for the rows that follow a (created_at, id) position in _order."""
+    return tuple_(model.created_at, model.id) < tuple_(created_at, item_id)
+
+
+def keyset_paginate(query, model, cursor=None, limit=20, include_total='false'):
+    """
+    Paginate a query by (created_at, id), newest first.
+
+    Args:
+        query: Filtered query to paginate (must not be ordered yet)
+        model: Model class with created_at and id columns
+        cursor: Opaque cursor from a previous page, or None for the first page
+        limit: Maximum number of items to return
+        include_total: 'false' (default), 'true'/'exact' for an exact count,
+            or 'estimate' for a planner estimate where available
+
+    Returns:
+        Tuple of (items, page metadata dict)
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+    """
+    meta = {'per_page': limit}
+
+    if include_total in ('true', 'exact'):
+        meta['total'] = query.order_by(None).count()
+        meta['total_is_estimate'] = False
+    elif include_total == 'estimate':
+        meta['total'], meta['total_is_estimate'] = estimate_count(query)
+
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(_after(model, created_at, item_id))
+
+    items = query.order_by(*_order(model)).limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    meta['has_more'] = has_more
+    meta['next_cursor'] = encode_cursor(items[-1].created_at, items[-1].id) if has_more else None
+
+    return items, meta
+
+
+def offset_paginate(query, model, page, limit=20):
+    """
+    Legacy page-number pagination, in the same order as keyset_paginate.
+
+    Returns:
+        Tuple of (items, page metadata dict with the page, total and pages
+        fields older clients read, plus has_more)
+    """
+    total = query.order_by(None).count()
+    items = query.order_by(*_order(model)).offset((page - 1) * limit).limit(limit).all()
+    return items, {
+        'page': page,
+        'per_page': limit,
+        'total': total,
+        'total_is_estimate': False,
+        'pages': (total + limit - 1) // limit,
+        'has_more': page * limit < total,
+        'next_cursor': None
+    }
+
+
+def paginate_request(query, model):
+    """
+    Paginate a query using the cursor, per_page and include_total request args.
+
+    Requests that pass the older page arg (and no cursor) get page-number
+    pagination instead.
+
+    Raises:
+        InvalidCursor: If the cursor request arg cannot be decoded, or the
+            page arg is not a positive number or is combined with a cursor
+    """
+    per_page = request.args.get('per_page', current_app.config['ITEMS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_ITEMS_PER_PAGE']))
+
+    if 'page' in request.args:
+        if request.args.get('cursor'):
+            raise InvalidCursor('Use either cursor or page, not both')
+        page = request.args.get('page', type=int)
+        if page is None or page < 1:
+            raise InvalidCursor('page must be a positive integer')
+        return offset_paginate(query, model, page, limit=per_page)
+
+    return keyset_paginate(
+        query,
+        model,
+        cursor=request.args.get('cursor'),
+        limit=per_page,
+        include_total=request.args.get('include_total', 'false').lower()
+    )
+
+
+def empty_page():
+    """Page metadata for a result set known to be empty."""
+    meta = {'per_page': 0, 'has_more': False, 'next_cursor': None}
+    if request.args.get('include_total', 'false').lower() != 'false':
+        meta['total'] = 0
+        meta['total_is_estimate'] = False
+    return meta
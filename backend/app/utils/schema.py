@@ -0,0 +1,37 @@
+"""Database schema setup.
+
+db.create_all() creates missing tables but never alters an existing one, so
+columns and indexes added to existing tables ship as Alembic revisions under
+migrations/ and are applied with ``flask db upgrade``. A database created
+from scratch already matches the models and is stamped at the newest
+revision, so it never replays them.
+"""
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import current_app
+from sqlalchemy import inspect
+from app.models import db
+
+
+def _scripts():
+    config = current_app.extensions['migrate'].migrate.get_config()
+    return ScriptDirectory.from_config(config)
+
+
+def create_schema():
+    """
+    Create missing tables, stamping a new database as fully migrated.
+
+    Returns:
+        Whether the database is at the newest revision; if not, it needs
+        ``flask db upgrade`` before the app can use it
+    """
+    fresh = not inspect(db.engine).get_table_names()
+    db.create_all()
+    scripts = _scripts()
+    with db.engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        if fresh:
+            context.stamp(scripts, 'heads')
+            return True
+        return set(context.get_current_heads()) == set(scripts.get_heads())
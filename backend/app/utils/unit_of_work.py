@@ -0,0 +1,92 @@
+"""Request-scoped unit of work.
+
+Routes and the audit helpers only stage changes in the session (using
+flush() when they need generated ids); the request's changes, audit entries
+included, are committed together once the view has returned. Responses with
+an error status roll everything back instead, so a failed request leaves
+neither its changes nor an audit entry for them behind.
+
+Code that must make changes visible before the response is produced, such
+as streamed responses that keep running after the view returns, calls
+commit_now(). Coordination state shared between processes (in-flight claims,
+scheduler slots, quota counters, the persistent agent cache) is written
+through separate_session(), which commits on its own connection and never
+touches the request's staged changes. Background workers and other code
+outside a request manage their own transactions as before.
+"""
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import db
+
+_FLUSHED = 'unit_of_work_flushed'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _mark_flushed(session, flush_context):
+    session.info[_FLUSHED] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_bulk_write(orm_execute_state):
+    # Bulk UPDATE/DELETE and Core INSERTs run through execute() without a flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_FLUSHED] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _clear_flushed(session):
+    session.info.pop(_FLUSHED, None)
+
+
+def init_app(app):
+    """Commit or roll back each request's changes after its view returns."""
+    @app.after_request
+    def finish_unit_of_work(response):
+        session = db.session
+        if response.status_code >= 400:
+            session.rollback()
+        elif has_changes():
+            # Errors propagate and become a 500, which rolls back in turn
+            session.commit()
+        return response
+
+
+def has_changes():
+    """Whether the current session has uncommitted changes."""
+    session = db.session
+    return bool(session.new or session.dirty or session.deleted or session.info.get(_FLUSHED))
+
+
+def commit_now():
+    """
+    Commit the changes staged so far, before the request ends.
+
+    Only for changes that must be visible before the response is complete;
+    a later failure in the same request can no longer roll them back.
+    """
+    db.session.commit()
+
+
+@contextmanager
+def separate_session():
+    """
+    Session on its own connection, committed when the block exits.
+
+    For writes other processes must see at once, whatever becomes of the
+    request: committing it neither commits nor rolls back the request's
+    session. Objects stay readable after the block (no expiry on commit).
+
+    Yields:
+        A new SQLAlchemy Session; rolled back instead if the block raises
+    """
+    session = Session(db.engine, expire_on_commit=False)
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,69 @@
+"""Benchmark lexicon sentiment scoring on synthetic feedback comments.
+
+Usage: python benchmark_sentiment.py [--comments 100000] [--repeat 3]
+"""
+import argparse
+import random
+import time
+from app.services.sentiment import tokenize, score_tokens, sentiment_distribution, term_frequencies
+
+TEMPLATES = [
+    'I really {feeling} the {topic} {event}, {closing}',
+    'The {event} about {topic} was {quality} and {quality}',
+    'Not {quality} at all, the {topic} info felt {quality}',
+    'When is the next {event} on {topic}? {closing}',
+    "Honestly I don't {feeling} how the {topic} {event} was run",
+    '{closing} Looking forward to more {topic} {event}s near me',
+]
+WORDS = {
+    'feeling': ['love', 'like', 'appreciate', 'hate', 'support', 'understand'],
+    'topic': ['climate education', 'voter registration', 'local budget', 'public transit', 'youth policy',
+              'housing', 'town hall'],
+    'event': ['forum', 'workshop', 'post', 'video', 'meeting', 'campaign'],
+    'quality': ['helpful', 'confusing', 'great', 'misleading', 'informative', 'boring', 'clear', 'biased'],
+    'closing': ['Thanks!', 'Please share more.', 'Totally useless.', 'Keep it up.', 'What a waste of time.'],
+}
+
+
+def synthetic_comments(count, seed=42):
+    """Generate reproducible comments from templates."""
+    rng = random.Random(seed)
+    comments = []
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        comments.append(template.format(**{slot: rng.choice(words) for slot, words in WORDS.items()}))
+    return comments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    comments = synthetic_comments(args.comments)
+    print(f"Scoring {len(comments):,} comments ({sum(map(len, comments)) / 1e6:.1f} MB of text)")
+
+    for run in range(1, args.repeat + 1):
+        started = time.perf_counter()
+        vocabulary, term_ids, comment_index = tokenize(comments)
+        tokenized = time.perf_counter()
+        scores = score_tokens(vocabulary, term_ids, comment_index, len(comments))
+        sentiment = sentiment_distribution(scores)
+        scored = time.perf_counter()
+        themes = term_frequencies(vocabulary, term_ids, comment_index, limit=5)
+        finished = time.perf_counter()
+
+        print(
+            f"run {run}: total {finished - started:.2f}s "
+            f"(tokenize {tokenized - started:.2f}s, score {scored - tokenized:.2f}s, "
+            f"themes {finished - scored:.2f}s), {len(term_ids):,} tokens, "
+            f"{len(comments) / (finished - started):,.0f} comments/s"
+        )
+
+    print(f"sentiment: {sentiment}")
+    print(f"key themes: {[theme['term'] for theme in themes]}")
+
+
+if __name__ == '__main__':
+    main()
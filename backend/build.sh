@@ -4,6 +4,9 @@ set -o errexit
 
 pip install -r requirements.txt
 
+# Bring an existing database's schema up to date
+FLASK_APP=run.py flask db upgrade
+
 # Run database initialization if needed
 python seed_data.py
 
@@ -0,0 +1,43 @@
+"""created_at is required on paginated tables
+
+List endpoints page by a (created_at, id) row comparison, which NULLs would
+fall outside of. Rows without a created_at get the table's earliest one, so
+they stay at the end of the listing where they used to sort.
+
+Revision ID: a341f7ac1777
+Revises: a347031da46c
+Create Date: 2026-10-19 06:57:42.086598
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a341f7ac1777'
+down_revision = 'a347031da46c'
+branch_labels = None
+depends_on = None
+
+TABLES = ('users', 'organizations', 'campaigns', 'ai_recommendations')
+
+
+def upgrade():
+    now = datetime.utcnow()
+    for name in TABLES:
+        table = sa.table(name, sa.column('created_at', sa.DateTime()))
+        dated = table.alias('dated')
+        earliest = sa.select(sa.func.min(dated.c.created_at)).scalar_subquery()
+        op.execute(
+            table.update().where(table.c.created_at.is_(None)).values(created_at=sa.func.coalesce(earliest, now))
+        )
+        with op.batch_alter_table(name) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for name in reversed(TABLES):
+        with op.batch_alter_table(name) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
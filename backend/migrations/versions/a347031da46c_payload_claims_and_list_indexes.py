@@ -0,0 +1,62 @@
+"""Shared payloads, review claims and list indexes on existing tables
+
+Tables introduced alongside these changes (payload_blobs, agent_jobs and
+the rest) are created by db.create_all() at startup, so this revision only
+adds what create_all cannot: new columns and indexes on tables that
+databases created before it already have.
+
+Revision ID: a347031da46c
+Revises:
+Create Date: 2026-10-19 06:55:54.007572
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a347031da46c'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # Keyset pagination of the list endpoints
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ('ix_users_org_created_at_id', 'users', ['organization_id', 'created_at', 'id']),
+    ('ix_organizations_created_at_id', 'organizations', ['created_at', 'id']),
+    ('ix_campaigns_created_at_id', 'campaigns', ['created_at', 'id']),
+    ('ix_campaigns_org_created_at_id', 'campaigns', ['organization_id', 'created_at', 'id']),
+    # Recommendation listing, similarity index deltas and the review queue
+    ('ix_ai_recommendations_campaign_status_agent_created', 'ai_recommendations',
+     ['campaign_id', 'status', 'agent_type', 'created_at']),
+    ('ix_ai_recommendations_status_reviewed_at', 'ai_recommendations', ['status', 'reviewed_at']),
+    ('ix_ai_recommendations_status_created_at', 'ai_recommendations', ['status', 'created_at']),
+    ('ix_ai_recommendations_payload_hash', 'ai_recommendations', ['payload_hash']),
+    ('ix_analytics_campaign_metric', 'analytics', ['campaign_id', 'metric_type']),
+]
+
+
+def upgrade():
+    with op.batch_alter_table('ai_recommendations') as batch_op:
+        batch_op.add_column(sa.Column('payload_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('ai_recommendations_payload_hash_fkey', 'payload_blobs',
+                                    ['payload_hash'], ['hash'])
+        batch_op.create_foreign_key('ai_recommendations_claimed_by_fkey', 'users', ['claimed_by'], ['id'])
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('ai_recommendations') as batch_op:
+        batch_op.drop_constraint('ai_recommendations_claimed_by_fkey', type_='foreignkey')
+        batch_op.drop_constraint('ai_recommendations_payload_hash_fkey', type_='foreignkey')
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
+        batch_op.drop_column('payload_hash')
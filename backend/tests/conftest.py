@@ -0,0 +1,85 @@
+"""Shared fixtures: an app on a throwaway SQLite database, seeded users and auth headers."""
+import os
+import sys
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import TestingConfig  # noqa: E402
+from app.models import Organization, User, db, hash_password  # noqa: E402
+
+# bcrypt is deliberately slow; every seeded user shares one hash of 'pw'
+PASSWORD_HASH = hash_password('pw')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(TestingConfig, 'EMBEDDING_INDEX_DIR', str(tmp_path / 'embeddings'))
+    monkeypatch.setattr(TestingConfig, 'AGENT_JOB_WORKERS', 0)
+    monkeypatch.setattr(TestingConfig, 'AI_ACCOUNTING_FLUSH_SECONDS', 3600)
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """
+    Two organizations and their users.
+
+    Returns:
+        Dict of ids: org1, org2, admin (super_admin), org_admin and manager
+        (campaign_manager) in org1, other_admin (org_admin) in org2
+    """
+    with app.app_context():
+        org1 = Organization(name='Org A', type='ngo')
+        org2 = Organization(name='Org B', type='ngo')
+        db.session.add_all([org1, org2])
+        db.session.flush()
+        users = {
+            'admin': User(email='admin@x.org', full_name='Admin', role='super_admin'),
+            'org_admin': User(email='oa@x.org', full_name='Org Admin', role='org_admin', organization_id=org1.id),
+            'manager': User(email='mgr@x.org', full_name='Manager', role='campaign_manager',
+                            organization_id=org1.id),
+            'other_admin': User(email='ob@x.org', full_name='Other Admin', role='org_admin',
+                                organization_id=org2.id),
+        }
+        for user in users.values():
+            user.password_hash = PASSWORD_HASH
+        db.session.add_all(users.values())
+        db.session.commit()
+        ids = {name: user.id for name, user in users.items()}
+        ids.update(org1=org1.id, org2=org2.id)
+        return ids
+
+
+@pytest.fixture
+def auth(app, seed):
+    """auth(name) gives request headers for one of the seeded users."""
+    def headers(name):
+        with app.app_context():
+            return {'Authorization': 'Bearer ' + create_access_token(identity=str(seed[name]))}
+    return headers
+
+
+@pytest.fixture
+def make_campaign(client, auth, seed):
+    """make_campaign(name, org=..., as_user=..., **fields) creates a campaign and returns its id."""
+    def create(name, org='org1', as_user='admin', **fields):
+        response = client.post('/api/campaigns', json={
+            'name': name, 'campaign_type': 'advocacy', 'organization_id': seed[org], **fields
+        }, headers=auth(as_user))
+        assert response.status_code == 201, response.json
+        return response.json['campaign']['id']
+    return create
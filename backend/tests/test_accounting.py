@@ -0,0 +1,97 @@
+"""Agent call accounting: histograms, flushing and the report endpoint."""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import AgentCallStats, Organization, db
+from app.services import accounting
+from app.services.accounting import Histogram
+
+
+@pytest.fixture(autouse=True)
+def accumulator(monkeypatch):
+    monkeypatch.setattr(accounting, '_accumulator', accounting.Accumulator())
+
+
+def _call(organization_id, wall_seconds, input_tokens=1000, output_tokens=500, **result):
+    accounting.record_call(organization_id, 'narrative_architect', 'openai:gpt-4o-mini', {
+        'success': True, 'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}, **result
+    }, wall_seconds=wall_seconds)
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram()
+    for seconds in (0.001, 0.004, 0.2, 0.2, 120):
+        histogram.record(seconds)
+    assert histogram.counts[0] == 2
+    assert histogram.counts[5] == 2
+    assert histogram.counts[-1] == 1
+    assert histogram.summary() == {'p50_ms': 250, 'p95_ms': 60000, 'p99_ms': 60000}
+    histogram.merge(Histogram(histogram.counts))
+    assert sum(histogram.counts) == 10
+    assert Histogram().percentile(0.5) is None
+
+
+def test_flush_and_report_merge_every_flush(app, seed):
+    with app.app_context():
+        _call(seed['org1'], 0.04)
+        _call(seed['org1'], 0.3, cache={'hit': True})
+        assert accounting.flush() == 1
+        _call(seed['org1'], 2.0)
+        _call(seed['org2'], 0.01)
+        assert accounting.flush() == 2
+        assert accounting.flush() == 0
+
+        (row,) = accounting.report(datetime.utcnow() - timedelta(hours=1), organization_id=seed['org1'])
+        assert (row['calls'], row['cache_hits'], row['cache_hit_rate']) == (3, 1, 0.3333)
+        # The cache hit reused another call's output, so only two calls used tokens
+        assert (row['input_tokens'], row['output_tokens']) == (2000, 1000)
+        assert row['cost_usd'] == pytest.approx(2 * (1000 * 0.15 + 500 * 0.60) / 1_000_000)
+        assert row['wall_time'] == {'p50_ms': 500, 'p95_ms': 2500, 'p99_ms': 2500}
+        assert row['backends'] == {'openai:gpt-4o-mini': 3}
+        assert len(accounting.report(datetime.utcnow() - timedelta(hours=1))) == 2
+
+
+def test_flush_leaves_the_request_transaction_alone(app, seed):
+    with app.app_context():
+        db.session.add(Organization(name='Staged', type='ngo'))
+        _call(seed['org1'], 0.1)
+        accounting.flush()
+        db.session.rollback()
+        assert AgentCallStats.query.count() == 1
+        assert Organization.query.filter_by(name='Staged').count() == 0
+
+
+def test_failed_flush_keeps_statistics_for_the_next(app, seed, monkeypatch):
+    separate_session = accounting.separate_session
+    available = [False]
+
+    @contextmanager
+    def flaky_session():
+        if not available[0]:
+            raise RuntimeError('database unavailable')
+        with separate_session() as session:
+            yield session
+
+    monkeypatch.setattr(accounting, 'separate_session', flaky_session)
+    with app.app_context():
+        _call(seed['org1'], 0.1)
+        assert accounting.flush() == 0
+        _call(seed['org1'], 0.1)
+        available[0] = True
+        assert accounting.flush() == 1
+        assert AgentCallStats.query.one().calls == 2
+
+
+def test_report_endpoint_scopes_org_admins_and_includes_unflushed_calls(client, app, seed, auth):
+    with app.app_context():
+        _call(seed['org1'], 0.1)
+        _call(seed['org2'], 0.1)
+    response = client.get('/api/ai/accounting', headers=auth('org_admin'))
+    assert response.status_code == 200
+    assert [row['organization_id'] for row in response.json['stats']] == [seed['org1']]
+    response = client.get('/api/ai/accounting?hours=1', headers=auth('admin'))
+    assert [row['organization_id'] for row in response.json['stats']] == [seed['org1'], seed['org2']]
+    assert client.get('/api/ai/accounting?hours=x', headers=auth('admin')).status_code == 400
+    assert client.get('/api/ai/accounting', headers=auth('manager')).status_code == 403
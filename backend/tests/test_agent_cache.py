@@ -0,0 +1,57 @@
+"""Database tier eviction of the agent response cache."""
+from datetime import datetime, timedelta
+
+from app.models import AgentCacheEntry, PayloadBlob, db
+from app.services import agent_cache
+from app.services.single_flight import acquire_claim
+
+
+def _entry(key, age_minutes, expired=False, body='same'):
+    created_at = datetime.utcnow() - timedelta(minutes=age_minutes)
+    entry = AgentCacheEntry(key=key, agent_type='narrative_architect', model='demo:demo', created_at=created_at,
+                            expires_at=datetime.utcnow() + timedelta(minutes=-1 if expired else 60))
+    entry.set_payload({'success': True, 'body': body})
+    db.session.add(entry)
+    return entry
+
+
+def _keys():
+    return sorted(key for (key,) in db.session.query(AgentCacheEntry.key))
+
+
+def test_sweep_removes_expired_then_oldest_and_releases_blobs(app):
+    app.config.update(AGENT_CACHE_MAX_ROWS=2, AGENT_CACHE_SWEEP_BATCH=10)
+    with app.app_context():
+        _entry('expired', 1, expired=True)
+        _entry('old', 30)
+        _entry('mid', 20)
+        _entry('new', 10)
+        _entry('unique', 5, expired=True, body='only here')
+        db.session.commit()
+        assert db.session.query(PayloadBlob).count() == 2
+
+        assert agent_cache.sweep() == 3
+        assert _keys() == ['mid', 'new']
+        # The blob only the swept 'unique' entry used is gone; the shared one is down to two references
+        assert [blob.refcount for blob in PayloadBlob.query] == [2]
+
+
+def test_sweep_is_bounded_per_call(app):
+    app.config.update(AGENT_CACHE_MAX_ROWS=100, AGENT_CACHE_SWEEP_BATCH=2)
+    with app.app_context():
+        for n in range(5):
+            _entry(f'e{n}', n, expired=True)
+        db.session.commit()
+
+        assert agent_cache.sweep() == 2
+        assert len(_keys()) == 3
+
+
+def test_only_one_process_sweeps_at_a_time(app):
+    with app.app_context():
+        _entry('expired', 1, expired=True)
+        db.session.commit()
+        assert acquire_claim(agent_cache.SWEEP_CLAIM_KEY, 'another-process', 60)
+
+        assert agent_cache.sweep() == 0
+        assert _keys() == ['expired']
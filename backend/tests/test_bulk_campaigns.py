@@ -0,0 +1,103 @@
+"""Bulk status, date and delete operations on campaigns."""
+from datetime import date
+
+import pytest
+
+from app.models import AIRecommendation, AuditLog, Campaign, db
+
+
+def _campaigns(app):
+    with app.app_context():
+        return {campaign.id: campaign for campaign in Campaign.query}
+
+
+def test_ids_report_missing_and_forbidden_campaigns(client, app, seed, auth, make_campaign):
+    mine = make_campaign('Mine', org='org2')
+    theirs = make_campaign('Theirs')
+    response = client.put('/api/campaigns/bulk/status', json={
+        'ids': [mine, theirs, 99999], 'status': 'paused'
+    }, headers=auth('other_admin'))
+    assert response.status_code == 200
+    codes = {result['id']: result['code'] for result in response.json['results']}
+    assert codes == {mine: 200, theirs: 403, 99999: 404}
+    assert (response.json['updated'], response.json['failed']) == (1, 2)
+    campaigns = _campaigns(app)
+    assert (campaigns[mine].status, campaigns[theirs].status) == ('paused', 'draft')
+    with app.app_context():
+        audit = AuditLog.query.filter_by(action='campaigns_status_changed').one()
+        assert audit.user_id == seed['other_admin']
+
+
+def test_filter_only_matches_own_organization(client, app, seed, auth, make_campaign):
+    mine = make_campaign('Mine')
+    theirs = make_campaign('Theirs', org='org2')
+    response = client.put('/api/campaigns/bulk/status', json={
+        'filter': {'status': 'draft'}, 'status': 'active'
+    }, headers=auth('org_admin'))
+    assert [result['id'] for result in response.json['results']] == [mine]
+    campaigns = _campaigns(app)
+    assert (campaigns[mine].status, campaigns[theirs].status) == ('active', 'draft')
+
+
+@pytest.mark.parametrize('filters', [
+    {'status': ['draft']},
+    {'status': 'archived'},
+    {'organization_id': '1'},
+    {'organization_id': True},
+    {'campaign_type': {'a': 1}},
+    {'name': 'x'},
+    {},
+    ['status'],
+])
+def test_invalid_filters_are_rejected(client, seed, auth, make_campaign, filters):
+    make_campaign('C')
+    response = client.put('/api/campaigns/bulk/status', json={'filter': filters, 'status': 'active'},
+                          headers=auth('admin'))
+    assert response.status_code == 400
+    assert 'filter' in response.json['error']
+
+
+def test_filter_matches_are_capped(client, app, seed, auth, make_campaign):
+    app.config['CAMPAIGN_BULK_MAX_IDS'] = 2
+    for name in 'ABC':
+        make_campaign(name)
+    response = client.put('/api/campaigns/bulk/status', json={
+        'filter': {'organization_id': seed['org1']}, 'status': 'active'
+    }, headers=auth('admin'))
+    assert response.status_code == 400
+    assert {campaign.status for campaign in _campaigns(app).values()} == {'draft'}
+    response = client.put('/api/campaigns/bulk/status', json={'ids': [1, 2, 3], 'status': 'active'},
+                          headers=auth('admin'))
+    assert response.status_code == 400
+
+
+def test_shift_dates_keeps_missing_dates(client, app, seed, auth, make_campaign):
+    dated = make_campaign('Dated', start_date='2026-01-30', end_date='2026-02-10')
+    open_ended = make_campaign('Open', start_date='2026-03-01')
+    response = client.put('/api/campaigns/bulk/dates', json={'ids': [dated, open_ended], 'shift_days': 3},
+                          headers=auth('admin'))
+    assert response.json['updated'] == 2
+    campaigns = _campaigns(app)
+    assert (campaigns[dated].start_date, campaigns[dated].end_date) == (date(2026, 2, 2), date(2026, 2, 13))
+    assert (campaigns[open_ended].start_date, campaigns[open_ended].end_date) == (date(2026, 3, 4), None)
+
+
+@pytest.mark.parametrize('shift_days', [0, True, 1.5, '2', 4000])
+def test_shift_days_must_be_a_sensible_integer(client, seed, auth, make_campaign, shift_days):
+    response = client.put('/api/campaigns/bulk/dates', json={'ids': [make_campaign('C')], 'shift_days': shift_days},
+                          headers=auth('admin'))
+    assert response.status_code == 400
+
+
+def test_delete_leaves_campaigns_with_dependents(client, app, seed, auth, make_campaign):
+    empty = make_campaign('Empty')
+    used = make_campaign('Used')
+    with app.app_context():
+        db.session.add(AIRecommendation(campaign_id=used, agent_type='narrative_architect',
+                                        recommendation_data='{}', requested_by=seed['admin']))
+        db.session.commit()
+    response = client.post('/api/campaigns/bulk/delete', json={'ids': [empty, used]}, headers=auth('admin'))
+    codes = {result['id']: result['code'] for result in response.json['results']}
+    assert codes == {empty: 200, used: 409}
+    assert response.json['deleted'] == 1
+    assert set(_campaigns(app)) == {used}
@@ -0,0 +1,43 @@
+"""Streamed Content Synthesizer results."""
+from app.services.ai_agents import ContentSynthesizer
+from app.services.model_backends import DemoBackend, FakeStreamingBackend
+
+REQUEST = {'content_type': 'post', 'topic': 'Local elections', 'platform': 'general'}
+
+
+class HeadingBackend(FakeStreamingBackend):
+    def stream(self, prompt, system=None):
+        yield '# Vote in May\n'
+        yield 'Polls open at 7am.'
+
+
+def _run(backend):
+    events = list(ContentSynthesizer.stream_content(REQUEST, backend))
+    deltas = ''.join(value for kind, value in events if kind == 'delta')
+    (kind, result), = [event for event in events if event[0] == 'result']
+    return deltas, result
+
+
+def test_model_output_is_not_mixed_with_demo_content():
+    deltas, result = _run(FakeStreamingBackend(length=12))
+    content = result['content']
+    demo = ContentSynthesizer.generate_content(REQUEST)['content']
+
+    assert content['body'] == deltas
+    assert content['title'] == 'Local elections'
+    assert content['title'] != demo['title']
+    assert (content['key_messages'], content['call_to_action'], content['sources']) == ([], '', [])
+    assert result['demo_mode'] is False
+    assert result['model_used'] == 'fake-stream'
+
+
+def test_heading_line_becomes_the_title():
+    _, result = _run(HeadingBackend())
+    assert result['content']['title'] == 'Vote in May'
+
+
+def test_demo_backend_keeps_demo_fields():
+    deltas, result = _run(DemoBackend())
+    assert result['demo_mode'] is True
+    assert result['content']['body'] == deltas
+    assert result['content']['key_messages']
@@ -0,0 +1,111 @@
+"""Similarity index snapshots: background rebuilds, cleanup and concurrent readers."""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from app.models import AIRecommendation, db
+from app.services import embeddings
+from app.services.single_flight import acquire_claim
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(embeddings, '_loaded', None)
+    monkeypatch.setattr(embeddings, '_rebuild_thread', None)
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    requested = []
+    monkeypatch.setattr(embeddings, 'request_rebuild', lambda: requested.append(1))
+    return requested
+
+
+def _approve(app, campaign_id, user_id, count, topic='voter registration deadlines'):
+    with app.app_context():
+        for _ in range(count):
+            recommendation = AIRecommendation(campaign_id=campaign_id, agent_type='content_synthesizer',
+                                              status='approved', requested_by=user_id, reviewed_at=datetime.utcnow())
+            recommendation.set_recommendation_data({'success': True, 'content': {'title': topic, 'body': topic}})
+            db.session.add(recommendation)
+        db.session.commit()
+
+
+def _snapshots(app):
+    directory = app.config['EMBEDDING_INDEX_DIR']
+    return sorted({name.rsplit('-', 1)[0] for name in os.listdir(directory) if name.endswith('.npy')})
+
+
+def test_first_query_rebuilds_in_background_and_still_answers(app, seed, make_campaign, rebuilds):
+    _approve(app, make_campaign('Voting'), seed['admin'], 2)
+    with app.app_context():
+        results = embeddings.find_similar('voter registration')
+    assert len(results) == 2
+    assert rebuilds == [1]
+
+
+def test_stale_snapshot_is_served_while_rebuild_is_requested(app, seed, make_campaign, rebuilds):
+    campaign = make_campaign('Voting')
+    app.config['EMBEDDING_MAX_DELTA'] = 1
+    _approve(app, campaign, seed['admin'], 1)
+    with app.app_context():
+        embeddings.build_index()
+        version = embeddings.load_index().version
+    _approve(app, campaign, seed['admin'], 2, topic='flood relief volunteers')
+
+    with app.app_context():
+        assert embeddings.current_index().version == version
+        results = embeddings.find_similar('flood relief volunteers', limit=3)
+    assert rebuilds
+    # The approvals since the snapshot are scored directly
+    assert len(results) == 3
+
+
+def test_rebuild_keeps_the_replaced_snapshot_only(app, seed, make_campaign):
+    _approve(app, make_campaign('Voting'), seed['admin'], 1)
+    with app.app_context():
+        for _ in range(3):
+            embeddings.build_index()
+        current = embeddings.load_index().version
+    snapshots = _snapshots(app)
+    assert len(snapshots) == 2
+    assert snapshots[-1] == current
+
+
+def test_reader_survives_a_snapshot_deleted_under_it(app, seed, make_campaign):
+    _approve(app, make_campaign('Voting'), seed['admin'], 1)
+    with app.app_context():
+        embeddings.build_index()
+        loaded = embeddings.load_index()
+
+        manifest_path = os.path.join(app.config['EMBEDDING_INDEX_DIR'], embeddings.MANIFEST)
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        manifest['version'] = 'deleted-snapshot'
+        with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        assert embeddings.load_index() is loaded
+
+
+def test_only_one_process_rebuilds(app, seed):
+    with app.app_context():
+        assert acquire_claim(embeddings.REBUILD_CLAIM_KEY, 'another-process', 60)
+        assert embeddings.rebuild() is None
+
+
+def test_admin_rebuild_reports_a_running_rebuild(app, client, auth):
+    with app.app_context():
+        acquire_claim(embeddings.REBUILD_CLAIM_KEY, 'another-process', 60)
+    response = client.post('/api/ai/recommendations/similar/rebuild', headers=auth('admin'))
+    assert response.status_code == 409
+
+
+def test_background_rebuild_publishes_a_snapshot(app, seed, make_campaign):
+    _approve(app, make_campaign('Voting'), seed['admin'], 2)
+    with app.app_context():
+        embeddings.current_index()
+        embeddings._rebuild_thread.join(timeout=30)
+        assert len(embeddings.load_index()) == 2
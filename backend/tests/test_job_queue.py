@@ -0,0 +1,160 @@
+"""Claiming, lease reclaim and retries of queued agent jobs."""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app.models import AgentJob, AIRecommendation, Organization, db
+from app.services import job_queue
+from app.utils.unit_of_work import separate_session
+
+
+def _enqueue(app, campaign_id, user_id, count=1):
+    with app.app_context():
+        return [
+            job_queue.enqueue_job(campaign_id, 'narrative_architect', {'campaign_id': campaign_id}, user_id).id
+            for _ in range(count)
+        ]
+
+
+def test_claims_oldest_job_once(app, seed, make_campaign):
+    first, second = _enqueue(app, make_campaign('C'), seed['admin'], 2)
+    with app.app_context():
+        assert job_queue.claim_next_job('w1').id == first
+        assert job_queue.claim_next_job('w2').id == second
+        assert job_queue.claim_next_job('w3') is None
+        job = db.session.get(AgentJob, first)
+        assert (job.status, job.locked_by, job.attempts) == ('running', 'w1', 1)
+
+
+def test_concurrent_claimers_never_share_a_job(app, seed, make_campaign):
+    job_ids = _enqueue(app, make_campaign('C'), seed['admin'], 6)
+    claimed = []
+    lock = threading.Lock()
+
+    def claim(worker_id):
+        with app.app_context():
+            while True:
+                job = job_queue.claim_next_job(worker_id)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.id)
+
+    threads = [threading.Thread(target=claim, args=(f'w{n}',)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == job_ids
+
+
+def test_expired_lease_is_reclaimed(app, seed, make_campaign):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+    with app.app_context():
+        job_queue.claim_next_job('crashed')
+        assert job_queue.claim_next_job('w2') is None
+
+        lease = app.config['AGENT_JOB_LEASE_SECONDS']
+        AgentJob.query.filter_by(id=job_id).update({'locked_at': datetime.utcnow() - timedelta(seconds=lease + 1)})
+        db.session.commit()
+
+        job = job_queue.claim_next_job('w2')
+        assert (job.id, job.locked_by, job.attempts) == (job_id, 'w2', 2)
+
+
+def test_failed_job_retries_then_fails(app, seed, make_campaign, monkeypatch):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+    monkeypatch.setattr(job_queue, 'cached_run_agent', lambda *args, **kwargs: {'success': False, 'error': 'boom'})
+    with app.app_context():
+        for attempt in range(app.config['AGENT_JOB_MAX_ATTEMPTS']):
+            job_queue.process_job(job_queue.claim_next_job('w1'))
+        job = db.session.get(AgentJob, job_id)
+        assert (job.status, job.error, job.locked_by) == ('failed', 'boom', None)
+        assert job_queue.claim_next_job('w1') is None
+
+
+def test_completed_job_stores_recommendation(app, seed, make_campaign):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+    with app.app_context():
+        job_queue.process_job(job_queue.claim_next_job('w1'))
+        job = db.session.get(AgentJob, job_id)
+        assert job.status == 'completed'
+        assert db.session.get(AIRecommendation, job.recommendation_id).status == 'pending'
+
+
+def _locked_at(job_id):
+    with separate_session() as session:
+        return session.scalar(select(AgentJob.locked_at).where(AgentJob.id == job_id))
+
+
+def test_running_job_renews_its_lease(app, seed, make_campaign, monkeypatch):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+    app.config['AGENT_JOB_HEARTBEAT_SECONDS'] = 0.05
+    renewals = []
+
+    def slow_agent(*args, **kwargs):
+        claimed_at = _locked_at(job_id)
+        time.sleep(0.3)
+        renewals.append(_locked_at(job_id) > claimed_at)
+        return {'success': True, 'output': 'ok'}
+
+    monkeypatch.setattr(job_queue, 'cached_run_agent', slow_agent)
+    with app.app_context():
+        job_queue.process_job(job_queue.claim_next_job('w1'))
+        assert renewals == [True]
+        assert db.session.get(AgentJob, job_id).status == 'completed'
+
+
+def test_reclaimed_job_is_not_finished_twice(app, seed, make_campaign, monkeypatch):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+
+    def stalled_agent(*args, **kwargs):
+        # The lease lapsed mid-call and another worker took the job over
+        with separate_session() as session:
+            session.execute(update(AgentJob).where(AgentJob.id == job_id).values(locked_by='w2', attempts=2))
+        return {'success': True, 'output': 'late'}
+
+    monkeypatch.setattr(job_queue, 'cached_run_agent', stalled_agent)
+    with app.app_context():
+        job_queue.process_job(job_queue.claim_next_job('w1'))
+        job = db.session.get(AgentJob, job_id)
+        assert (job.status, job.locked_by, job.recommendation_id) == ('running', 'w2', None)
+        assert AIRecommendation.query.count() == 0
+
+
+def test_stalled_worker_cannot_requeue_a_reclaimed_job(app, seed, make_campaign, monkeypatch):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+
+    def stalled_agent(*args, **kwargs):
+        with separate_session() as session:
+            session.execute(update(AgentJob).where(AgentJob.id == job_id).values(locked_by='w2'))
+        return {'success': False, 'error': 'timeout'}
+
+    monkeypatch.setattr(job_queue, 'cached_run_agent', stalled_agent)
+    with app.app_context():
+        job_queue.process_job(job_queue.claim_next_job('w1'))
+        job = db.session.get(AgentJob, job_id)
+        assert (job.status, job.locked_by, job.error) == ('running', 'w2', None)
+
+
+def test_waiting_for_a_job_leaves_the_request_transaction_alone(app, seed, make_campaign):
+    (job_id,) = _enqueue(app, make_campaign('C'), seed['admin'])
+
+    def finish_later():
+        time.sleep(0.2)
+        with app.app_context(), separate_session() as session:
+            session.execute(update(AgentJob).where(AgentJob.id == job_id).values(status='completed'))
+
+    with app.app_context():
+        job = db.session.get(AgentJob, job_id)
+        db.session.add(Organization(name='Staged', type='ngo'))
+        thread = threading.Thread(target=finish_later)
+        thread.start()
+        job = job_queue.wait_for_job(job, 5)
+        thread.join()
+        assert job.status == 'completed'
+        assert Organization.query.filter_by(name='Staged').count() == 1
+        db.session.rollback()
+        assert Organization.query.filter_by(name='Staged').count() == 0
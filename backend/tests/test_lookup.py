@@ -0,0 +1,74 @@
+"""Typeahead ranking and invalidation of the in-process trigram index."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Campaign, db
+from app.services import lookup
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes(app, monkeypatch):
+    monkeypatch.setattr(lookup, '_indexes', {})
+    monkeypatch.setattr(lookup, '_dirty', set())
+    app.config['LOOKUP_REFRESH_SECONDS'] = 3600
+
+
+def _labels(query, **options):
+    return [match['label'] for match in lookup.lookup('campaign', query, **options)]
+
+
+def _rename_elsewhere(campaign_id, name):
+    # A bulk UPDATE skips the mapper events, like a change made by another worker
+    Campaign.query.filter(Campaign.id == campaign_id).update(
+        {'name': name, 'updated_at': datetime.utcnow() + timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.session.commit()
+
+
+def test_prefixes_rank_before_fuzzy_matches(app, seed, make_campaign):
+    make_campaign('Youth Climate Action')
+    make_campaign('Climate Week')
+    make_campaign('Clean Streets')
+    make_campaign('Climate Schools', org='org2')
+    with app.app_context():
+        assert _labels('clim', scope_id=seed['org1']) == ['Climate Week', 'Youth Climate Action']
+        assert _labels('climte', scope_id=seed['org1']) == ['Climate Week', 'Youth Climate Action']
+        assert _labels('act') == ['Youth Climate Action']
+        assert _labels('  ') == []
+
+
+def test_changes_in_this_process_rebuild_the_index_at_once(app, seed, make_campaign):
+    campaign_id = make_campaign('Harbour Festival')
+    with app.app_context():
+        assert _labels('harb') == ['Harbour Festival']
+        db.session.get(Campaign, campaign_id).name = 'Lighthouse Festival'
+        db.session.commit()
+        assert 'campaign' in lookup._dirty
+        assert _labels('harb') == []
+        assert _labels('light') == ['Lighthouse Festival']
+        assert 'campaign' not in lookup._dirty
+
+
+def test_changes_elsewhere_are_seen_once_the_watermark_is_checked(app, seed, make_campaign):
+    campaign_id = make_campaign('Harbour Festival')
+    with app.app_context():
+        assert _labels('harb') == ['Harbour Festival']
+        _rename_elsewhere(campaign_id, 'Lighthouse Festival')
+        # Within LOOKUP_REFRESH_SECONDS the cached index is served as is
+        assert _labels('light') == []
+
+        app.config['LOOKUP_REFRESH_SECONDS'] = 0
+        assert _labels('light') == ['Lighthouse Festival']
+        index = lookup.get_index('campaign')
+        # An unchanged watermark keeps the built index
+        assert lookup.get_index('campaign') is index
+
+
+def test_invalidate_covers_bulk_changes(app, seed, make_campaign):
+    campaign_id = make_campaign('Harbour Festival')
+    with app.app_context():
+        assert _labels('harb') == ['Harbour Festival']
+        _rename_elsewhere(campaign_id, 'Lighthouse Festival')
+        lookup.invalidate('campaign')
+        assert _labels('light') == ['Lighthouse Festival']
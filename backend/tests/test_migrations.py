@@ -0,0 +1,114 @@
+"""Schema setup: new databases are stamped, existing ones are upgraded by migrations."""
+from datetime import datetime
+
+import flask_migrate
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from app import create_app
+from app.config import TestingConfig
+from app.models import AIRecommendation, Campaign, SearchDocument, db
+
+# Tables that existed before the migrations, and what the migrations add to them
+OLD_TABLES = ('organizations', 'users', 'campaigns', 'ai_recommendations', 'analytics')
+NEW_COLUMNS = {('ai_recommendations', 'payload_hash'), ('ai_recommendations', 'claimed_by'),
+               ('ai_recommendations', 'claimed_at')}
+
+
+def _old_column(column):
+    copy = column._copy()
+    if column.name == 'created_at':
+        copy.nullable = True
+    return copy
+
+
+def _old_database(path):
+    """A database as create_all left it before these tables gained columns and indexes."""
+    metadata = sa.MetaData()
+    for name in OLD_TABLES:
+        table = db.metadata.tables[name]
+        sa.Table(name, metadata, *(
+            _old_column(column) for column in table.columns if (name, column.name) not in NEW_COLUMNS
+        ))
+    engine = sa.create_engine(f'sqlite:///{path}')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO organizations (id, name, type) VALUES (1, 'Org', 'ngo')")
+        connection.exec_driver_sql(
+            "INSERT INTO users (id, email, password_hash, full_name, role, organization_id, created_at) "
+            "VALUES (1, 'a@x.org', 'x', 'A', 'super_admin', 1, '2026-01-01 00:00:00')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO campaigns (id, name, organization_id, campaign_type, created_by, created_at) "
+            "VALUES (1, 'Old', 1, 'advocacy', 1, '2026-01-01 00:00:00')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO campaigns (id, name, organization_id, campaign_type, created_by) "
+            "VALUES (2, 'Undated', 1, 'advocacy', 1)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO ai_recommendations (id, campaign_id, agent_type, recommendation_data, status, "
+            "requested_by, created_at) VALUES (1, 1, 'narrative_architect', '{}', 'pending', 1, '2026-01-02 00:00:00')"
+        )
+    engine.dispose()
+
+
+@pytest.fixture
+def old_app(tmp_path, monkeypatch):
+    path = tmp_path / 'old.db'
+    _old_database(path)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    monkeypatch.setattr(TestingConfig, 'AGENT_JOB_WORKERS', 0)
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _revision(app):
+    with app.app_context(), db.engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def _scripts_head(app):
+    with app.app_context():
+        config = app.extensions['migrate'].migrate.get_config()
+        return ScriptDirectory.from_config(config).get_current_head()
+
+
+def test_new_database_is_stamped_at_head(app):
+    assert _revision(app) == _scripts_head(app)
+
+
+def test_upgrade_adds_columns_and_indexes_to_existing_tables(old_app):
+    assert _revision(old_app) is None
+    with old_app.app_context():
+        flask_migrate.upgrade()
+        inspector = sa.inspect(db.engine)
+        columns = {column['name'] for column in inspector.get_columns('ai_recommendations')}
+        assert {'payload_hash', 'claimed_by', 'claimed_at'} <= columns
+        for name in OLD_TABLES:
+            declared = {index.name for index in db.metadata.tables[name].indexes}
+            assert declared <= {index['name'] for index in inspector.get_indexes(name)}
+        recommendation = db.session.get(AIRecommendation, 1)
+        assert (recommendation.get_payload(), recommendation.claimed_by) == ({}, None)
+    assert _revision(old_app) == _scripts_head(old_app)
+
+
+def test_upgrade_backfills_created_at_and_requires_it(old_app):
+    with old_app.app_context():
+        flask_migrate.upgrade()
+        assert db.session.get(Campaign, 2).created_at == datetime(2026, 1, 1)
+        for name in ('users', 'organizations', 'campaigns', 'ai_recommendations'):
+            created_at = next(column for column in sa.inspect(db.engine).get_columns(name)
+                              if column['name'] == 'created_at')
+            assert not created_at['nullable']
+
+
+def test_out_of_date_database_skips_search_backfill(old_app):
+    with old_app.app_context():
+        assert 'search_documents' in sa.inspect(db.engine).get_table_names()
+        assert SearchDocument.query.count() == 0
@@ -0,0 +1,62 @@
+"""Misinformation rule validation and scanning."""
+import json
+
+import pytest
+
+from app.models import MisinformationRuleSet, db
+from app.services import misinformation
+
+
+@pytest.fixture(autouse=True)
+def fresh_ruleset(monkeypatch):
+    monkeypatch.setattr(misinformation, '_ruleset', None)
+    monkeypatch.setattr(misinformation, '_checked_at', 0.0)
+
+
+def _rule(**fields):
+    return {'id': 'r1', 'claim': 'Election was rigged', 'severity': 'high', **fields}
+
+
+def _put(client, auth, rules):
+    return client.put('/api/ai/misinformation-rules', json={'rules': rules}, headers=auth('admin'))
+
+
+def test_inline_global_flag_is_rejected(client, auth):
+    response = _put(client, auth, [_rule(patterns=['(?i)hoax'])])
+    assert response.status_code == 400
+    assert 'hoax' in response.json['error']
+    assert client.get('/api/ai/misinformation-rules', headers=auth('admin')).json['version'] == 0
+
+
+def test_patterns_that_only_fail_combined_are_rejected():
+    with pytest.raises(ValueError):
+        misinformation.validate_rules([_rule(patterns=['rigged']), _rule(id='r2', patterns=['(?i)hoax'])])
+
+
+def test_valid_rules_are_saved_and_used(app, client, auth):
+    response = _put(client, auth, [_rule(patterns=[r'stolen\s+votes'], keywords=['hoax'])])
+    assert response.status_code == 200
+    with app.app_context():
+        flags = misinformation.flag_feedback({'sample_comments': ['The HOAX of stolen   votes']})
+    assert [(flag['rule_id'], flag['count']) for flag in flags] == [('r1', 2)]
+
+
+def test_stored_rules_that_do_not_compile_fall_back(app):
+    with app.app_context():
+        db.session.add(MisinformationRuleSet(rules=json.dumps([_rule(patterns=['(?i)hoax'])]), created_by=None))
+        db.session.commit()
+        ruleset = misinformation.get_ruleset()
+        assert ruleset.version == 0
+        assert ruleset.flag([('comment', 0, 'nothing to see')]) == []
+
+
+def test_overlapping_patterns_of_different_rules_are_all_reported():
+    ruleset = misinformation.RuleSet([
+        _rule(id='low', severity='low', claim='Ballots are counted slowly', patterns=[r'ballots\s+\w+']),
+        _rule(id='high', patterns=[r'ballots\s+were\s+shredded']),
+    ], 1)
+    flags = ruleset.flag([('comment', 0, 'They say ballots were shredded overnight')])
+    assert [(flag['rule_id'], flag['matches'][0]['text']) for flag in flags] == [
+        ('high', 'ballots were shredded'),
+        ('low', 'ballots were'),
+    ]
@@ -0,0 +1,65 @@
+"""Streaming failures in the HTTP model backend and hedged failover."""
+import uuid
+
+import httpx
+import pytest
+
+from app.services.model_backends import BackendError, HTTPModelBackend, HedgedBackend, get_backend_stats
+
+
+class BrokenStream(httpx.SyncByteStream):
+    """Sends the given SSE lines, then drops the connection."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        for line in self.lines:
+            yield line.encode()
+        raise httpx.ReadError('connection reset')
+
+
+def _chunk(text):
+    return 'data: {"choices": [{"delta": {"content": "%s"}}]}\n\n' % text
+
+
+def _backend(app, handler):
+    with app.app_context():
+        backend = HTTPModelBackend(f'http://{uuid.uuid4().hex}.test/v1', '', 'm', max_concurrency=2,
+                                   max_retries=0, retry_base_delay=0, retry_max_delay=0, queue_timeout=1)
+    backend.client = httpx.Client(transport=httpx.MockTransport(handler))
+    return backend
+
+
+def _counters(backend):
+    return get_backend_stats()[backend.base_url]['counters']
+
+
+def test_complete_stream_counts_as_success(app):
+    backend = _backend(app, lambda request: httpx.Response(
+        200, stream=httpx.ByteStream((_chunk('a') + _chunk('b') + 'data: [DONE]\n\n').encode())
+    ))
+    assert ''.join(backend.stream('prompt')) == 'ab'
+    assert _counters(backend).get('successes') == 1
+
+
+def test_read_failure_mid_stream_is_a_backend_error_and_a_failure(app):
+    backend = _backend(app, lambda request: httpx.Response(200, stream=BrokenStream([_chunk('a')])))
+    chunks = []
+    with pytest.raises(BackendError):
+        for chunk in backend.stream('prompt'):
+            chunks.append(chunk)
+    assert chunks == ['a']
+    counters = _counters(backend)
+    assert counters.get('failures') == 1
+    assert not counters.get('successes')
+
+
+def test_hedge_fails_over_when_primary_breaks_before_output(app):
+    primary = _backend(app, lambda request: httpx.Response(200, stream=BrokenStream([])))
+    secondary = _backend(app, lambda request: httpx.Response(
+        200, stream=httpx.ByteStream((_chunk('ok') + 'data: [DONE]\n\n').encode())
+    ))
+    with app.app_context():
+        hedged = HedgedBackend(primary, secondary, hedge_delay=1)
+    assert ''.join(hedged.stream('prompt')) == 'ok'
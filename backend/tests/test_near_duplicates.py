@@ -0,0 +1,68 @@
+"""MinHash signatures, the banded LSH index and its upkeep by mapper events."""
+from app.models import Content, ContentSignature, db
+from app.services import near_duplicates
+
+ORIGINAL = (
+    'Join us on Saturday morning at the riverside park to plant two hundred native trees along the '
+    'new cycle path, bring gloves and water, and stay for a picnic lunch with the neighbourhood '
+    'association once the last sapling is in the ground'
+)
+# The same announcement with one word changed
+EDITED = ORIGINAL.replace('Saturday', 'Sunday')
+UNRELATED = (
+    'The city council will vote next month on the proposed budget for school meals, and residents '
+    'can submit written comments through the online portal until the end of the week'
+)
+
+
+def _content(campaign_id, body, created_by):
+    content = Content(campaign_id=campaign_id, content_type='post', body=body, created_by=created_by)
+    db.session.add(content)
+    db.session.commit()
+    return content.id
+
+
+def test_signatures_estimate_jaccard_similarity():
+    original, edited, unrelated = (near_duplicates.minhash(text) for text in (ORIGINAL, EDITED, UNRELATED))
+    assert original.shape == (near_duplicates.NUM_HASHES,)
+    assert near_duplicates.similarity(original, edited[None, :])[0] >= 0.7
+    assert near_duplicates.similarity(original, unrelated[None, :])[0] <= 0.1
+    assert near_duplicates.minhash('  ...  ') is None
+    # Signatures do not depend on the process that computed them
+    assert near_duplicates.band_keys(original) == near_duplicates.band_keys(near_duplicates.minhash(ORIGINAL))
+
+
+def test_a_near_duplicate_is_found_within_the_organization(app, seed, make_campaign):
+    campaign_id = make_campaign('Trees')
+    other_campaign_id = make_campaign('Elsewhere', org='org2')
+    with app.app_context():
+        content_id = _content(campaign_id, ORIGINAL, seed['admin'])
+        _content(campaign_id, UNRELATED, seed['admin'])
+        _content(other_campaign_id, ORIGINAL, seed['admin'])
+
+        matches = near_duplicates.find_near_duplicates(EDITED, seed['org1'], threshold=0.6)
+        assert [(match['source_type'], match['source_id']) for match in matches] == [('content', content_id)]
+        assert matches[0]['similarity'] >= 0.6
+        assert near_duplicates.find_near_duplicates(EDITED, seed['org1'], exclude=('content', content_id),
+                                                    threshold=0.6) == []
+
+
+def test_edits_and_deletes_keep_the_index_current(app, seed, make_campaign):
+    campaign_id = make_campaign('Trees')
+    with app.app_context():
+        content_id = _content(campaign_id, ORIGINAL, seed['admin'])
+        content = db.session.get(Content, content_id)
+        content.body = UNRELATED
+        db.session.commit()
+        assert near_duplicates.find_near_duplicates(ORIGINAL, seed['org1'], threshold=0.6) == []
+        assert [match['source_id'] for match in near_duplicates.find_near_duplicates(UNRELATED, seed['org1'])] == \
+            [content_id]
+
+        db.session.delete(content)
+        db.session.commit()
+        assert near_duplicates.find_near_duplicates(UNRELATED, seed['org1'], threshold=0.1) == []
+        assert ContentSignature.query.count() == 0
+
+        _content(campaign_id, ORIGINAL, seed['admin'])
+        assert near_duplicates.rebuild_index() == 1
+        assert len(near_duplicates.find_near_duplicates(EDITED, seed['org1'], threshold=0.6)) == 1
@@ -0,0 +1,51 @@
+"""Cursor pagination of the list endpoints, and the legacy page parameter."""
+from app.models import Campaign, db
+
+
+def _walk(client, headers, per_page):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/campaigns?per_page={per_page}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        ids += [campaign['id'] for campaign in response.json['campaigns']]
+        cursor = response.json['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_cursor_pages_cover_every_row_once(client, auth, make_campaign):
+    created = [make_campaign(f'C{n}') for n in range(7)]
+    assert _walk(client, auth('admin'), 3) == sorted(created, reverse=True)
+
+
+def test_rows_created_together_are_ordered_by_id(app, client, auth, make_campaign):
+    created = [make_campaign(f'C{n}') for n in range(5)]
+    with app.app_context():
+        same = db.session.get(Campaign, created[0]).created_at
+        Campaign.query.filter(Campaign.id.in_(created[1:4])).update(
+            {Campaign.created_at: same}, synchronize_session=False
+        )
+        db.session.commit()
+
+    ids = _walk(client, auth('admin'), 2)
+    assert ids == [created[4], created[3], created[2], created[1], created[0]]
+
+
+def test_invalid_cursor_is_rejected(client, auth, seed):
+    response = client.get('/api/campaigns?cursor=not-a-cursor', headers=auth('admin'))
+    assert response.status_code == 400
+
+
+def test_page_parameter_still_pages(client, auth, make_campaign):
+    created = [make_campaign(f'C{n}') for n in range(5)]
+    response = client.get('/api/campaigns?page=2&per_page=2', headers=auth('admin'))
+    assert response.status_code == 200
+    body = response.json
+    assert [campaign['id'] for campaign in body['campaigns']] == [created[2], created[1]]
+    assert (body['page'], body['total'], body['pages'], body['has_more']) == (2, 5, 3, True)
+
+
+def test_page_and_cursor_together_are_rejected(client, auth, seed):
+    assert client.get('/api/campaigns?page=1&cursor=abc', headers=auth('admin')).status_code == 400
+    assert client.get('/api/campaigns?page=0', headers=auth('admin')).status_code == 400
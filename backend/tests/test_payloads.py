@@ -0,0 +1,66 @@
+"""Reference counting of payload blobs shared between rows."""
+from datetime import datetime, timedelta
+
+from app.models import AgentCacheEntry, PayloadBlob, db
+
+
+def _entry(key, body):
+    entry = AgentCacheEntry(key=key, agent_type='narrative_architect', model='demo:demo',
+                            expires_at=datetime.utcnow() + timedelta(hours=1))
+    entry.set_payload({'success': True, 'body': body, 'usage': {'input_tokens': len(key)}})
+    db.session.add(entry)
+    return entry
+
+
+def _refcounts():
+    blobs = {blob.hash: blob.refcount for blob in PayloadBlob.query}
+    entries = {entry.key: entry.payload_hash for entry in AgentCacheEntry.query}
+    return {key: blobs.get(digest) for key, digest in sorted(entries.items())}, len(blobs)
+
+
+def test_inserts_share_one_blob(app):
+    with app.app_context():
+        first, second = _entry('a', 'same'), _entry('b', 'same')
+        db.session.commit()
+        assert first.payload_hash == second.payload_hash
+        assert _refcounts() == ({'a': 2, 'b': 2}, 1)
+        # Run fields stay with the row
+        assert first.get_payload()['usage'] == {'input_tokens': 1}
+        assert second.get_payload() == {'success': True, 'body': 'same', 'usage': {'input_tokens': 1}}
+
+
+def test_updates_move_the_reference_even_when_the_hash_was_not_loaded(app):
+    with app.app_context():
+        _entry('a', 'same')
+        _entry('b', 'same')
+        db.session.commit()
+
+        # Committing expired the rows, so the old hash is not loaded when it is replaced
+        entry = db.session.get(AgentCacheEntry, 'a')
+        db.session.expire(entry)
+        entry.set_payload({'success': True, 'body': 'edited'})
+        db.session.commit()
+        assert _refcounts() == ({'a': 1, 'b': 1}, 2)
+
+        db.session.get(AgentCacheEntry, 'b').set_payload({'success': True, 'body': 'edited'})
+        db.session.commit()
+        assert _refcounts() == ({'a': 2, 'b': 2}, 1)
+
+        db.session.get(AgentCacheEntry, 'a').set_payload(['not', 'shared'])
+        db.session.commit()
+        assert _refcounts() == ({'a': None, 'b': 1}, 1)
+
+
+def test_deletes_release_the_blob_with_its_last_reference(app):
+    with app.app_context():
+        first, second = _entry('a', 'same'), _entry('b', 'same')
+        db.session.commit()
+
+        # Deleting an expired row still finds the hash it held
+        db.session.delete(first)
+        db.session.commit()
+        assert _refcounts() == ({'b': 1}, 1)
+
+        db.session.delete(second)
+        db.session.commit()
+        assert _refcounts() == ({}, 0)
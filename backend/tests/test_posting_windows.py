@@ -0,0 +1,54 @@
+"""Hour-of-week binning and posting window recommendations."""
+from datetime import datetime, timedelta
+
+from app.models import Analytics, db
+from app.services import posting_windows
+
+
+def _record(campaign_id, recorded_at, value, metric_type='engagement', platform='twitter'):
+    db.session.add(Analytics(campaign_id=campaign_id, metric_type=metric_type, metric_value=value,
+                             platform=platform, recorded_at=recorded_at))
+
+
+def test_hours_of_the_week_start_on_monday(app, make_campaign):
+    campaign_id = make_campaign('Binning')
+    with app.app_context():
+        # 2026-10-19 is a Monday and 2026-10-25 a Sunday
+        _record(campaign_id, datetime(2026, 10, 19, 0, 30), 1)
+        _record(campaign_id, datetime(2026, 10, 21, 14, 0), 1)
+        _record(campaign_id, datetime(2026, 10, 25, 23, 59), 1)
+        _record(campaign_id, datetime(1970, 1, 1, 0, 0), 1)
+        db.session.commit()
+        data = posting_windows._load('campaign', campaign_id)
+    assert sorted(data['hour_of_week'].tolist()) == [0, 2 * 24 + 14, 3 * 24, 6 * 24 + 23]
+
+
+def test_best_window_is_on_the_busiest_day(app, make_campaign):
+    campaign_id = make_campaign('Windows')
+    with app.app_context():
+        for week in range(5):
+            monday = datetime(2026, 9, 14) + timedelta(weeks=week)
+            _record(campaign_id, monday + timedelta(days=2, hours=14), 100)
+            _record(campaign_id, monday + timedelta(hours=3), 1)
+        db.session.commit()
+        result = posting_windows.recommend(campaign_id, limit=1)
+    best = result['optimal_times'][0]
+    assert (best['day'], best['platform']) == ('Wednesday', 'twitter')
+    assert best['time'] in ('13:00-15:00', '14:00-16:00')
+    assert result['engagement_data'] == {'source': 'campaign', 'observations': 10,
+                                         'platforms_without_history': []}
+
+
+def test_new_rows_invalidate_the_cached_profile(app, make_campaign):
+    campaign_id = make_campaign('Cache')
+    with app.app_context():
+        _record(campaign_id, datetime(2026, 10, 19, 9, 0), 5)
+        db.session.commit()
+        before = posting_windows.recommend(campaign_id, platforms=['twitter', 'facebook'])
+        assert before['engagement_data']['platforms_without_history'] == ['facebook']
+
+        _record(campaign_id, datetime(2026, 10, 19, 9, 0), 5, platform='facebook')
+        db.session.commit()
+        after = posting_windows.recommend(campaign_id, platforms=['twitter', 'facebook'])
+    assert after['engagement_data']['platforms_without_history'] == []
+    assert after['engagement_data']['observations'] == 2
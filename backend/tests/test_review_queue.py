@@ -0,0 +1,168 @@
+"""Review queue claims and single and bulk reviews of claimed recommendations."""
+import threading
+from datetime import datetime, timedelta
+
+from app.models import AIRecommendation, db
+from app.services import review_queue
+
+
+def _recommendations(app, campaign_id, user_id, count):
+    with app.app_context():
+        recommendations = [
+            AIRecommendation(campaign_id=campaign_id, agent_type='narrative_architect',
+                             recommendation_data='{}', requested_by=user_id,
+                             created_at=datetime.utcnow() + timedelta(seconds=i))
+            for i in range(count)
+        ]
+        db.session.add_all(recommendations)
+        db.session.commit()
+        return [recommendation.id for recommendation in recommendations]
+
+
+def _claim(app, user_id, limit):
+    with app.app_context():
+        ids = [recommendation.id for recommendation in review_queue.claim_next(user_id, limit)]
+        db.session.commit()
+        return ids
+
+
+def _lapse_claims(app, ids):
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config['REVIEW_CLAIM_LEASE_SECONDS'] + 1)
+        AIRecommendation.query.filter(AIRecommendation.id.in_(ids)).update(
+            {AIRecommendation.claimed_at: cutoff}, synchronize_session=False
+        )
+        db.session.commit()
+
+
+def test_reviewers_claim_oldest_first_without_overlap(app, seed, make_campaign):
+    ids = _recommendations(app, make_campaign('C'), seed['admin'], 3)
+    assert _claim(app, seed['org_admin'], 2) == ids[:2]
+    assert _claim(app, seed['manager'], 2) == ids[2:]
+    assert _claim(app, seed['admin'], 2) == []
+
+
+def test_concurrent_reviewers_never_share_a_recommendation(app, seed, make_campaign):
+    ids = _recommendations(app, make_campaign('C'), seed['admin'], 8)
+    claimed = {}
+
+    def claim(name):
+        claimed[name] = _claim(app, seed[name], 3)
+
+    threads = [threading.Thread(target=claim, args=(name,)) for name in ('admin', 'org_admin', 'manager')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    everything = [recommendation_id for batch in claimed.values() for recommendation_id in batch]
+    assert len(everything) == len(set(everything))
+    assert set(everything) <= set(ids)
+
+
+def test_lapsed_claim_returns_to_the_queue(app, seed, make_campaign):
+    ids = _recommendations(app, make_campaign('C'), seed['admin'], 1)
+    assert _claim(app, seed['org_admin'], 1) == ids
+    assert _claim(app, seed['manager'], 1) == []
+    _lapse_claims(app, ids)
+    assert _claim(app, seed['manager'], 1) == ids
+
+
+def test_claiming_again_renews_own_claims(app, seed, make_campaign):
+    ids = _recommendations(app, make_campaign('C'), seed['admin'], 1)
+    _claim(app, seed['org_admin'], 1)
+    _lapse_claims(app, ids)
+    assert _claim(app, seed['org_admin'], 1) == ids
+    with app.app_context():
+        recommendation = db.session.get(AIRecommendation, ids[0])
+        assert datetime.utcnow() - recommendation.claimed_at < timedelta(minutes=1)
+
+
+def test_queue_endpoint_only_hands_out_own_organization(client, app, seed, auth, make_campaign):
+    _recommendations(app, make_campaign('C'), seed['admin'], 2)
+    response = client.post('/api/ai/review-queue/next', json={}, headers=auth('other_admin'))
+    assert response.status_code == 200
+    assert response.json['recommendations'] == []
+    response = client.post('/api/ai/review-queue/next', json={'limit': 1}, headers=auth('org_admin'))
+    assert len(response.json['recommendations']) == 1
+    assert response.json['lease_expires_at']
+
+
+def test_bulk_review_respects_claims_and_status(client, app, seed, auth, make_campaign):
+    own, taken, lapsed, done = _recommendations(app, make_campaign('C'), seed['admin'], 4)
+    assert _claim(app, seed['org_admin'], 1) == [own]
+    assert _claim(app, seed['manager'], 2) == [taken, lapsed]
+    _lapse_claims(app, [lapsed])
+    with app.app_context():
+        db.session.get(AIRecommendation, done).status = 'rejected'
+        db.session.commit()
+
+    response = client.put('/api/ai/recommendations/review', json={
+        'ids': [own, taken, lapsed, done], 'status': 'approved'
+    }, headers=auth('org_admin'))
+    assert response.status_code == 200
+    codes = {result['id']: result['code'] for result in response.json['results']}
+    assert codes == {own: 200, taken: 409, lapsed: 200, done: 409}
+    assert (response.json['reviewed'], response.json['failed']) == (2, 2)
+    with app.app_context():
+        statuses = {r.id: r.status for r in AIRecommendation.query}
+        assert statuses == {own: 'approved', taken: 'pending', lapsed: 'approved', done: 'rejected'}
+
+
+def test_bulk_review_update_skips_rows_reviewed_in_between(client, app, seed, auth, make_campaign, monkeypatch):
+    first, second = _recommendations(app, make_campaign('C'), seed['admin'], 2)
+    reviewable = review_queue.reviewable
+    calls = []
+
+    def racing_reviewable(user_id):
+        # Another reviewer approves second between the authorization query and the UPDATE
+        calls.append(user_id)
+        if len(calls) == 2:
+            AIRecommendation.query.filter_by(id=second).update({'status': 'approved'}, synchronize_session=False)
+        return reviewable(user_id)
+
+    monkeypatch.setattr('app.routes.ai_agents.reviewable', racing_reviewable)
+    response = client.put('/api/ai/recommendations/review', json={
+        'ids': [first, second], 'status': 'rejected', 'review_notes': 'off message'
+    }, headers=auth('org_admin'))
+    codes = {result['id']: result['code'] for result in response.json['results']}
+    assert codes == {first: 200, second: 409}
+    with app.app_context():
+        assert db.session.get(AIRecommendation, second).status == 'approved'
+
+
+def test_single_review_endpoints_respect_claims(client, app, seed, auth, make_campaign):
+    taken, lapsed = _recommendations(app, make_campaign('C'), seed['admin'], 2)
+    assert _claim(app, seed['org_admin'], 2) == [taken, lapsed]
+    _lapse_claims(app, [lapsed])
+
+    for action, body in (('approve', {}), ('reject', {'review_notes': 'off message'}),
+                         ('review', {'status': 'approved'})):
+        response = client.put(f'/api/ai/recommendations/{taken}/{action}', json=body, headers=auth('manager'))
+        assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(AIRecommendation, taken).status == 'pending'
+
+    response = client.put(f'/api/ai/recommendations/{lapsed}/approve', json={}, headers=auth('manager'))
+    assert response.status_code == 200
+    assert response.json['recommendation']['status'] == 'approved'
+    # Already reviewed
+    response = client.put(f'/api/ai/recommendations/{lapsed}/reject', json={'review_notes': 'late'},
+                          headers=auth('org_admin'))
+    assert response.status_code == 409
+
+
+def test_reviewing_ends_the_claim(client, app, seed, auth, make_campaign):
+    own, other = _recommendations(app, make_campaign('C'), seed['admin'], 2)
+    assert _claim(app, seed['org_admin'], 2) == [own, other]
+
+    response = client.put(f'/api/ai/recommendations/{own}/review', json={
+        'status': 'rejected', 'review_notes': 'off message'
+    }, headers=auth('org_admin'))
+    assert response.status_code == 200
+    response = client.put('/api/ai/recommendations/review', json={'ids': [other], 'status': 'approved'},
+                          headers=auth('org_admin'))
+    assert response.json['reviewed'] == 1
+    with app.app_context():
+        rows = {r.id: (r.status, r.reviewed_by, r.claimed_by, r.claimed_at) for r in AIRecommendation.query}
+    assert rows == {own: ('rejected', seed['org_admin'], None, None),
+                    other: ('approved', seed['org_admin'], None, None)}
@@ -0,0 +1,110 @@
+"""Per-organization quotas, concurrency slots and fair sharing of the global pool."""
+import pytest
+
+from app.models import AgentSlot, OrgUsageWindow, db
+from app.services import agent_cache, scheduler
+from app.services.scheduler import CapacityExhausted, QuotaExceeded
+
+
+@pytest.fixture
+def limits(app):
+    app.config.update(
+        AI_SCHEDULER_GLOBAL_SLOTS=4,
+        AI_ORG_MAX_CONCURRENCY=3,
+        AI_SCHEDULER_MAX_WAIT_SECONDS=0,
+        AI_QUOTA_REQUESTS_PER_WINDOW=2,
+        AI_QUOTA_TOKENS_PER_WINDOW=10000,
+        AI_ORG_WEIGHTS={}
+    )
+    return app
+
+
+def test_quota_rejects_once_the_window_is_spent(limits, seed):
+    with limits.app_context():
+        scheduler.reserve_quota(seed['org1'])
+        scheduler.reserve_quota(seed['org1'])
+        with pytest.raises(QuotaExceeded) as error:
+            scheduler.reserve_quota(seed['org1'])
+        assert error.value.retry_after >= 1
+        with pytest.raises(QuotaExceeded):
+            scheduler.check_quota(seed['org1'])
+
+        scheduler.refund_quota(seed['org1'])
+        scheduler.reserve_quota(seed['org1'])
+        scheduler.reserve_quota(seed['org2'])
+
+
+def test_organization_cap_then_fair_share(limits, seed):
+    with limits.app_context():
+        held = [scheduler.acquire_slot(seed['org1']) for _ in range(3)]
+        # Alone, org1 gets its cap of 3 but no more
+        with pytest.raises(CapacityExhausted):
+            scheduler.acquire_slot(seed['org1'])
+
+        # org2 takes the last global slot; org1's fair share is now 2 of 4
+        scheduler.acquire_slot(seed['org2'])
+        assert scheduler.org_concurrency_limit(seed['org1']) == 2
+        with pytest.raises(CapacityExhausted):
+            scheduler.acquire_slot(seed['org2'])
+
+        for slot_id in held[0]:
+            scheduler._release_slot(slot_id)
+        assert scheduler.acquire_slot(seed['org2'])
+
+
+def test_expired_slots_are_reclaimed(limits, seed):
+    with limits.app_context():
+        for _ in range(3):
+            scheduler.acquire_slot(seed['org1'])
+        db.session.query(AgentSlot).update({'expires_at': AgentSlot.acquired_at})
+        db.session.commit()
+        assert scheduler.acquire_slot(seed['org1'])
+
+
+def test_capacity_failure_refunds_the_reservation(limits, seed):
+    with limits.app_context():
+        for _ in range(3):
+            scheduler.acquire_slot(seed['org1'])
+        with pytest.raises(CapacityExhausted):
+            with scheduler.scheduled(seed['org1'], {'x': 1}):
+                pass
+        usage = db.session.query(OrgUsageWindow).filter_by(organization_id=seed['org1']).one()
+        assert (usage.requests, usage.tokens) == (0, 0)
+
+
+def test_scheduled_releases_slots(limits, seed):
+    with limits.app_context():
+        with scheduler.scheduled(seed['org1'], {'x': 1}) as waited:
+            assert waited >= 0
+            assert db.session.query(AgentSlot).count() == 2
+        assert db.session.query(AgentSlot).count() == 0
+
+
+def _tokens(organization_id):
+    return sum(window.tokens for window in OrgUsageWindow.query.filter_by(organization_id=organization_id))
+
+
+def test_token_charge_settles_to_reported_usage(limits, seed):
+    with limits.app_context():
+        scheduler.reserve_quota(seed['org1'], tokens=500)
+        scheduler.settle_quota(seed['org1'], 500, {'usage': {'input_tokens': 300, 'output_tokens': 900}})
+        assert _tokens(seed['org1']) == 1200
+
+        scheduler.settle_quota(seed['org1'], 1200, {'usage': {'input_tokens': 10, 'output_tokens': 20}})
+        assert _tokens(seed['org1']) == 30
+
+        # No usage reported: the estimate stands; never below zero
+        scheduler.settle_quota(seed['org1'], 100, {'success': False})
+        scheduler.settle_quota(seed['org1'], 5000, {'usage': {'output_tokens': 1}})
+        assert _tokens(seed['org1']) == 0
+
+
+def test_agent_runs_are_charged_their_actual_tokens(limits, seed, monkeypatch):
+    usage = {'input_tokens': 4000, 'output_tokens': 3000}
+    monkeypatch.setattr(agent_cache, 'run_agent', lambda agent_type, payload: {'success': True, 'usage': dict(usage)})
+    with limits.app_context():
+        agent_cache._run_scheduled('narrative_architect', {'x': 1}, seed['org1'])
+        assert _tokens(seed['org1']) == 7000
+        # The budget now reflects real consumption, so the next large call is refused
+        with pytest.raises(QuotaExceeded):
+            scheduler.reserve_quota(seed['org1'], tokens=scheduler.estimate_tokens({'x': 1}) + 3000)
@@ -0,0 +1,74 @@
+"""Full-text search documents, their FTS5 triggers and upkeep by mapper events."""
+from sqlalchemy import text
+
+from app.models import Campaign, Content, SearchDocument, db
+from app.services import search
+
+
+def _search(query, **filters):
+    return [(result['type'], result['id']) for result in search.search(query, **filters)]
+
+
+def _fts_rows():
+    return db.session.execute(text('SELECT count(*) FROM search_fts')).scalar()
+
+
+def test_campaigns_are_searchable_within_their_organization(client, seed, auth, make_campaign):
+    campaign_id = make_campaign('Riverside cleanup', description='Volunteers collect litter along the river')
+    make_campaign('Library hours', org='org2', description='Keep the library open on Sundays')
+
+    response = client.get('/api/search', query_string={'q': 'volunteer riv'}, headers=auth('manager'))
+    assert response.status_code == 200
+    assert [(result['type'], result['id']) for result in response.json['results']] == [('campaign', campaign_id)]
+    assert '<mark>' in response.json['results'][0]['highlight']
+
+    response = client.get('/api/search', query_string={'q': 'river'}, headers=auth('other_admin'))
+    assert response.json['results'] == []
+
+
+def test_edits_and_deletes_reach_the_full_text_index(app, seed, make_campaign):
+    campaign_id = make_campaign('Transit survey')
+    with app.app_context():
+        content = Content(campaign_id=campaign_id, content_type='post', title='Bus survey',
+                          body='Tell us about your commute by tram', created_by=seed['admin'])
+        db.session.add(content)
+        db.session.commit()
+        content_id = content.id
+        assert _search('tram', doc_types=['content']) == [('content', content_id)]
+
+        content.body = 'Tell us about your commute by ferry'
+        db.session.commit()
+        assert _search('tram') == []
+        assert _search('ferry') == [('content', content_id)]
+        # The update trigger replaced the FTS row instead of adding one
+        assert _fts_rows() == SearchDocument.query.count() == 2
+
+        db.session.delete(content)
+        db.session.commit()
+        assert _search('ferry') == []
+        assert _fts_rows() == SearchDocument.query.count() == 1
+
+
+def test_moving_a_campaign_moves_its_documents(app, seed, make_campaign):
+    campaign_id = make_campaign('Harbour festival')
+    with app.app_context():
+        db.session.add(Content(campaign_id=campaign_id, content_type='post', body='Fireworks at the harbour',
+                               created_by=seed['admin']))
+        db.session.commit()
+        db.session.get(Campaign, campaign_id).organization_id = seed['org2']
+        db.session.commit()
+        assert _search('harbour', organization_id=seed['org1']) == []
+        assert len(_search('harbour', organization_id=seed['org2'])) == 2
+
+
+def test_bulk_delete_removes_campaign_documents(client, app, seed, auth, make_campaign):
+    ids = [make_campaign(f'Orchard planting {number}') for number in range(3)]
+    response = client.post('/api/campaigns/bulk/delete', json={'ids': ids[:2]}, headers=auth('admin'))
+    assert response.status_code == 200
+    with app.app_context():
+        assert _search('orchard') == [('campaign', ids[2])]
+        assert _fts_rows() == SearchDocument.query.count() == 1
+
+        search.remove_documents('campaign', [ids[2]])
+        db.session.commit()
+        assert _search('orchard') == []
@@ -0,0 +1,55 @@
+"""Lexicon sentiment scoring and theme extraction."""
+import numpy as np
+
+from app.services.sentiment import analyze_comments, score_comments, sentiment_distribution, term_frequencies, \
+    tokenize
+
+
+def test_tokenize_keeps_comment_boundaries():
+    vocabulary, term_ids, comment_index = tokenize(['Great event', '', "Didn't like it\x00at all"])
+    assert [vocabulary[term] for term in term_ids] == ['great', 'event', "didn't", 'like', 'it', 'at', 'all']
+    assert comment_index.tolist() == [0, 0, 2, 2, 2, 2, 2]
+
+
+def test_scores_sum_lexicon_terms_per_comment():
+    scores = score_comments(['Great, helpful and clear', 'terrible waste', 'the bus was on time'])
+    assert scores.tolist() == [6.0, -5.0, 0.0]
+
+
+def test_negator_flips_only_the_next_term_in_the_same_comment():
+    scores = score_comments(['not good', 'good not', 'never bad', 'not', 'good'])
+    assert scores.tolist() == [-2.0, 2.0, 2.0, 0.0, 2.0]
+
+
+def test_distribution_uses_the_neutral_margin():
+    assert sentiment_distribution(np.array([2.0, 0.5, -0.5, -1.0], dtype=np.float32)) == {
+        'positive': 25.0, 'neutral': 50.0, 'negative': 25.0
+    }
+    assert sentiment_distribution(np.array([], dtype=np.float32)) == {'positive': 0, 'neutral': 0, 'negative': 0}
+
+
+def test_themes_count_comments_and_prefer_phrases():
+    comments = [
+        'Bus routes near the school need work',
+        'bus routes bus routes bus routes',
+        'More bus routes please',
+        'The school library is great',
+        'library hours',
+    ]
+    terms = term_frequencies(*tokenize(comments))
+    counts = {entry['term']: entry['comments'] for entry in terms}
+    # Counted once per comment, however often a comment repeats it
+    assert counts['bus routes'] == 3
+    # Covered by the phrase, so not repeated as single terms
+    assert 'bus' not in counts and 'routes' not in counts
+    assert counts['school'] == 2 and counts['library'] == 2
+    assert terms[0]['term'] == 'bus routes'
+    # Stop words and sentiment terms are never themes
+    assert 'the' not in counts and 'great' not in counts
+
+
+def test_analyze_comments_skips_empty_comments():
+    result = analyze_comments(['Love the town hall', None, '', 'town hall was boring'], theme_limit=1)
+    assert result['comments_analyzed'] == 2
+    assert result['sentiment'] == {'positive': 50.0, 'neutral': 0.0, 'negative': 50.0}
+    assert result['key_themes'] == ['town hall']
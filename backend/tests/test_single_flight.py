@@ -0,0 +1,76 @@
+"""Coalescing of identical agent calls, and claims that stay out of the request's transaction."""
+import threading
+import time
+
+from app.models import Organization, db
+from app.services import single_flight
+from app.services.single_flight import SingleFlight, acquire_claim, release_claim
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'result'
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do('key', work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {'result'}
+
+
+def test_leader_failure_reaches_every_waiter():
+    flights = SingleFlight()
+    errors = []
+
+    def work():
+        time.sleep(0.2)
+        raise RuntimeError('model down')
+
+    def call():
+        try:
+            flights.do('key', work)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ['model down'] * 3
+
+
+def test_claim_has_one_holder_until_released_or_expired(app):
+    with app.app_context():
+        assert acquire_claim('key', 'a', 60)
+        assert not acquire_claim('key', 'b', 60)
+        release_claim('key', 'a')
+        assert acquire_claim('key', 'b', 60)
+
+        # A negative TTL leaves a claim that is already expired, as after a crash
+        assert acquire_claim('stale', 'crashed', -1)
+        assert acquire_claim('stale', 'c', 60)
+
+
+def test_claims_do_not_commit_or_discard_request_changes(app):
+    with app.app_context():
+        db.session.add(Organization(name='Staged by the request', type='ngo'))
+        assert acquire_claim('key', 'a', 60)
+        release_claim('key', 'a')
+        db.session.rollback()
+        assert Organization.query.filter_by(name='Staged by the request').count() == 0
+
+        db.session.add(Organization(name='Kept by the request', type='ngo'))
+        assert not single_flight.wait_for_leader('missing', lambda: None, timeout=0.1)
+        db.session.commit()
+        assert Organization.query.filter_by(name='Kept by the request').count() == 1
@@ -0,0 +1,67 @@
+"""Request-scoped commit and rollback."""
+from flask import jsonify
+
+from app.models import AuditLog, Campaign, Organization, db
+from app.utils.unit_of_work import commit_now
+
+
+def _campaign(app, campaign_id):
+    with app.app_context():
+        return db.session.get(Campaign, campaign_id)
+
+
+def test_successful_request_commits_change_and_audit_entry(app, client, auth, make_campaign):
+    with app.app_context():
+        before = AuditLog.query.count()
+    campaign_id = make_campaign('C')
+    assert _campaign(app, campaign_id).name == 'C'
+    with app.app_context():
+        assert AuditLog.query.count() == before + 1
+
+
+def test_error_response_rolls_back_staged_changes(app, client, auth, make_campaign):
+    campaign_id = make_campaign('Original')
+    response = client.put(f'/api/campaigns/{campaign_id}', json={'name': 'Renamed', 'start_date': 'not a date'},
+                          headers=auth('admin'))
+    assert response.status_code == 400
+    assert _campaign(app, campaign_id).name == 'Original'
+
+
+def test_unhandled_exception_rolls_back(app):
+    @app.route('/_test/explode')
+    def explode():
+        db.session.add(Organization(name='Half done', type='ngo'))
+        db.session.flush()
+        raise RuntimeError('boom')
+
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert app.test_client().get('/_test/explode').status_code == 500
+    with app.app_context():
+        assert Organization.query.filter_by(name='Half done').count() == 0
+
+
+def test_bulk_statements_are_committed(app):
+    @app.route('/_test/bulk', methods=['POST'])
+    def bulk():
+        Organization.query.update({'type': 'coalition'}, synchronize_session=False)
+        return jsonify({}), 200
+
+    with app.app_context():
+        db.session.add(Organization(name='Org', type='ngo'))
+        db.session.commit()
+    assert app.test_client().post('/_test/bulk').status_code == 200
+    with app.app_context():
+        assert {org.type for org in Organization.query} == {'coalition'}
+
+
+def test_commit_now_survives_a_later_error(app):
+    @app.route('/_test/partial', methods=['POST'])
+    def partial():
+        db.session.add(Organization(name='Committed early', type='ngo'))
+        commit_now()
+        db.session.add(Organization(name='Rolled back', type='ngo'))
+        return jsonify({'error': 'later failure'}), 500
+
+    assert app.test_client().post('/_test/partial').status_code == 500
+    with app.app_context():
+        assert [org.name for org in Organization.query] == ['Committed early']
@@ -0,0 +1,80 @@
+"""Streaming user import: per-row outcomes and unreadable uploads."""
+import csv
+import json
+
+import pytest
+
+from app.models import User
+from app.services import lookup
+
+HEADER = 'email,password,full_name,role,organization_id\n'
+
+
+def _import(client, auth, body, file_format='csv', as_user='admin'):
+    response = client.post(f'/api/users/import?format={file_format}', data=body, headers=auth(as_user))
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def small_batches(app):
+    app.config['USER_IMPORT_BATCH_SIZE'] = 2
+
+
+def test_rows_report_their_own_outcome(client, app, seed, auth, monkeypatch):
+    monkeypatch.setattr(lookup, '_dirty', set())
+    body = HEADER + (
+        f'new@x.org,pw,New,viewer,{seed["org1"]}\n'
+        'ghost@x.org,pw,Ghost,viewer,99999\n'
+        'admin@x.org,pw,Dup,viewer,\n'
+        'bad,pw,Bad,viewer,\n'
+    )
+    lines = _import(client, auth, body.encode())
+    assert [(line['status'], line.get('error')) for line in lines[:-1]] == [
+        ('created', None),
+        ('error', 'Organization not found'),
+        ('error', 'Email already registered'),
+        ('error', 'Invalid email'),
+    ]
+    assert lines[-1] == {'summary': {'created': 1, 'failed': 3}}
+    assert 'user' in lookup._dirty
+    with app.app_context():
+        assert User.query.filter_by(email='new@x.org').one().organization_id == seed['org1']
+
+
+def test_org_admin_imports_into_own_organization(client, app, seed, auth):
+    lines = _import(client, auth, (HEADER + f'mine@x.org,pw,Mine,viewer,{seed["org2"]}\n').encode(),
+                    as_user='org_admin')
+    assert lines[0]['status'] == 'created'
+    with app.app_context():
+        assert User.query.filter_by(email='mine@x.org').one().organization_id == seed['org1']
+
+
+def test_undecodable_bytes_end_with_error_and_summary(client, app, seed, auth, small_batches):
+    # Text is decoded in chunks, so the bad bytes sit well past the first batch
+    body = (HEADER + 'a@x.org,pw,A,viewer,\nb@x.org,pw,B,viewer,\n' + 'c@x.org,pw,' + 'C' * 20000 + ',viewer,\n'
+            ).encode() + b'd@x.org,pw,\xff\xfe,viewer,\n'
+    lines = _import(client, auth, body)
+    assert [line['status'] for line in lines[:2]] == ['created', 'created']
+    assert lines[2]['error'].startswith('File is not UTF-8 encoded')
+    assert 'row 2' in lines[2]['error']
+    assert lines[3] == {'summary': {'created': 2, 'failed': 0}}
+    with app.app_context():
+        assert User.query.filter_by(email='a@x.org').count() == 1
+
+
+def test_csv_errors_end_with_error_and_summary(client, seed, auth):
+    limit = csv.field_size_limit(50)
+    try:
+        lines = _import(client, auth, (HEADER + 'a@x.org,pw,' + 'x' * 100 + ',viewer,\n').encode())
+    finally:
+        csv.field_size_limit(limit)
+    assert lines[0]['error'].startswith('Invalid CSV')
+    assert lines[1] == {'summary': {'created': 0, 'failed': 0}}
+
+
+def test_jsonl_rows_that_are_not_objects(client, seed, auth):
+    body = b'{"email": "j@x.org", "password": "pw", "full_name": "J", "role": "viewer"}\n[1, 2]\nnot json\n'
+    lines = _import(client, auth, body, file_format='jsonl')
+    assert [line['status'] for line in lines[:-1]] == ['created', 'error', 'error']
+    assert lines[-1] == {'summary': {'created': 1, 'failed': 2}}
@@ -113,6 +113,12 @@ class ApiService {
     });
   }
 
+  // Typeahead lookup: type is 'campaign', 'organization' or 'user'
+  async lookup(type, q, params = {}) {
+    const query = new URLSearchParams({ type, q, ...params }).toString();
+    return this.request(`/api/lookup?${query}`);
+  }
+
   // Organization endpoints
   async getOrganizations(params = {}) {
     const query = new URLSearchParams(params).toString();
@@ -192,6 +198,44 @@ class ApiService {
     });
   }
 
+  async streamContentSynthesizer(data, onDelta) {
+    const token = this.getToken();
+    const response = await fetch(`${this.baseUrl}/api/ai/content-synthesizer`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ ...data, stream: true }),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Request failed');
+    }
+
+    // Parse Server-Sent Events: 'delta' events carry partial text, 'done' the saved result
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split('\n\n');
+      buffer = messages.pop();
+      for (const message of messages) {
+        const event = message.match(/^event: (.*)$/m)?.[1];
+        const payload = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'delta') onDelta?.(payload.text);
+        if (event === 'error') throw new Error(payload.error);
+        if (event === 'done') return payload;
+      }
+    }
+    throw new Error('Stream ended before completion');
+  }
+
   async requestDistributionOptimizer(data) {
     return this.request('/api/ai/distribution-optimizer', {
       method: 'POST',
@@ -206,6 +250,13 @@ class ApiService {
     });
   }
 
+  async requestBatchRecommendations(items, options = {}) {
+    return this.request('/api/ai/batch', {
+      method: 'POST',
+      body: JSON.stringify({ items, ...options }),
+    });
+  }
+
   // AI Recommendations endpoints
   async getRecommendations(params = {}) {
     const query = new URLSearchParams(params).toString();
@@ -59,7 +59,7 @@ export default function AIAgentsPage() {
     try {
       setLoading(true);
       const [recsRes, campaignsRes] = await Promise.all([
-        api.getRecommendations(),
+        api.getRecommendations({ include_data: true }),
         api.getCampaigns()
       ]);
       setRecommendations(recsRes.recommendations || []);
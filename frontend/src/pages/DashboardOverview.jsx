@@ -22,9 +22,9 @@ export default function DashboardOverview() {
     try {
       // Load statistics from API
       const [usersData, orgsData, campaignsData] = await Promise.all([
-        api.getUsers({ per_page: 1 }).catch(() => ({ total: 0 })),
-        api.getOrganizations({ per_page: 1 }).catch(() => ({ total: 0 })),
-        api.getCampaigns({ per_page: 1 }).catch(() => ({ total: 0 })),
+        api.getUsers({ per_page: 1, include_total: 'estimate' }).catch(() => ({ total: 0 })),
+        api.getOrganizations({ per_page: 1, include_total: 'estimate' }).catch(() => ({ total: 0 })),
+        api.getCampaigns({ per_page: 1, include_total: 'estimate' }).catch(() => ({ total: 0 })),
       ]);
 
       setStats({